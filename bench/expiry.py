@@ -0,0 +1,109 @@
+# bench/expiry.py
+"""
+100k ожидающих удалений: колесо таймеров (expiry.ExpiryEngine) против
+одной спящей задачи asyncio на сообщение (как в старом helpers._expire_message).
+Меряем память (tracemalloc), время постановки и число вызовов удаления.
+
+    python bench/expiry.py --pending 100000 --chats 10000 --spread 5
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import sender
+from expiry import ExpiryEngine
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = 0
+        self.ids = 0
+        self.done = asyncio.Event()
+        self.expect = 0
+
+    async def _count(self, n: int):
+        self.calls += 1
+        self.ids += n
+        if self.ids >= self.expect:
+            self.done.set()
+        return True
+
+    async def delete_messages(self, chat_id, message_ids):
+        return await self._count(len(message_ids))
+
+    async def delete_message(self, chat_id, message_id):
+        return await self._count(1)
+
+
+async def bench_wheel(items, spread: float):
+    bot = FakeBot()
+    bot.expect = len(items)
+    engine = ExpiryEngine()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for chat_id, message_id, delay in items:
+        engine.schedule(bot, chat_id, message_id, delay)
+    t_sched = time.perf_counter() - t0
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cpu0 = time.process_time()
+    await asyncio.wait_for(bot.done.wait(), spread + 10)
+    cpu = time.process_time() - cpu0
+    await engine.stop()
+    return t_sched, mem, cpu, bot.calls
+
+
+async def bench_tasks(items, spread: float):
+    bot = FakeBot()
+    bot.expect = len(items)
+
+    async def expire(chat_id, message_id, delay):
+        await asyncio.sleep(delay)
+        await bot.delete_message(chat_id, message_id)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(expire(*it)) for it in items]
+    t_sched = time.perf_counter() - t0
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cpu0 = time.process_time()
+    await asyncio.wait_for(bot.done.wait(), spread + 10)
+    cpu = time.process_time() - cpu0
+    await asyncio.gather(*tasks)
+    return t_sched, mem, cpu, bot.calls
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pending", type=int, default=100_000)
+    ap.add_argument("--chats", type=int, default=10_000)
+    ap.add_argument("--spread", type=float, default=5.0, help="удаления размазаны на N секунд")
+    args = ap.parse_args()
+
+    sender.SEND_SCHEDULER = False   # меряем только движок удаления, без лимитов Bot API
+    rnd = random.Random(1)
+    items = [
+        (rnd.randint(1, args.chats), i, rnd.uniform(0.5, args.spread))
+        for i in range(args.pending)
+    ]
+
+    print(f"pending={args.pending} chats={args.chats} spread={args.spread}s")
+    for name, fn in (("wheel", bench_wheel), ("task/msg", bench_tasks)):
+        t_sched, mem, cpu, calls = await fn(items, args.spread)
+        print(
+            f"  {name:9s} schedule={t_sched * 1000:7.1f}ms  mem={mem / 1024 / 1024:6.1f}MiB"
+            f"  cpu_while_firing={cpu * 1000:7.1f}ms  delete_calls={calls}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+# bench/fake_telegram.py
+"""
+Локальный фейковый Bot API для бенчмарков: отвечает на getMe / getUpdates /
+sendMessage / deleteMessage(s) и считает вызовы. Сеть к api.telegram.org не нужна.
+"""
+import asyncio
+import time
+
+from aiohttp import web
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+FAKE_TOKEN = "123456:FAKE-token_for_bench"
+
+
+def make_update(update_id: int, user_id: int, text: str = "ping") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+            "text": text,
+        },
+    }
+
+
+class FakeTelegram:
+    def __init__(self, *, rtt: float = 0.0):
+        self.rtt = rtt                      # искусственная задержка каждого запроса, сек
+        self.pending: list[dict] = []       # апдейты, которые отдаст getUpdates
+        self.calls: dict[str, int] = {}
+        self.sent = 0
+        self.sent_event = asyncio.Event()
+        self.expect_sent = 0
+        self._runner: web.AppRunner | None = None
+        self.base = ""
+        self._msg_id = 0
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        data = dict(await request.post()) if request.can_read_body else {}
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif method == "getUpdates":
+            offset = int(data.get("offset") or 0)
+            limit = int(data.get("limit") or 100)
+            self.pending = [u for u in self.pending if u["update_id"] >= offset]
+            if not self.pending:
+                await asyncio.sleep(0.05)   # «длинный» опрос без апдейтов
+            result = self.pending[:limit]
+        elif method == "sendMessage":
+            self._msg_id += 1
+            self.sent += 1
+            if self.expect_sent and self.sent >= self.expect_sent:
+                self.sent_event.set()
+            result = {
+                "message_id": self._msg_id,
+                "date": int(time.time()),
+                "chat": {"id": int(data.get("chat_id", 0)), "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            # deleteWebhook / setWebhook / deleteMessage(s) и прочее
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sock = site._server.sockets[0]
+        self.base = "http://%s:%d" % sock.getsockname()[:2]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def session(self) -> AiohttpSession:
+        return AiohttpSession(api=TelegramAPIServer.from_base(self.base))
+
+    def expect(self, n: int):
+        self.sent = 0
+        self.expect_sent = n
+        self.sent_event.clear()
@@ -0,0 +1,82 @@
+# bench/fastdb.py
+"""
+Три горячих запроса к User через Prisma (query engine) и через fastdb (asyncpg):
+поиск по tg_id, update одного поля, upsert тарифа. Нужен локальный Postgres со
+схемой проекта (prisma db push) в DATABASE_URL; пишет в диапазон тестовых tg_id.
+
+    python bench/fastdb.py --ops 5000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("PRISMA_CLIENT_ENGINE_TYPE", "binary")   # как в bot.py
+
+from database import db
+from fastdb import FastDB, asyncpg
+
+BASE_TG_ID = 9_000_000_000      # тестовые пользователи, реальных tg_id здесь нет
+TARIFFS = ("Базовый", "Выгодный", "Максимум")
+
+
+async def run(name: str, delegate, ops: int, users: int, concurrency: int, rnd: random.Random):
+    cases = {
+        "find_unique": lambda t: delegate.find_unique(where={"tg_id": t}),
+        "update": lambda t: delegate.update(where={"tg_id": t}, data={"weightKg": rnd.uniform(50, 90)}),
+        "upsert": lambda t: delegate.upsert(
+            where={"tg_id": t},
+            data={"create": {"tg_id": t, "tariffName": TARIFFS[0]},
+                  "update": {"tariffName": rnd.choice(TARIFFS)}},
+        ),
+    }
+    for case, call in cases.items():
+        sem = asyncio.Semaphore(concurrency)
+        lat = []
+
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                await call(BASE_TG_ID + rnd.randrange(users))
+                lat.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(ops)))
+        elapsed = time.perf_counter() - t0
+        lat.sort()
+        print(f"  {name:7s} {case:11s} {ops / elapsed:8.0f} ops/s  p50={lat[len(lat) // 2] * 1000:6.2f}ms"
+              f"  p99={lat[int(len(lat) * 0.99)] * 1000:6.2f}ms")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ops", type=int, default=5000)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=20)
+    args = ap.parse_args()
+    if asyncpg is None:
+        raise SystemExit("asyncpg не установлен: pip install asyncpg")
+
+    await db.connect()
+    fast = FastDB(db)
+    await fast.connect()
+    try:
+        for i in range(args.users):
+            await fast.user.upsert(where={"tg_id": BASE_TG_ID + i},
+                                   data={"create": {"first_name": "Bench"}, "update": {}})
+        print(f"ops={args.ops} users={args.users} concurrency={args.concurrency}")
+        await run("prisma", db.user, args.ops, args.users, args.concurrency, random.Random(1))
+        await run("asyncpg", fast.user, args.ops, args.users, args.concurrency, random.Random(1))
+    finally:
+        await db.user.delete_many(where={"tg_id": {"gte": BASE_TG_ID}})
+        await fast.disconnect()
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
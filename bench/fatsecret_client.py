@@ -0,0 +1,136 @@
+# bench/fatsecret_client.py
+"""
+Простой цикла событий при запросах к FatSecret: блокирующий requests внутри
+async def (как было) против fatsecret_client (aiohttp, пул keep-alive).
+FatSecret эмулируется локальным stub-сервером с задержкой ответа.
+
+    python bench/fatsecret_client.py --calls 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web
+
+from fatsecret_client import FatSecretClient
+
+
+async def start_stub(latency: float):
+    async def token(_request):
+        await asyncio.sleep(latency)
+        return web.json_response({"access_token": "stub", "expires_in": 86400, "token_type": "Bearer"})
+
+    async def api(request):
+        await asyncio.sleep(latency)
+        return web.json_response({"food_entries": {"food_entry": [], "date": request.query.get("date")}})
+
+    app = web.Application()
+    app.router.add_post("/connect/token", token)
+    app.router.add_get("/rest/server.api", api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f"http://{host}:{port}"
+
+
+def start_stub_thread(latency: float):
+    """Stub в отдельном потоке со своим циклом: блокирующий клиент не должен его останавливать."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runner, base = asyncio.run_coroutine_threadsafe(start_stub(latency), loop).result()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return base, stop
+
+
+class StallMeter:
+    """Тикер каждые 5 мс: суммарное и максимальное опоздание = блокировки цикла."""
+
+    def __init__(self, tick: float = 0.005):
+        self.tick = tick
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            lag = time.perf_counter() - t0 - self.tick
+            if lag > 0.001:
+                self.total_lag += lag
+                self.max_lag = max(self.max_lag, lag)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_blocking(base: str, calls: int):
+    try:
+        import requests
+    except ImportError:
+        print("  blocking: пакет requests не установлен — пропуск")
+        return None
+    session = requests.Session()
+
+    async def one():
+        # так было в fatsecret.get_food_entries: синхронный вызов внутри async def
+        return session.get(f"{base}/rest/server.api",
+                           params={"method": "food_entries.get.v2", "format": "json"}).json()
+
+    with StallMeter() as meter:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(calls)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, meter
+
+
+async def run_async(base: str, calls: int):
+    client = FatSecretClient(base_url=base, api_url=f"{base}/rest/server.api")
+    await client.get_food_entries("stub")    # прогрев соединения
+    with StallMeter() as meter:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client.get_food_entries("stub") for _ in range(calls)))
+        elapsed = time.perf_counter() - t0
+    await client.close()
+    return elapsed, meter
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.05)
+    args = ap.parse_args()
+
+    base, stop = start_stub_thread(args.latency)
+    try:
+        print(f"calls={args.calls} stub_latency={args.latency * 1000:.0f}ms")
+        for name, fn in (("blocking", run_blocking), ("aiohttp", run_async)):
+            res = await fn(base, args.calls)
+            if res is None:
+                continue
+            elapsed, meter = res
+            print(
+                f"  {name:9s} total={elapsed:6.2f}s  loop_stall_total={meter.total_lag * 1000:8.1f}ms"
+                f"  loop_stall_max={meter.max_lag * 1000:7.1f}ms"
+            )
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
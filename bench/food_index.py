@@ -0,0 +1,77 @@
+# bench/food_index.py
+"""
+Локальный индекс продуктов для inline-подсказок: сборка файла, загрузка
+(mmap, без разбора) и задержка ответов на префиксные и «опечаточные» запросы.
+
+    python bench/food_index.py --foods 500000
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from food_index import FoodCatalog, _write
+
+POPULAR = ["гречка", "куриная грудка", "овсянка", "творог", "банан", "яблоко", "рис", "яйцо",
+           "молоко", "хлеб ржаной", "сыр", "кефир", "Buckwheat", "Chicken Breast", "Oatmeal", "Cottage cheese"]
+CYR = "абвгдежзиклмнопрстуфхцчшэюя"
+LAT = "abcdefghiklmnoprstuvwyz"
+
+PREFIX = ["греч", "grech", "курин", "грудк", "Chicken br", "овс", "oat", "хлеб р"]
+TYPOS = ["творок", "buckwht", "гречька", "кифир", "Chiken", "малоко"]
+
+
+def make_foods(n: int, seed: int = 1) -> dict:
+    rnd = random.Random(seed)
+
+    def word(alphabet):
+        return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(3, 9)))
+
+    foods = {}
+    for i in range(n):
+        alphabet = CYR if rnd.random() < 0.6 else LAT
+        parts = [word(alphabet) for _ in range(rnd.randint(1, 3))]
+        if rnd.random() < 0.05:
+            parts.insert(0, rnd.choice(POPULAR))
+        foods[i + 1] = " ".join(parts)
+    return foods
+
+
+def measure(catalog: FoodCatalog, queries: list, rounds: int = 200) -> tuple:
+    lat = []
+    for _ in range(rounds):
+        for q in queries:
+            t0 = time.perf_counter()
+            catalog.suggest(q)
+            lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return lat[len(lat) // 2] * 1e6, lat[int(len(lat) * 0.99)] * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--foods", type=int, default=500_000)
+    args = ap.parse_args()
+
+    foods = make_foods(args.foods)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "foods.idx"
+        t0 = time.perf_counter()
+        _write(path, foods)
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        catalog = FoodCatalog(path)
+        load = time.perf_counter() - t0
+        print(f"foods={args.foods} file={path.stat().st_size / 1e6:.1f}MB build={build:.1f}s load={load * 1000:.2f}ms")
+        for name, queries in (("prefix", PREFIX), ("typos", TYPOS)):
+            p50, p99 = measure(catalog, queries)
+            print(f"  {name:6s} p50={p50:7.1f}us  p99={p99:7.1f}us")
+        catalog.index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# bench/food_search.py
+"""
+Вызовы FatSecret при поиске продуктов: каждый поиск напрямую в API против
+food_search (кэш нормализованных запросов + склейка одинаковых запросов).
+Запросы — популярные продукты с распределением Ципфа и разным написанием
+(«Гречка», «гречка », «ГРЕЧКА!»); FatSecret — локальный stub с задержкой.
+
+    python bench/food_search.py --requests 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web
+
+from fatsecret_client import FatSecretClient
+from food_search import FoodSearch
+
+FOODS = [
+    "гречка", "куриная грудка", "овсянка", "творог 5%", "банан", "яблоко", "рис", "яйцо куриное",
+    "молоко 2.5%", "хлеб ржаной", "сыр", "кефир", "говядина", "лосось", "картофель", "огурец",
+    "помидор", "макароны", "йогурт", "орехи", "ёжик", "индейка", "тунец", "авокадо",
+]
+
+
+async def start_stub(latency: float):
+    async def api(request):
+        await asyncio.sleep(latency)
+        if request.query.get("method") == "food.get.v2":
+            return web.json_response({"food": {"food_id": request.query.get("food_id")}})
+        q = request.query.get("search_expression", "")
+        return web.json_response({"foods": {"food": [{"food_id": str(abs(hash(q)) % 10000),
+                                                      "food_name": q}]}})
+
+    app = web.Application()
+    app.router.add_get("/rest/server.api", api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return runner, f"http://{host}:{port}"
+
+
+def spelling(rnd: random.Random, food: str) -> str:
+    return rnd.choice((food, food.capitalize(), food.upper() + "!", f"  {food} "))
+
+
+def workload(n: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(FOODS))]
+    return [spelling(rnd, f) for f in rnd.choices(FOODS, weights, k=n)]
+
+
+async def run(name: str, search, queries: list, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    lat = []
+
+    async def one(q):
+        async with sem:
+            t0 = time.perf_counter()
+            await search(q)
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    print(f"  {name:7s} total={elapsed:6.2f}s  p50={lat[len(lat) // 2] * 1000:6.1f}ms"
+          f"  p99={lat[int(len(lat) * 0.99)] * 1000:6.1f}ms", end="")
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.05)
+    args = ap.parse_args()
+
+    runner, base = await start_stub(args.latency)
+    queries = workload(args.requests)
+    print(f"requests={args.requests} concurrency={args.concurrency} stub_latency={args.latency * 1000:.0f}ms")
+    try:
+        client = FatSecretClient(base_url=base, api_url=f"{base}/rest/server.api", concurrency=args.concurrency)
+
+        async def direct(q):
+            return await client.call("stub", "foods.search", search_expression=q, max_results=20)
+
+        await run("direct", direct, queries, args.concurrency)
+        print(f"  upstream={client.requests}")
+
+        client.requests = 0
+
+        async def token():
+            return "stub"
+
+        cached = FoodSearch(client=client, access_token=token, index=None)
+        await run("cached", cached.search, queries, args.concurrency)
+        print(f"  upstream={client.requests}")
+        print("  ", cached.stats())
+        await client.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+# bench/metrics.py
+"""
+Накладные расходы инструментирования хендлеров (metrics.HandlerMetricsMiddleware).
+
+Сравнивать два прогона Dispatcher «с метриками» и «без» бесполезно: разница
+(единицы процентов) тонет в шуме между прогонами (±5–10%). Поэтому меряется
+отдельно сама цена middleware на вызов — timeit, корутина прогоняется без
+цикла событий, лучшая из --repeat серий, за вычетом прямого вызова того же
+хендлера, — и делится на время обработки одного апдейта Dispatcher без метрик
+(медиана --rounds прогонов). Middleware вызывается один раз на апдейт, так что
+отношение и есть доля накладных расходов. Бюджет — 2%; при превышении скрипт
+завершается с кодом 1.
+
+    python bench/metrics.py --updates 3000 --rounds 7 --calls 200000 --repeat 7
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery, Message, Update
+
+import metrics
+
+BUDGET = 0.02
+
+
+# хендлер на уровне реальных: разбор текста, сборка ответа (без сети)
+async def on_text(message: Message):
+    return f"Вы написали: {message.text.strip().lower()} ({len(message.text)} симв.)"
+
+
+async def on_button(call: CallbackQuery):
+    return call.data.split(":")
+
+
+def build() -> Dispatcher:
+    dp = Dispatcher()
+    router = Router()
+    router.message.register(on_text, F.text)
+    router.callback_query.register(on_button, F.data.startswith("ec_"))
+    dp.include_router(router)
+    return dp
+
+
+def make_updates(n: int) -> list:
+    user = {"id": 1, "is_bot": False, "first_name": "Bench"}
+    updates = []
+    for i in range(n):
+        if i % 3:
+            raw = {"update_id": i, "message": {"message_id": i, "date": 0, "from": user,
+                                               "chat": {"id": 1, "type": "private"}, "text": f" Гречка {i} "}}
+        else:
+            raw = {"update_id": i, "callback_query": {"id": str(i), "from": user, "chat_instance": "1",
+                                                      "data": f"ec_weight:{i}"}}
+        updates.append(Update.model_validate(raw))
+    return updates
+
+
+async def per_update(dp: Dispatcher, bot: Bot, updates: list, rounds: int) -> float:
+    """Медиана времени обработки одного апдейта, с."""
+    for u in updates[:500]:       # прогрев
+        await dp.feed_update(bot, u)
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for u in updates:
+            await dp.feed_update(bot, u)
+        samples.append((time.perf_counter() - t0) / len(updates))
+    return statistics.median(samples)
+
+
+def _drive(coro):
+    # хендлер не уступает управление — корутина завершается на первом send()
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("корутина уступила управление")
+
+
+class _Handler:
+    callback = staticmethod(on_text)
+
+
+def per_call(calls: int, repeat: int) -> tuple[float, float]:
+    """(прямой вызов хендлера, вызов через middleware) — лучшая серия, с на вызов."""
+    mw = metrics.HandlerMetricsMiddleware()
+    data = {"handler": _Handler()}
+
+    async def handler(event, data):
+        return None
+
+    direct = min(timeit.repeat(lambda: _drive(handler(None, data)), number=calls, repeat=repeat)) / calls
+    timed = min(timeit.repeat(lambda: _drive(mw(handler, None, data)), number=calls, repeat=repeat)) / calls
+    return direct, timed
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=3000)
+    ap.add_argument("--rounds", type=int, default=7)
+    ap.add_argument("--calls", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=7)
+    args = ap.parse_args()
+
+    bot = Bot("42:BENCH")
+    base = await per_update(build(), bot, make_updates(args.updates), args.rounds)
+    await bot.session.close()
+    direct, timed = per_call(args.calls, args.repeat)
+    cost = max(timed - direct, 0.0)
+    overhead = cost / base
+
+    print(f"updates={args.updates} rounds={args.rounds} calls={args.calls} repeat={args.repeat}")
+    print(f"  апдейт без метрик     {base * 1e6:7.2f} us (медиана)")
+    print(f"  middleware на вызов   {cost * 1e9:7.0f} ns ({timed * 1e9:.0f} - {direct * 1e9:.0f})")
+    print(f"  overhead={overhead * 100:.2f}% (бюджет {BUDGET * 100:.0f}%)")
+    if overhead > BUDGET:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+# bench/nutrition.py
+"""
+Ночной пересчёт КБЖУ: цикл по записям на Python против nutrition (NumPy).
+Синтетические дневники: --users пользователей × --days дней, 3–8 записей в день.
+Считаем суммы за день, за неделю, скользящее среднее за 7 дней и отклонение от цели.
+
+    python bench/nutrition.py --users 1000 --days 90
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict, namedtuple
+from datetime import date as date_cls, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from nutrition import (
+    MEALS, NutritionFrame, daily_totals, day_number, deviation, rolling_mean, weekly_totals,
+)
+
+# та же раскладка, что у food_diary.DiaryEntry (бенч не тянет клиент FatSecret)
+Entry = namedtuple("Entry", "name meal calories protein fat carbohydrate")
+
+
+def make_diaries(users: int, days: int, seed: int = 1):
+    rnd = random.Random(seed)
+    start = date_cls(2024, 1, 1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    diaries = {}
+    for u in range(1, users + 1):
+        by_date = {}
+        for d in dates:
+            by_date[d] = tuple(
+                Entry("еда", rnd.choice(MEALS), rnd.uniform(50, 700), rnd.uniform(0, 40),
+                           rnd.uniform(0, 30), rnd.uniform(0, 90))
+                for _ in range(rnd.randint(3, 8))
+            )
+        diaries[u] = by_date
+    targets = {u: (2000.0, 120.0, 70.0, 250.0) for u in range(1, users + 1)}
+    return diaries, targets
+
+
+def run_python(diaries, targets, window: int = 7):
+    daily = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    for user_id, by_date in diaries.items():
+        for date, entries in by_date.items():
+            acc = daily[(user_id, date)]
+            for e in entries:
+                acc[0] += e.calories
+                acc[1] += e.protein
+                acc[2] += e.fat
+                acc[3] += e.carbohydrate
+    weekly = defaultdict(lambda: [0.0, 0.0, 0.0, 0.0])
+    rolling, dev = {}, {}
+    for user_id, by_date in diaries.items():
+        dates = sorted(by_date)
+        goal = targets[user_id]
+        for i, date in enumerate(dates):
+            tot = daily[(user_id, date)]
+            week = (day_number(date) + 3) // 7
+            w = weekly[(user_id, week)]
+            for j in range(4):
+                w[j] += tot[j]
+            span = dates[max(0, i - window + 1): i + 1]
+            rolling[(user_id, date)] = [sum(daily[(user_id, d)][j] for d in span) / len(span) for j in range(4)]
+            dev[(user_id, date)] = [(tot[j] - goal[j]) / goal[j] for j in range(4)]
+    return daily, weekly, rolling, dev
+
+
+def run_numpy(diaries, targets, window: int = 7):
+    t0 = time.perf_counter()
+    frame = NutritionFrame.from_diaries(diaries)
+    build = time.perf_counter() - t0
+    daily = daily_totals(frame)
+    return build, (daily, weekly_totals(daily), rolling_mean(daily, window), deviation(daily, targets))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--days", type=int, default=90)
+    args = ap.parse_args()
+
+    diaries, targets = make_diaries(args.users, args.days)
+    entries = sum(len(e) for by_date in diaries.values() for e in by_date.values())
+    print(f"users={args.users} days={args.days} entries={entries}")
+
+    t0 = time.perf_counter()
+    py_daily, *_ = run_python(diaries, targets)
+    py_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    build, (daily, weekly, rolling, dev) = run_numpy(diaries, targets)
+    np_time = time.perf_counter() - t0
+
+    # сверка: суммы за день совпадают с наивным подсчётом
+    first = daily.dates()
+    for user_id in (1, args.users):
+        expect = np.array([py_daily[(user_id, d)] for d in first])
+        assert np.allclose(daily.row(user_id), expect), "расхождение сумм"
+
+    print(f"  python  total={py_time:6.2f}s")
+    print(f"  numpy   total={np_time:6.2f}s  (из них сборка кадра {build:5.2f}s, расчёт {np_time - build:5.3f}s)")
+    print(f"  ускорение x{py_time / np_time:.1f}; недель={weekly.data.shape[1]}")
+
+
+if __name__ == "__main__":
+    main()
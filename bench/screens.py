@@ -0,0 +1,71 @@
+# bench/screens.py
+"""
+Микробенчмарк: сборка ReplyKeyboardMarkup + сериализация aiogram на каждый
+send против готового JSON из каталога screens. Меряется до формы запроса
+(build_form_data), сеть не участвует.
+
+    python bench/screens.py --n 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Bot
+from aiogram.methods import SendMessage
+from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
+
+from bench.fake_telegram import FAKE_TOKEN
+from keyboards import TARIFFS_SCREEN
+from screens import encoded_markup
+
+
+def old_tariffs_kb() -> ReplyKeyboardMarkup:
+    # как было до каталога: новая клавиатура на каждый вызов
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="💼 Базовый")],
+            [KeyboardButton(text="🤑 Выгодный")],
+            [KeyboardButton(text="💎 Максимум")],
+            [KeyboardButton(text="⬅️ Назад")],
+        ],
+        resize_keyboard=True,
+        is_persistent=False,
+        one_time_keyboard=False,
+    )
+
+
+def per_call(bot: Bot, n: int):
+    for _ in range(n):
+        method = SendMessage(chat_id=1, text=TARIFFS_SCREEN.text, reply_markup=old_tariffs_kb(),
+                             parse_mode=TARIFFS_SCREEN.parse_mode)
+        bot.session.build_form_data(bot, method)
+
+
+def preencoded(bot: Bot, n: int):
+    for _ in range(n):
+        method = SendMessage.model_construct(
+            chat_id=1, text=TARIFFS_SCREEN.text, parse_mode=TARIFFS_SCREEN.parse_mode,
+            reply_markup=encoded_markup(TARIFFS_SCREEN.reply_markup),
+        )
+        bot.session.build_form_data(bot, method)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    bot = Bot(FAKE_TOKEN)
+    for name, fn in (("per-call build", per_call), ("pre-encoded", preencoded)):
+        fn(bot, 200)   # прогрев
+        t0 = time.perf_counter()
+        fn(bot, args.n)
+        dt = time.perf_counter() - t0
+        print(f"  {name:15s} {dt / args.n * 1e6:8.2f} µs/send  ({args.n / dt:9.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
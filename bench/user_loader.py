@@ -0,0 +1,118 @@
+# bench/user_loader.py
+"""
+Всплеск одновременных чтений User по tg_id: find_unique на каждый запрос
+против UserLoader (find_many пачками). Печатает запросы к БД, QPS и p50/p99.
+
+По умолчанию БД эмулируется (фикс. задержка запроса + ограниченный пул
+соединений). С --real идёт в настоящий Postgres по DATABASE_URL.
+
+    python bench/user_loader.py --requests 5000 --users 800
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_loader import UserLoader
+
+
+class FakeUserDelegate:
+    def __init__(self, latency: float, pool: int):
+        self.latency = latency
+        self.sem = asyncio.Semaphore(pool)
+        self.queries = 0
+
+    async def _query(self, rows):
+        async with self.sem:
+            self.queries += 1
+            await asyncio.sleep(self.latency)
+            return rows
+
+    async def find_unique(self, where):
+        return await self._query(SimpleNamespace(tg_id=where["tg_id"]))
+
+    async def find_many(self, where):
+        return await self._query([SimpleNamespace(tg_id=t) for t in where["tg_id"]["in"]])
+
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def burst(get, keys: list[int]) -> list[float]:
+    lat: list[float] = []
+
+    async def one(k: int):
+        t0 = time.perf_counter()
+        await get(k)
+        lat.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(one(k) for k in keys))
+    return lat
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=5000)
+    ap.add_argument("--users", type=int, default=800, help="различных tg_id во всплеске")
+    ap.add_argument("--latency", type=float, default=0.002, help="задержка эмулируемого запроса, сек")
+    ap.add_argument("--pool", type=int, default=10, help="соединений в эмулируемом пуле")
+    ap.add_argument("--real", action="store_true", help="использовать Prisma и DATABASE_URL")
+    args = ap.parse_args()
+
+    rnd = random.Random(1)
+    keys = [rnd.randint(1, args.users) for _ in range(args.requests)]
+
+    if args.real:
+        from prisma import Prisma
+        db = Prisma()
+        await db.connect()
+        delegate = db.user
+        counted = SimpleNamespace(queries=0)
+
+        async def find_unique(where):
+            counted.queries += 1
+            return await delegate.find_unique(where=where)
+
+        async def find_many(where):
+            counted.queries += 1
+            return await delegate.find_many(where=where)
+
+        fake = SimpleNamespace(find_unique=find_unique, find_many=find_many)
+    else:
+        db = None
+        counted = fake = FakeUserDelegate(args.latency, args.pool)
+
+    results = {}
+
+    counted.queries = 0
+    t0 = time.perf_counter()
+    lat = await burst(lambda k: fake.find_unique(where={"tg_id": k}), keys)
+    results["find_unique"] = (time.perf_counter() - t0, counted.queries, lat)
+
+    counted.queries = 0
+    loader = UserLoader(SimpleNamespace(user=fake))
+    t0 = time.perf_counter()
+    lat = await burst(loader.load, keys)
+    results["UserLoader"] = (time.perf_counter() - t0, counted.queries, lat)
+
+    if db is not None:
+        await db.disconnect()
+
+    print(f"requests={args.requests} distinct={len(set(keys))}")
+    for name, (elapsed, queries, lat) in results.items():
+        print(
+            f"  {name:12s} db_queries={queries:6d}  {args.requests / elapsed:9.0f} req/s"
+            f"  p50={pct(lat, .5) * 1000:7.2f}ms  p99={pct(lat, .99) * 1000:7.2f}ms"
+        )
+    print("  loader:", loader.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
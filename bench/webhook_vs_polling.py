@@ -0,0 +1,110 @@
+# bench/webhook_vs_polling.py
+"""
+Сравнение пропускной способности polling и webhook на локальном фейковом Bot API.
+
+    python bench/webhook_vs_polling.py --updates 5000 --rtt 0.02
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Dispatcher, F
+from aiogram.types import Message
+
+from bench.fake_telegram import FAKE_TOKEN, FakeTelegram, make_update
+from webhook import SECRET_HEADER, build_webhook_app
+
+
+def bench_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+
+    @dp.message(F.text)
+    async def echo(message: Message):
+        await message.answer("pong")
+
+    return dp
+
+
+async def run_polling(fake: FakeTelegram, n: int) -> float:
+    bot = Bot(FAKE_TOKEN, session=fake.session())
+    dp = bench_dispatcher()
+    fake.pending = [make_update(i + 1, 1000 + i % 500) for i in range(n)]
+    fake.expect(n)
+
+    t0 = time.perf_counter()
+    task = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    await fake.sent_event.wait()
+    elapsed = time.perf_counter() - t0
+    await dp.stop_polling()
+    await task
+    await bot.session.close()
+    return elapsed
+
+
+async def run_webhook(fake: FakeTelegram, n: int, concurrency: int) -> float:
+    bot = Bot(FAKE_TOKEN, session=fake.session())
+    dp = bench_dispatcher()
+    secret = "bench-secret"
+    app = build_webhook_app(dp, bot, path="/wh", secret=secret)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    url = f"http://{host}:{port}/wh"
+    fake.expect(n)
+
+    sem = asyncio.Semaphore(concurrency)
+    retries = 0
+
+    async with ClientSession() as http:
+        async def post(i: int):
+            nonlocal retries
+            async with sem:
+                while True:
+                    async with http.post(url, json=make_update(i + 1, 1000 + i % 500),
+                                         headers={SECRET_HEADER: secret}) as resp:
+                        if resp.status == 200:
+                            return
+                    # 503 = очередь заполнена, Telegram бы повторил доставку
+                    retries += 1
+                    await asyncio.sleep(0.01)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(n)))
+        await fake.sent_event.wait()
+        elapsed = time.perf_counter() - t0
+
+    await runner.cleanup()
+    await bot.session.close()
+    if retries:
+        print(f"  webhook: {retries} повторов из-за переполненной очереди")
+    return elapsed
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=5000)
+    ap.add_argument("--rtt", type=float, default=0.02, help="задержка фейкового API, сек")
+    ap.add_argument("--concurrency", type=int, default=40, help="параллельных POST от «Telegram»")
+    args = ap.parse_args()
+
+    fake = await FakeTelegram(rtt=args.rtt).start()
+    try:
+        t_poll = await run_polling(fake, args.updates)
+        t_hook = await run_webhook(fake, args.updates, args.concurrency)
+    finally:
+        await fake.stop()
+
+    print(f"updates={args.updates} rtt={args.rtt * 1000:.0f}ms")
+    print(f"  polling: {t_poll:.2f}s  {args.updates / t_poll:8.0f} upd/s")
+    print(f"  webhook: {t_hook:.2f}s  {args.updates / t_hook:8.0f} upd/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,11 +2,10 @@
 import os
 import asyncio
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message
+from aiogram.types import Message, InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 from aiogram.filters import CommandStart
 from aiogram.types import Message
-from reg import router as reg_router, show_client_reg, db as reg_db, main_kb
-from prisma import Prisma
+from reg import router as reg_router, show_client_reg, db as reg_db, users, main_kb, profile_buffer
 from dotenv import load_dotenv
 from pathlib import Path
 from helpers import send_keep, send_temp
@@ -14,20 +13,43 @@ load_dotenv(dotenv_path=Path(__file__).parent / ".env")
 print("DEBUG .env BOT_TOKEN:", os.getenv("BOT_TOKEN"))
 from helpers import send_temp
 from keyboards import client_kb
+from webhook import BOT_MODE, run_webhook, run_polling
+from sharding import BOT_SHARDS, run_sharded
+from user_cache import UserScopeMiddleware
+from profile_buffer import ProfileFlushMiddleware
+from fsm_storage import FSM_STORAGE, PrismaStorage, FsmFlushMiddleware
+from expiry import engine as expiry_engine
+import text_dispatch
+import database
+from fatsecret_client import client as fs_client
+from fatsecret_tokens import tokens as fs_tokens
+from fatsecret_sweeper import sweeper as fs_sweeper
+from food_index import catalog as food_catalog
+from food_search import food_search
+from broadcast import engine as broadcasts, router as broadcast_router
+from reminders import scheduler as reminders
+from reg import user_loader
+from food_diary import diary as food_diary
+from sender import scheduler as send_scheduler, send
+import metrics
+import profiler
 
 
 
 
-# Prisma engine общается по localhost; прокси ломают соединение → отключаем прокси для локалхоста
-os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
-os.environ.setdefault("no_proxy", "127.0.0.1,localhost")
+# NO_PROXY для Prisma engine выставляет database.py
 # (опционально) форсируем бинарный движок
 os.environ.setdefault("PRISMA_CLIENT_ENGINE_TYPE", "binary")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-db = Prisma()
 async def on_start(message: Message):
-    user = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
+    user = await users.get(message.from_user.id)
     if user:
+        # пишет нам — значит, уже не заблокировал (если my_chat_member не дошёл). Флаг могли
+        # поставить рассылка или напоминания в другом процессе, поэтому кэшу не верим — условный update в БД
+        if await reg_db.user.update_many(
+            where={"tg_id": message.from_user.id, "botBlocked": True}, data={"botBlocked": False},
+        ):
+            users.invalidate(message.from_user.id)
         has_tariff = bool(user.tariffName)
         await send_temp(message, "👋 С возвращением! Главное меню клиента.", reply_markup=client_kb(has_tariff))
         return
@@ -36,7 +58,7 @@ async def on_start(message: Message):
 # ЗАМЕНИ содержимое on_client на это:
 from aiogram.fsm.context import FSMContext
 async def on_client(message: Message, state: FSMContext):
-    user = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
+    user = await users.get(message.from_user.id)
     if user:
         has_tariff = bool(user.tariffName)
         await send_temp(message, "Открываю меню клиента.", reply_markup=client_kb(has_tariff))
@@ -45,31 +67,128 @@ async def on_client(message: Message, state: FSMContext):
 
 
 
+def register_metrics():
+    # числовые поля stats() компонентов → gauge на /metrics
+    for name, component in (
+        ("users", users), ("user_loader", user_loader), ("profile", profile_buffer),
+        ("sender", send_scheduler), ("expiry", expiry_engine), ("fatsecret_tokens", fs_tokens),
+        ("fatsecret_sweeper", fs_sweeper), ("food_diary", food_diary), ("food_search", food_search),
+        ("food_index", food_catalog), ("broadcast", broadcasts), ("reminders", reminders),
+    ):
+        metrics.register(name, component.stats)
+    metrics.register("db", lambda: {"reconnects": database.reconnects})
+    if profiler.PROFILE_UPDATES:
+        metrics.register("profiler", profiler.profiler.stats)
+
+
+async def on_startup(bot: Bot, shard: tuple = (0, 1)):
+    metrics.instrument_bot(bot)
+    register_metrics()
+    if metrics.METRICS_PORT:
+        await metrics.start(metrics.METRICS_PORT + shard[0])   # у каждого воркера шарда свой порт
+    if profiler.PROFILE_UPDATES:
+        profiler.profiler.start(shard)
+    # правки профиля, которые так и не удалось записать, — сообщаем пользователю
+    profile_buffer.notify = lambda tg_id, text: send(tg_id, lambda: bot.send_message(tg_id, text))
+    # поднимаем сохранённые удаления временных сообщений (PendingDeletion)
+    await expiry_engine.start(bot, reg_db, shard)   # у воркера шарда — только его чаты
+    await fs_tokens.start()
+    fs_sweeper.start(shard)   # в шардированном режиме каждый воркер обходит свою часть токенов
+    food_catalog.start()
+    await broadcasts.start(bot, shard)   # незавершённые рассылки продолжаются с курсора
+    await reminders.start(bot, shard)
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    await profile_buffer.flush_all()   # несохранённые правки профиля — до отключения БД
+    await dispatcher.storage.close()   # PrismaStorage: отложенные записи FSM (start_polling делал это сам)
+    await broadcasts.stop()
+    await reminders.stop()   # взятые в аренду напоминания подхватит другой процесс по истечении leasedUntil
+    await expiry_engine.stop()
+    await food_catalog.stop()   # дописываем в индекс продукты, увиденные с последней пересборки
+    await fs_sweeper.stop()
+    await fs_tokens.stop()
+    await fs_client.close()
+    await send_scheduler.close()   # досылаем очередь (до SEND_DRAIN_TIMEOUT) после всех, кто в неё пишет
+    await metrics.stop()
+    if profiler.PROFILE_UPDATES:
+        await profiler.profiler.stop()   # дописывает накопленные профили на диск
+
+
 async def on_about(message: Message):
     await message.answer("ℹ️ Тут будет в будущем крутой текст о боте 🚀")
     
 
-async def main():
-    if not BOT_TOKEN or "REPLACE_ME" in BOT_TOKEN:
-        raise SystemExit("Заполни BOT_TOKEN (переменная окружения или константа в файле).")
+async def on_inline(query: InlineQuery):
+    # подсказки продуктов из локального индекса; FatSecret — только если локально пусто
+    found = food_catalog.suggest(query.query, limit=20)
+    if not found and len(query.query.strip()) >= 3:
+        try:
+            await food_search.search(query.query)     # кэш + склейка запросов; ответ пополнит индекс
+        except Exception as e:
+            print("DEBUG inline: поиск FatSecret не удался:", e)
+        found = food_catalog.suggest(query.query, limit=20)
+    results = [
+        InlineQueryResultArticle(
+            id=str(food_id),
+            title=name,
+            input_message_content=InputTextMessageContent(message_text=name),
+        )
+        for food_id, name in found
+    ]
+    await query.answer(results, cache_time=300, is_personal=False)
 
-    bot = Bot(BOT_TOKEN)
-    dp = Dispatcher()
+
+def build_dispatcher() -> Dispatcher:
+    storage = PrismaStorage(reg_db) if FSM_STORAGE == "db" else None
+    dp = Dispatcher(storage=storage) if storage is not None else Dispatcher()
+    profiler.install(dp)   # PROFILE_UPDATES=1: самый внешний middleware — время всего апдейта
+    if storage is not None:
+        dp.update.outer_middleware(FsmFlushMiddleware(storage))
+    metrics.instrument_dispatcher(dp)   # время каждого хендлера всех роутеров
+    dp.update.outer_middleware(UserScopeMiddleware(users))
+    dp.update.outer_middleware(ProfileFlushMiddleware(profile_buffer))
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
     from tariff_handlers import router as tariff_router
     dp.include_router(tariff_router)
+    dp.include_router(broadcast_router)
     from aiogram import Router
 
     router = Router()
     router.message.register(on_start, CommandStart())
     router.message.register(on_client, F.text == "КЛИЕНТ")
     router.message.register(on_about,  F.text == "ℹ️ О нас")
+    router.inline_query.register(on_inline)
 
     dp.include_router(router)
     dp.include_router(reg_router)
+    # точные тексты кнопок → хендлер одним поиском в dict (после подключения всех роутеров)
+    metrics.register("text_dispatch", text_dispatch.install(dp).stats)
+    return dp
+
 
-    await reg_db.connect(timeout=20)
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+async def main():
+    if not BOT_TOKEN or "REPLACE_ME" in BOT_TOKEN:
+        raise SystemExit("Заполни BOT_TOKEN (переменная окружения или константа в файле).")
+
+    bot = Bot(BOT_TOKEN)
+    dp = build_dispatcher()
+
+    if BOT_SHARDS > 1:
+        # фронт только принимает апдейты, БД подключают воркеры (см. sharding.py)
+        await run_sharded(dp, bot, BOT_MODE, BOT_SHARDS)
+        return
+
+    await database.connect()
+    try:
+        # режим выбирается через BOT_MODE: polling (по умолчанию) | webhook
+        if BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            await run_polling(dp, bot)
+    finally:
+        await database.disconnect()
 
 if __name__ == "__main__":
     asyncio.run(main())
-
@@ -0,0 +1,260 @@
+# broadcast.py
+"""
+Рассылка по сегменту пользователей (все с данным tariffName).
+
+Получатели не грузятся целиком: User читается страницами по
+BROADCAST_PAGE строк keyset-курсором по id (индекс [tariffName, botBlocked, id]),
+следующая страница запрашивается, пока отправляется текущая. Сообщения
+уходят через sender с приоритетом BULK — ответы пользователям не ждут рассылку,
+лимиты Telegram и 429 соблюдает scheduler.
+
+После каждой страницы одной транзакцией пишутся курсор и счётчики в
+Broadcast и флаг botBlocked всем, кто заблокировал бота (TelegramForbiddenError) —
+им следующие рассылки уже не отправляются. Незавершённые рассылки (status
+"running") продолжаются при старте с lastUserId; страница, прерванная падением,
+отправится повторно (не больше BROADCAST_PAGE сообщений).
+
+/broadcast <тариф>, со следующей строки — текст (только для BROADCAST_ADMINS);
+/broadcast_stop <id> — отменить (из любого воркера шарда: статус перечитывается
+после каждой страницы). Флаг botBlocked снимается, когда пользователь
+разблокирует бота (my_chat_member → member) или снова пишет /start.
+Прогресс (отправлено/сек, ETA) — в лог раз в BROADCAST_REPORT_EVERY секунд и в stats().
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from aiogram import Bot, F, Router
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.filters import KICKED, MEMBER, ChatMemberUpdatedFilter, Command, CommandObject
+from aiogram.types import ChatMemberUpdated, Message
+
+from database import db
+from reg import users as user_cache
+from sender import BULK, send
+
+BROADCAST_PAGE = int(os.getenv("BROADCAST_PAGE", "500"))
+BROADCAST_REPORT_EVERY = float(os.getenv("BROADCAST_REPORT_EVERY", "10"))
+BROADCAST_ADMINS = {int(x) for x in os.getenv("BROADCAST_ADMINS", "").replace(" ", "").split(",") if x}
+
+
+class _Progress:
+    __slots__ = ("id", "segment", "remaining", "sent", "failed", "blocked", "started", "done_here", "reported")
+
+    def __init__(self, row, remaining: int):
+        self.id = row.id
+        self.segment = row.segment
+        self.remaining = remaining      # сколько получателей осталось на момент (пере)запуска
+        self.sent = row.sent
+        self.failed = row.failed
+        self.blocked = row.blocked
+        self.started = time.monotonic()
+        self.done_here = 0              # обработано в этом запуске — для скорости
+        self.reported = self.started
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        rate = self.done_here / elapsed if elapsed > 0 else 0.0
+        left = max(self.remaining - self.done_here, 0)
+        return {
+            "id": self.id,
+            "segment": self.segment,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "left": left,
+            "per_sec": round(rate, 1),
+            "eta": round(left / rate) if rate > 0 else None,
+        }
+
+
+class BroadcastEngine:
+    def __init__(self, *, database=db, page: int = BROADCAST_PAGE, report_every: float = BROADCAST_REPORT_EVERY):
+        self.db = database
+        self.page = page
+        self.report_every = report_every
+        self._bot: Optional[Bot] = None
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._progress: dict[int, _Progress] = {}
+        self.finished = 0
+
+    # ---------- API ----------
+
+    async def start(self, bot: Bot, shard: tuple = (0, 1)):
+        """Продолжить незавершённые рассылки (в шардированном режиме — только воркер 0)."""
+        self._bot = bot
+        if shard[0] != 0:
+            return
+        for row in await self.db.broadcast.find_many(where={"status": "running"}, order={"id": "asc"}):
+            print(f"DEBUG broadcast #{row.id}: продолжаем с userId > {row.lastUserId}")
+            self._spawn(row)
+
+    async def create(self, segment: str, text: str) -> int:
+        """Запустить рассылку text всем пользователям с tariffName == segment; вернуть id."""
+        total = await self.db.user.count(where={"tariffName": segment, "botBlocked": False})
+        row = await self.db.broadcast.create(data={"segment": segment, "text": text, "total": total})
+        print(f"DEBUG broadcast #{row.id}: {segment!r}, получателей {total}")
+        self._spawn(row)
+        return row.id
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        updated = await self.db.broadcast.update_many(
+            where={"id": broadcast_id, "status": "running"}, data={"status": "cancelled"},
+        )
+        return bool(updated)
+
+    async def stop(self):
+        # status остаётся "running" — рассылка продолжится после рестарта
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": [p.snapshot() for p in self._progress.values()],
+            "finished": self.finished,
+        }
+
+    # ---------- внутреннее ----------
+
+    def _spawn(self, row):
+        if row.id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(row))
+        self._tasks[row.id] = task
+        task.add_done_callback(lambda _t: (self._tasks.pop(row.id, None), self._progress.pop(row.id, None)))
+
+    def _fetch(self, segment: str, cursor: int):
+        return self.db.user.find_many(
+            where={"tariffName": segment, "botBlocked": False, "id": {"gt": cursor}},
+            order={"id": "asc"},
+            take=self.page,
+        )
+
+    async def _deliver(self, tg_id: int, text: str) -> str:
+        try:
+            await send(tg_id, lambda: self._bot.send_message(tg_id, text), priority=BULK)
+        except TelegramForbiddenError:
+            return "blocked"
+        except Exception as e:
+            print("DEBUG broadcast: не отправлено", tg_id, e)
+            return "failed"
+        return "sent"
+
+    async def _run(self, row):
+        try:
+            await self._pages(row)
+        except Exception as e:
+            # status остаётся "running" — рассылка продолжится с курсора после рестарта
+            print(f"DEBUG broadcast #{row.id}: упала:", e)
+
+    async def _pages(self, row):
+        remaining = await self.db.user.count(
+            where={"tariffName": row.segment, "botBlocked": False, "id": {"gt": row.lastUserId}},
+        )
+        progress = self._progress[row.id] = _Progress(row, remaining)
+        cursor = row.lastUserId
+        next_page = asyncio.ensure_future(self._fetch(row.segment, cursor))
+        try:
+            while True:
+                users = await next_page
+                if not users:
+                    break
+                cursor = users[-1].id
+                next_page = asyncio.ensure_future(self._fetch(row.segment, cursor))   # читаем, пока шлём
+
+                results = await asyncio.gather(*(self._deliver(u.tg_id, row.text) for u in users))
+                blocked = [u for u, r in zip(users, results) if r == "blocked"]
+                sent, failed = results.count("sent"), results.count("failed")
+                progress.sent += sent
+                progress.failed += failed
+                progress.blocked += len(blocked)
+                progress.done_here += len(users)
+                await self._checkpoint(row.id, cursor, sent, failed, blocked)
+                self._report(progress)
+                # /broadcast_stop мог прийти в другой воркер шарда — его видно только по БД
+                if not await self._still_running(row.id):
+                    print(f"DEBUG broadcast #{row.id}: отменена, остановлена на userId {cursor}")
+                    return
+        finally:
+            next_page.cancel()
+        await self.db.broadcast.update_many(where={"id": row.id, "status": "running"}, data={"status": "done"})
+        self.finished += 1
+        print(f"DEBUG broadcast #{row.id} завершена:", progress.snapshot())
+
+    async def _checkpoint(self, broadcast_id: int, cursor: int, sent: int, failed: int, blocked: list):
+        async with self.db.batch_() as batcher:
+            batcher.broadcast.update(
+                where={"id": broadcast_id},
+                data={
+                    "lastUserId": cursor,
+                    "sent": {"increment": sent},
+                    "failed": {"increment": failed},
+                    "blocked": {"increment": len(blocked)},
+                },
+            )
+            if blocked:
+                batcher.user.update_many(where={"id": {"in": [u.id for u in blocked]}}, data={"botBlocked": True})
+        for u in blocked:
+            user_cache.invalidate(u.tg_id)   # запись мимо UserCache — закэшированный botBlocked устарел
+
+    async def _still_running(self, broadcast_id: int) -> bool:
+        row = await self.db.broadcast.find_unique(where={"id": broadcast_id})
+        return row is not None and row.status == "running"
+
+    def _report(self, progress: _Progress):
+        now = time.monotonic()
+        if now - progress.reported >= self.report_every:
+            progress.reported = now
+            print(f"DEBUG broadcast #{progress.id}:", progress.snapshot())
+
+
+engine = BroadcastEngine()
+
+router = Router()
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject):
+    if message.from_user.id not in BROADCAST_ADMINS:
+        return
+    segment, _, text = (command.args or "").partition("\n")
+    segment, text = segment.strip(), text.strip()
+    if not segment or not text:
+        await message.answer("Формат: /broadcast <тариф>\n<текст сообщения>")
+        return
+    broadcast_id = await engine.create(segment, text)
+    await message.answer(f"📣 Рассылка #{broadcast_id} запущена для тарифа «{segment}».")
+
+
+@router.message(Command("broadcast_stop"))
+async def cmd_broadcast_stop(message: Message, command: CommandObject):
+    if message.from_user.id not in BROADCAST_ADMINS:
+        return
+    if not (command.args or "").strip().isdigit():
+        await message.answer("Формат: /broadcast_stop <id>")
+        return
+    broadcast_id = int(command.args.strip())
+    if await engine.cancel(broadcast_id):
+        await message.answer(f"⏹ Рассылка #{broadcast_id} остановлена.")
+    else:
+        await message.answer(f"Рассылка #{broadcast_id} не найдена или уже завершена.")
+
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(KICKED >> MEMBER))
+async def on_unblocked(event: ChatMemberUpdated):
+    # пользователь разблокировал бота — снова получает рассылки и напоминания
+    await db.user.update_many(where={"tg_id": event.from_user.id, "botBlocked": True}, data={"botBlocked": False})
+    user_cache.invalidate(event.from_user.id)
+
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(MEMBER >> KICKED))
+async def on_blocked(event: ChatMemberUpdated):
+    await db.user.update_many(where={"tg_id": event.from_user.id}, data={"botBlocked": True})
+    user_cache.invalidate(event.from_user.id)
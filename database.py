@@ -0,0 +1,140 @@
+# database.py
+"""
+Единственный клиент Prisma на процесс: bot.py, reg.py, fatsecret.py и остальные
+модули импортируют db отсюда, а подключение/отключение делает main (или
+воркер шарда) через connect() / disconnect().
+
+- DB_POOL_SIZE / DB_POOL_TIMEOUT — размер пула соединений query engine
+  (дописываются к DATABASE_URL как connection_limit / pool_timeout);
+- при старте пул «прогревается» DB_WARMUP параллельными SELECT 1;
+- фоновый watchdog раз в DB_HEALTH_EVERY секунд проверяет движок и
+  переподключается, если он упал;
+- users_db — db.user через asyncpg при FAST_DB=1 (см. fastdb.py), иначе сам db;
+- время каждого запроса (и коммита batch_) пишется в metrics.DB.
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from dotenv import load_dotenv
+from prisma import Prisma
+
+# до import fastdb: FAST_DB* читаются при импорте модуля
+load_dotenv(dotenv_path=Path(__file__).parent / ".env")
+
+import fastdb
+import metrics
+
+# Prisma engine общается по localhost; прокси ломают соединение → отключаем прокси для локалхоста
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+os.environ.setdefault("no_proxy", "127.0.0.1,localhost")
+
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")            # None → значение по умолчанию Prisma
+DB_POOL_TIMEOUT = os.getenv("DB_POOL_TIMEOUT")      # сек ожидания свободного соединения
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "20"))
+DB_WARMUP = int(os.getenv("DB_WARMUP", DB_POOL_SIZE or "4"))
+DB_HEALTH_EVERY = float(os.getenv("DB_HEALTH_EVERY", "15"))
+
+
+def _datasource_url() -> Optional[str]:
+    url = os.getenv("DATABASE_URL")
+    if not url or not (DB_POOL_SIZE or DB_POOL_TIMEOUT):
+        return None
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    if DB_POOL_SIZE:
+        query["connection_limit"] = DB_POOL_SIZE
+    if DB_POOL_TIMEOUT:
+        query["pool_timeout"] = DB_POOL_TIMEOUT
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class TimedPrisma(Prisma):
+    # у Prisma __slots__ — метод экземпляра не подменить, поэтому подкласс
+    async def _execute(self, *, method, arguments, model=None, root_selection=None):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await super()._execute(
+                method=method, arguments=arguments, model=model, root_selection=root_selection,
+            )
+            status = "ok"
+            return result
+        finally:
+            metrics.observe_db("prisma", model.__name__ if model is not None else "raw", method, status,
+                               time.perf_counter() - started)
+
+    def batch_(self):
+        batch = super().batch_()
+        batch.commit = metrics.timed_db(batch.commit, "prisma", "batch", "commit")
+        return batch
+
+
+_url = _datasource_url()
+db = TimedPrisma(datasource={"url": _url}) if _url else TimedPrisma()
+users_db = fastdb.user_db(db)     # горячие запросы к User (UserCache / UserLoader)
+
+_watchdog: Optional[asyncio.Task] = None
+reconnects = 0
+
+
+async def _warmup(n: int):
+    # каждое параллельное обращение заставляет движок открыть своё соединение из пула
+    await asyncio.gather(*(db.query_raw("SELECT 1") for _ in range(max(1, n))))
+
+
+async def _reconnect():
+    global reconnects
+    reconnects += 1
+    try:
+        if db.is_connected():
+            await db.disconnect()
+    except Exception:
+        pass
+    await db.connect(timeout=DB_CONNECT_TIMEOUT)
+
+
+async def _watch():
+    while True:
+        await asyncio.sleep(DB_HEALTH_EVERY)
+        try:
+            if not db.is_connected():
+                raise ConnectionError("Prisma отключена")
+            await db.query_raw("SELECT 1")
+        except Exception as e:
+            print("DEBUG db: движок недоступен, переподключаюсь:", e)
+            try:
+                await _reconnect()
+            except Exception as e:
+                print("DEBUG db: переподключение не удалось:", e)
+
+
+async def connect(*, warmup: int = DB_WARMUP):
+    global _watchdog
+    if not db.is_connected():
+        await db.connect(timeout=DB_CONNECT_TIMEOUT)
+    if warmup:
+        await _warmup(warmup)
+    if _watchdog is None or _watchdog.done():
+        _watchdog = asyncio.create_task(_watch())
+    if isinstance(users_db, fastdb.FastDB):
+        try:
+            await users_db.connect()
+        except Exception as e:
+            # без пула FastUserDelegate сам уходит в Prisma
+            print("DEBUG db: пул asyncpg не поднят, User идёт через Prisma:", e)
+
+
+async def disconnect():
+    global _watchdog
+    if _watchdog is not None:
+        _watchdog.cancel()
+        await asyncio.gather(_watchdog, return_exceptions=True)
+        _watchdog = None
+    if isinstance(users_db, fastdb.FastDB):
+        await users_db.disconnect()
+    if db.is_connected():
+        await db.disconnect()
@@ -0,0 +1,217 @@
+# expiry.py
+"""
+Удаление временных сообщений (send_temp) без отдельной спящей задачи на каждое.
+
+Колесо таймеров с шагом в 1 секунду: слот = секунда удаления,
+внутри слота — chat_id → [message_id, ...]. Одна задача просыпается к
+ближайшему слоту и удаляет всё, что в нём, пачками delete_messages
+по 100 id на чат (через sender, приоритет BULK).
+
+Ожидающие удаления пишутся в таблицу PendingDeletion пачками раз в
+EXPIRY_FLUSH_EVERY секунд и поднимаются при старте, так что рестарт
+их не теряет (окно потери — последние EXPIRY_FLUSH_EVERY секунд). В
+шардированном режиме воркер поднимает и вычищает из БД только свои чаты
+(chatId по модулю числа шардов, как ShardRouter раскладывает апдейты).
+"""
+import asyncio
+import contextvars
+import heapq
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from aiogram import Bot
+
+from sender import BULK, send
+
+EXPIRY_FLUSH_EVERY = float(os.getenv("EXPIRY_FLUSH_EVERY", "2"))
+DELETE_BATCH = 100          # лимит deleteMessages
+
+# неотрицательный остаток, как % в Python (у групп chatId < 0)
+_SHARD_ROWS_SQL = """
+SELECT "chatId", "messageId", "deleteAt" FROM "PendingDeletion"
+WHERE (("chatId" % $2::bigint) + $2::bigint) % $2::bigint = $1::bigint
+"""
+_SHARD_CLEANUP_SQL = """
+DELETE FROM "PendingDeletion"
+WHERE "deleteAt" <= to_timestamp($3::bigint) AT TIME ZONE 'UTC'
+  AND (("chatId" % $2::bigint) + $2::bigint) % $2::bigint = $1::bigint
+"""
+
+
+def _ts(value) -> int:
+    # query_raw отдаёт DateTime строкой ISO; колонки Prisma хранят UTC без пояса
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+class ExpiryEngine:
+    def __init__(self, *, flush_every: float = EXPIRY_FLUSH_EVERY):
+        self.flush_every = flush_every
+        self._slots: dict[int, dict[int, list[int]]] = {}
+        self._due: list[int] = []                         # куча секунд-слотов
+        self._unsaved: list[tuple[int, int, int]] = []    # (chat_id, message_id, slot) ещё не в БД
+        self._fired_until = 0                             # слоты <= этого уже отработаны
+        self._cleaned_until = 0                           # ... и вычищены из БД
+        self._wake = asyncio.Event()
+        self._bot: Optional[Bot] = None
+        self._db = None
+        self._shard = (0, 1)
+        self._runner: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._deleting: set[asyncio.Task] = set()
+        self.pending = 0
+        self.deleted = 0
+        self.delete_calls = 0
+        self.failed = 0
+
+    # ---------- API ----------
+
+    def schedule(self, bot: Bot, chat_id: int, message_id: int, delay: float):
+        slot = int(time.time() + delay) + 1
+        self._add(chat_id, message_id, slot)
+        if self._db is not None:
+            self._unsaved.append((chat_id, message_id, slot))
+        if self._bot is None:
+            self._bot = bot
+        self._ensure_running()
+
+    async def start(self, bot: Bot, db=None, shard: tuple = (0, 1)):
+        """Поднять сохранённые удаления и запустить фоновые задачи (db — подключённый Prisma)."""
+        self._bot = bot
+        self._db = db
+        self._shard = shard
+        if db is not None:
+            index, shards = shard
+            if shards > 1:
+                for row in await db.query_raw(_SHARD_ROWS_SQL, index, shards):
+                    self._add(int(row["chatId"]), int(row["messageId"]), _ts(row["deleteAt"]))
+            else:
+                for row in await db.pendingdeletion.find_many():
+                    self._add(row.chatId, row.messageId, int(row.deleteAt.timestamp()))
+            self._flusher = asyncio.create_task(self._flush_loop(), context=contextvars.Context())
+        self._ensure_running()
+
+    async def stop(self):
+        for task in (self._runner, self._flusher):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._runner = self._flusher = None
+        await asyncio.gather(*self._deleting, return_exceptions=True)
+        if self._db is not None:
+            await self._flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "slots": len(self._slots),
+            "deleted": self.deleted,
+            "delete_calls": self.delete_calls,
+            "failed": self.failed,
+            "unsaved": len(self._unsaved),
+        }
+
+    # ---------- колесо ----------
+
+    def _add(self, chat_id: int, message_id: int, slot: int):
+        chats = self._slots.get(slot)
+        if chats is None:
+            chats = self._slots[slot] = {}
+            heapq.heappush(self._due, slot)
+            if self._due[0] == slot:
+                self._wake.set()       # новый ближайший слот — разбудить runner
+        ids = chats.get(chat_id)
+        if ids is None:
+            chats[chat_id] = [message_id]
+        else:
+            ids.append(message_id)
+        self.pending += 1
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            try:
+                # чистый контекст: schedule() зовут из хендлеров, цикл переживает их апдейт
+                self._runner = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+            except RuntimeError:
+                pass   # нет цикла событий — запустится в start()
+
+    async def _run(self):
+        while True:
+            if not self._due:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            delay = self._due[0] - time.time()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            slot = heapq.heappop(self._due)
+            chats = self._slots.pop(slot)
+            for chat_id, ids in chats.items():
+                self.pending -= len(ids)
+                for i in range(0, len(ids), DELETE_BATCH):
+                    task = asyncio.create_task(self._delete(chat_id, ids[i:i + DELETE_BATCH]))
+                    self._deleting.add(task)
+                    task.add_done_callback(self._deleting.discard)
+            self._fired_until = max(self._fired_until, slot)
+
+    async def _delete(self, chat_id: int, ids: list[int]):
+        self.delete_calls += 1
+        try:
+            await send(chat_id, lambda: self._bot.delete_messages(chat_id, ids), priority=BULK)
+            self.deleted += len(ids)
+        except Exception:
+            # уже удалено пользователем / старше 48 часов — не страшно
+            self.failed += len(ids)
+
+    # ---------- сохранение в БД ----------
+
+    async def _flush(self):
+        if self._unsaved:
+            rows, self._unsaved = self._unsaved, []
+            now = int(time.time())
+            data = [
+                {
+                    "chatId": chat_id,
+                    "messageId": message_id,
+                    "deleteAt": datetime.fromtimestamp(slot, tz=timezone.utc),
+                }
+                for chat_id, message_id, slot in rows
+                if slot > now   # уже удалённые сохранять незачем
+            ]
+            if data:
+                try:
+                    await self._db.pendingdeletion.create_many(data=data)
+                except Exception as e:
+                    print("DEBUG expiry: не удалось сохранить удаления:", e)
+        if self._fired_until > self._cleaned_until:
+            until = self._fired_until
+            try:
+                index, shards = self._shard
+                if shards > 1:
+                    # строки других воркеров не трогаем: они могли ещё не поднять их при старте
+                    await self._db.execute_raw(_SHARD_CLEANUP_SQL, index, shards, until)
+                else:
+                    await self._db.pendingdeletion.delete_many(
+                        where={"deleteAt": {"lte": datetime.fromtimestamp(until, tz=timezone.utc)}}
+                    )
+                self._cleaned_until = until
+            except Exception as e:
+                print("DEBUG expiry: не удалось почистить PendingDeletion:", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_every)
+            await self._flush()
+
+
+engine = ExpiryEngine()
@@ -0,0 +1,162 @@
+# fastdb.py
+"""
+Необязательный быстрый путь к таблице User через asyncpg, минуя query engine
+Prisma (у binary-движка каждый запрос — ещё один HTTP-круг по localhost).
+
+Включается FAST_DB=1 (и установленным asyncpg). Покрывает три самых частых
+запроса — поиск по tg_id (find_unique / find_many для UserLoader), update
+одного-двух полей профиля и upsert тарифа/регистрации. FastUserDelegate
+повторяет сигнатуры db.user.*, результат — те же prisma.models.User, поэтому
+UserCache и UserLoader работают с ним без изменений. Пока пул не поднят
+(или asyncpg недоступен), вызовы идут в обычный Prisma.
+
+- FAST_DB_POOL_MIN / FAST_DB_POOL_MAX — размер пула соединений;
+- SQL для набора колонок собирается один раз, asyncpg кэширует prepared statements.
+"""
+import os
+import time
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import metrics
+
+if TYPE_CHECKING:     # клиент Prisma генерируется (prisma generate) — SQL и DSN собираются и без него
+    from prisma import Prisma
+    from prisma.models import User
+
+try:
+    import asyncpg
+except ImportError:    # asyncpg — необязательная зависимость
+    asyncpg = None
+
+FAST_DB = os.getenv("FAST_DB", "0") == "1"
+FAST_DB_POOL_MIN = int(os.getenv("FAST_DB_POOL_MIN", "2"))
+FAST_DB_POOL_MAX = int(os.getenv("FAST_DB_POOL_MAX", "10"))
+
+_TABLE = '"User"'
+# колонки, которые можно писать напрямую (имена подставляются в SQL — только из этого списка)
+_COLUMNS = frozenset({
+    "tg_id", "username", "first_name", "last_name", "heightCm", "weightKg", "age",
+    "email", "phone", "agreed_offer", "tariffName", "botBlocked",
+})
+
+
+def _q(column: str) -> str:
+    if column not in _COLUMNS:
+        raise ValueError(f"fastdb: колонка {column!r} не поддерживается")
+    return f'"{column}"'
+
+
+def _dsn(url: str) -> tuple[str, dict]:
+    """DATABASE_URL Prisma → DSN asyncpg: параметры Prisma (schema, connection_limit...) убираем."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    settings = {"search_path": query["schema"]} if "schema" in query else {}
+    return urlunsplit(parts._replace(query="")), settings
+
+
+class FastUserDelegate:
+    """Подмножество db.user.* поверх пула asyncpg."""
+
+    def __init__(self, fallback, model=None):
+        self.fallback = fallback        # db.user Prisma
+        self.model = model              # prisma.models.User — из него собираются строки
+        self.pool = None
+        self._sql: dict = {}
+        self.queries = 0
+
+    async def _query(self, method: str, fetch, sql: str, *args):
+        self.queries += 1
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await fetch(sql, *args)
+            status = "ok"
+            return result
+        finally:
+            metrics.observe_db("asyncpg", "User", method, status, time.perf_counter() - started)
+
+    def _row(self, record) -> Optional["User"]:
+        return None if record is None else self.model(**dict(record))
+
+    def _stmt(self, key: tuple, build) -> str:
+        sql = self._sql.get(key)
+        if sql is None:
+            sql = self._sql[key] = build()
+        return sql
+
+    async def find_unique(self, where: dict, **kwargs) -> Optional["User"]:
+        if self.pool is None or kwargs or list(where) != ["tg_id"]:
+            return await self.fallback.find_unique(where=where, **kwargs)
+        return self._row(await self._query("find_unique", self.pool.fetchrow,
+                                      f'SELECT * FROM {_TABLE} WHERE "tg_id" = $1', where["tg_id"]))
+
+    async def find_many(self, where: dict, **kwargs) -> list:
+        cond = where.get("tg_id")
+        if self.pool is None or kwargs or list(where) != ["tg_id"] or not isinstance(cond, dict) \
+                or list(cond) != ["in"]:
+            return await self.fallback.find_many(where=where, **kwargs)
+        rows = await self._query("find_many", self.pool.fetch,
+                                 f'SELECT * FROM {_TABLE} WHERE "tg_id" = ANY($1::bigint[])', list(cond["in"]))
+        return [self._row(r) for r in rows]
+
+    async def update(self, where: dict, data: dict, **kwargs) -> Optional["User"]:
+        if self.pool is None or kwargs or list(where) != ["tg_id"] or not data:
+            return await self.fallback.update(where=where, data=data, **kwargs)
+        cols = tuple(data)
+        sql = self._stmt(("update", cols), lambda: (
+            f"UPDATE {_TABLE} SET "
+            + ", ".join(f"{_q(c)} = ${i + 1}" for i, c in enumerate(cols))
+            + f' WHERE "tg_id" = ${len(cols) + 1} RETURNING *'
+        ))
+        return self._row(await self._query("update", self.pool.fetchrow, sql, *data.values(), where["tg_id"]))
+
+    async def upsert(self, where: dict, data: dict, **kwargs) -> "User":
+        create, update = data.get("create") or {}, data.get("update") or {}
+        if self.pool is None or kwargs or list(where) != ["tg_id"]:
+            return await self.fallback.upsert(where=where, data=data, **kwargs)
+        create = {**create, "tg_id": where["tg_id"]}
+        c_cols, u_cols = tuple(create), tuple(update)
+        sql = self._stmt(("upsert", c_cols, u_cols), lambda: (
+            f"INSERT INTO {_TABLE} (" + ", ".join(_q(c) for c in c_cols) + ") VALUES ("
+            + ", ".join(f"${i + 1}" for i in range(len(c_cols))) + ') ON CONFLICT ("tg_id") DO UPDATE SET '
+            + (", ".join(f"{_q(c)} = ${len(c_cols) + i + 1}" for i, c in enumerate(u_cols))
+               or '"tg_id" = EXCLUDED."tg_id"')        # пустой update — всё равно вернуть строку
+            + " RETURNING *"
+        ))
+        return self._row(await self._query("upsert", self.pool.fetchrow, sql, *create.values(), *update.values()))
+
+
+class FastDB:
+    """Объект с атрибутом .user — подставляется вместо Prisma в UserCache / UserLoader."""
+
+    def __init__(self, db: "Prisma"):
+        from prisma.models import User
+        self.prisma = db
+        self.user = FastUserDelegate(db.user, User)
+
+    async def connect(self, url: Optional[str] = None):
+        if self.user.pool is not None:
+            return
+        dsn, settings = _dsn(url or os.environ["DATABASE_URL"])
+        self.user.pool = await asyncpg.create_pool(
+            dsn, min_size=FAST_DB_POOL_MIN, max_size=FAST_DB_POOL_MAX, server_settings=settings,
+        )
+
+    async def disconnect(self):
+        pool, self.user.pool = self.user.pool, None
+        if pool is not None:
+            await pool.close()
+
+    def __getattr__(self, name):
+        # остальные модели (fsmstate, fatsecrettoken...) — как обычно, через Prisma
+        return getattr(self.prisma, name)
+
+
+def enabled() -> bool:
+    return FAST_DB and asyncpg is not None and bool(os.getenv("DATABASE_URL"))
+
+
+def user_db(db: "Prisma"):
+    """FastDB поверх db, если быстрый путь включён, иначе сам db."""
+    return FastDB(db) if enabled() else db
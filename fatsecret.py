@@ -1,96 +1,66 @@
 # fatsecret.py
 
-import requests
-from datetime import datetime, timedelta
-from prisma import Prisma
-from prisma.models import FatSecretToken
+from database import db   # общий клиент Prisma, подключается в bot.main
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
-FATSECRET_CLIENT_ID = os.getenv("FATSECRET_CLIENT_ID")
-FATSECRET_CLIENT_SECRET = os.getenv("FATSECRET_CLIENT_SECRET")
-FATSECRET_BASE_URL = "https://oauth.fatsecret.com"
-
-# Получить токен по клиентским ключам (OAuth2 client_credentials)
-def get_client_token():
-    response = requests.post(
-        f"{FATSECRET_BASE_URL}/connect/token",
-        data={
-            "grant_type": "client_credentials",
-            "scope": "basic",
-        },
-        auth=(FATSECRET_CLIENT_ID, FATSECRET_CLIENT_SECRET),
-    )
-    return response.json()
+# HTTP — через общий асинхронный клиент (пул keep-alive соединений), см. fatsecret_client.py
+from fatsecret_client import client as fs_client, FATSECRET_CLIENT_ID
+# токены держит в памяти и обновляет заранее менеджер, см. fatsecret_tokens.py
+from fatsecret_tokens import tokens, token_fields, UserToken
+from food_diary import diary
+from food_search import food_search
+
+# Получить токен по клиентским ключам (OAuth2 client_credentials) — из памяти
+async def get_client_token():
+    return await tokens.client_token()
 
 # Сохранить токен в базу
 async def save_user_token(tg_id: int, token_data: dict):
-    db = Prisma()
-    await db.connect()
     user = await db.user.find_unique(where={"tg_id": tg_id})
     if not user:
-        await db.disconnect()
         return  # или кинуть ошибку
 
-    expires_in = int(token_data.get("expires_in", 3600))
-    expires_at = datetime.utcnow() + timedelta(seconds=expires_in)
+    fields = token_fields(token_data)
 
     await db.fatsecrettoken.upsert(
     where={"userId": user.id},
     data={
-        "create": {
-            "user": {"connect": {"id": user.id}},
-            "accessToken": token_data["access_token"],
-            "refreshToken": token_data.get("refresh_token", ""),
-            "expiresAt": expires_at,
-            "scope": token_data.get("scope"),
-            "tokenType": token_data.get("token_type"),
-        },
-        "update": {
-            "accessToken": token_data["access_token"],
-            "refreshToken": token_data.get("refresh_token", ""),
-            "expiresAt": expires_at,
-            "scope": token_data.get("scope"),
-            "tokenType": token_data.get("token_type"),
-        },
+        "create": {"user": {"connect": {"id": user.id}}, **fields},
+        "update": fields,
     },
 )
+    tokens.remember(user.id, UserToken(fields["accessToken"], fields["refreshToken"], fields["expiresAt"]))
+    diary.invalidate(user.id)   # привязан другой аккаунт FatSecret — старый дневник не годится
 
-
-    await db.disconnect()
-
-# Получить access_token из базы (если живой)
+# Получить живой access_token (кэш в памяти; близкий к истечению обновляется в фоне)
 async def get_user_token(user_id: int) -> str | None:
-    db = Prisma()
-    await db.connect()
-    token = await db.fatsecrettoken.find_unique(where={"userId": user_id})
-    await db.disconnect()
+    return await tokens.user_token(user_id)
 
-    if not token or token.expiresAt < datetime.utcnow():
-        return None
-
-    return token.accessToken
 async def get_food_entries(access_token: str, date: str = None):
     """
     Получить записи питания пользователя (дата в формате YYYY-MM-DD, по умолчанию сегодня).
     """
-    if date is None:
-        date = datetime.utcnow().strftime("%Y-%m-%d")
-
-    response = requests.get(
-        "https://platform.fatsecret.com/rest/server.api",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-        params={
-            "method": "food_entries.get.v2",
-            "format": "json",
-            "date": date,
-        },
-    )
-    return response.json()
+    return await fs_client.get_food_entries(access_token, date)
+
+
+async def get_food_diary(user_id: int, start: str, end: str):
+    """
+    Дневник пользователя (User.id) за период YYYY-MM-DD..YYYY-MM-DD: {дата: (DiaryEntry, ...)}.
+    Дни берутся из кэша, недостающие запрашиваются параллельно; None, если FatSecret не подключён.
+    """
+    return await diary.get_range(user_id, start, end)
+
+
+async def search_foods(query: str, page: int = 0):
+    """Поиск продуктов (foods.search) — через кэш нормализованных запросов."""
+    return await food_search.search(query, page=page)
+
+
+async def get_food(food_id):
+    """Карточка продукта (food.get.v2) — кэш по food_id."""
+    return await food_search.food(food_id)
 
 
 from urllib.parse import urlencode
@@ -0,0 +1,113 @@
+# fatsecret_client.py
+"""
+Асинхронный HTTP-клиент FatSecret: одна aiohttp-сессия на процесс с пулом
+keep-alive соединений, лимитом одновременных запросов и таймаутами.
+Ничего не блокирует цикл событий aiogram (в отличие от requests).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+import aiohttp
+
+import metrics
+
+FATSECRET_CLIENT_ID = os.getenv("FATSECRET_CLIENT_ID")
+FATSECRET_CLIENT_SECRET = os.getenv("FATSECRET_CLIENT_SECRET")
+FATSECRET_BASE_URL = os.getenv("FATSECRET_BASE_URL", "https://oauth.fatsecret.com")
+FATSECRET_API_URL = os.getenv("FATSECRET_API_URL", "https://platform.fatsecret.com/rest/server.api")
+
+FATSECRET_POOL_SIZE = int(os.getenv("FATSECRET_POOL_SIZE", "20"))          # соединений в пуле
+FATSECRET_CONCURRENCY = int(os.getenv("FATSECRET_CONCURRENCY", "10"))      # одновременных запросов
+FATSECRET_TIMEOUT = float(os.getenv("FATSECRET_TIMEOUT", "10"))            # на весь запрос, сек
+FATSECRET_CONNECT_TIMEOUT = float(os.getenv("FATSECRET_CONNECT_TIMEOUT", "3"))
+FATSECRET_KEEPALIVE = float(os.getenv("FATSECRET_KEEPALIVE", "60"))
+
+
+class FatSecretClient:
+    def __init__(self, *, base_url: str = FATSECRET_BASE_URL, api_url: str = FATSECRET_API_URL,
+                 client_id: Optional[str] = FATSECRET_CLIENT_ID,
+                 client_secret: Optional[str] = FATSECRET_CLIENT_SECRET,
+                 pool_size: int = FATSECRET_POOL_SIZE, concurrency: int = FATSECRET_CONCURRENCY,
+                 timeout: float = FATSECRET_TIMEOUT, connect_timeout: float = FATSECRET_CONNECT_TIMEOUT,
+                 keepalive: float = FATSECRET_KEEPALIVE):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = api_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._sem = asyncio.Semaphore(concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # сессию создаём лениво — внутри работающего цикла событий
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def _request(self, op: str, method: str, url: str, **kwargs) -> dict:
+        async with self._sem:
+            self.requests += 1
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with self._get_session().request(method, url, **kwargs) as resp:
+                    result = await resp.json(content_type=None)
+                failed = resp.status >= 400 or (isinstance(result, dict) and "error" in result)
+                status = "api_error" if failed else "ok"
+                return result
+            finally:
+                metrics.FATSECRET.observe((op, status), time.perf_counter() - started)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    # ---------- операции FatSecret ----------
+
+    async def get_client_token(self) -> dict:
+        """Токен по клиентским ключам (OAuth2 client_credentials)."""
+        return await self._request(
+            "client_token", "POST",
+            f"{self.base_url}/connect/token",
+            data={"grant_type": "client_credentials", "scope": "basic"},
+            auth=aiohttp.BasicAuth(self.client_id or "", self.client_secret or ""),
+        )
+
+    async def refresh_token(self, refresh_token: str) -> dict:
+        """Обновить пользовательский токен по refresh_token (OAuth2 refresh_token grant)."""
+        return await self._request(
+            "refresh_token", "POST",
+            f"{self.base_url}/connect/token",
+            data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+            auth=aiohttp.BasicAuth(self.client_id or "", self.client_secret or ""),
+        )
+
+    async def call(self, access_token: str, api_method: str, **params) -> dict:
+        """Вызов REST API (server.api) с пользовательским/клиентским access_token."""
+        return await self._request(
+            api_method, "GET",
+            self.api_url,
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"method": api_method, "format": "json", **params},
+        )
+
+    async def get_food_entries(self, access_token: str, date: Optional[str] = None) -> dict:
+        """Записи питания за дату YYYY-MM-DD (по умолчанию сегодня, UTC)."""
+        if date is None:
+            date = datetime.utcnow().strftime("%Y-%m-%d")
+        return await self.call(access_token, "food_entries.get.v2", date=date)
+
+
+client = FatSecretClient()
@@ -0,0 +1,173 @@
+# fatsecret_sweeper.py
+"""
+Плановое обновление пользовательских токенов FatSecret до истечения.
+
+Раз в FATSECRET_SWEEP_EVERY секунд проходим FatSecretToken с
+expiresAt <= now + FATSECRET_SWEEP_HORIZON пачками по FATSECRET_SWEEP_BATCH
+(keyset-пагинация по id, индекс по expiresAt), обновляем их не более чем
+FATSECRET_SWEEP_CONCURRENCY параллельно со случайной задержкой до
+FATSECRET_SWEEP_JITTER секунд (чтобы волна токенов не била в /connect/token
+одновременно) и записываем результаты пачки одной транзакцией.
+
+Токен, обновить который не удалось (отозван, просрочен refreshToken, ошибка
+сети), получает nextRefreshAt с экспоненциальной паузой от FATSECRET_SWEEP_BACKOFF
+до FATSECRET_SWEEP_BACKOFF_MAX и до этого момента в проход не попадает; удачное
+обновление (или новая привязка аккаунта) сбрасывает счётчик.
+
+Обновление идёт через тот же single-flight, что и ленивое в fatsecret_tokens:
+если хендлер уже обновляет токен пользователя, sweeper дождётся его результата.
+При шардировании каждый воркер обходит токены своих пользователей — по tg_id,
+как ShardRouter раскладывает апдейты: ленивое обновление из хендлеров и sweeper
+для одного пользователя идут в одном процессе и делят single-flight и кэш.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from database import db
+from fatsecret_client import FATSECRET_CLIENT_ID
+from fatsecret_tokens import UserToken, tokens
+
+FATSECRET_SWEEP_EVERY = float(os.getenv("FATSECRET_SWEEP_EVERY", "60"))
+FATSECRET_SWEEP_HORIZON = float(os.getenv("FATSECRET_SWEEP_HORIZON", "900"))
+FATSECRET_SWEEP_BATCH = int(os.getenv("FATSECRET_SWEEP_BATCH", "200"))
+FATSECRET_SWEEP_CONCURRENCY = int(os.getenv("FATSECRET_SWEEP_CONCURRENCY", "8"))
+FATSECRET_SWEEP_JITTER = float(os.getenv("FATSECRET_SWEEP_JITTER", "2"))
+FATSECRET_SWEEP_BACKOFF = float(os.getenv("FATSECRET_SWEEP_BACKOFF", "300"))
+FATSECRET_SWEEP_BACKOFF_MAX = float(os.getenv("FATSECRET_SWEEP_BACKOFF_MAX", "86400"))
+
+
+class TokenSweeper:
+    def __init__(self, *, database=db, manager=tokens, every: float = FATSECRET_SWEEP_EVERY,
+                 horizon: float = FATSECRET_SWEEP_HORIZON, batch: int = FATSECRET_SWEEP_BATCH,
+                 concurrency: int = FATSECRET_SWEEP_CONCURRENCY, jitter: float = FATSECRET_SWEEP_JITTER,
+                 backoff: float = FATSECRET_SWEEP_BACKOFF, backoff_max: float = FATSECRET_SWEEP_BACKOFF_MAX):
+        self.db = database
+        self.tokens = manager
+        self.every = every
+        self.horizon = horizon
+        self.batch = batch
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.shard = (0, 1)          # (index, total): какую часть пользователей (по tg_id) обходить
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.last: dict = {}
+
+    def _mine(self, tg_id: int) -> bool:
+        index, total = self.shard
+        return total <= 1 or tg_id % total == index
+
+    async def _refresh(self, sem: asyncio.Semaphore, row) -> Optional[UserToken]:
+        if self.jitter:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+        async with sem:
+            try:
+                return await self.tokens.exchange_once(row.userId, UserToken.from_row(row))
+            except Exception as e:
+                print("DEBUG fatsecret sweep: ошибка обновления userId", row.userId, e)
+                return None
+
+    def _retry_at(self, failures: int, now: datetime) -> datetime:
+        return now + timedelta(seconds=min(self.backoff * 2 ** (failures - 1), self.backoff_max))
+
+    async def _write(self, done: list, failed: list, now: datetime):
+        async with self.db.batch_() as batcher:
+            for user_id, t in done:
+                batcher.fatsecrettoken.update(
+                    where={"userId": user_id},
+                    data=t.as_fields(),
+                )
+            for row in failed:
+                batcher.fatsecrettoken.update(
+                    where={"userId": row.userId},
+                    data={"refreshFailures": {"increment": 1},
+                          "nextRefreshAt": self._retry_at(row.refreshFailures + 1, now)},
+                )
+
+    async def sweep(self) -> dict:
+        """Один проход; возвращает статистику."""
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(seconds=self.horizon)
+        sem = asyncio.Semaphore(self.concurrency)
+        scanned = refreshed = failed = 0
+        cursor = 0
+        await self.tokens.flush_unsaved()   # токены, не записанные в прошлые разы
+        while True:
+            page = await self.db.fatsecrettoken.find_many(
+                where={
+                    "expiresAt": {"lte": until},
+                    "id": {"gt": cursor},
+                    "OR": [{"nextRefreshAt": None}, {"nextRefreshAt": {"lte": now}}],   # не на паузе после ошибок
+                },
+                order={"id": "asc"},
+                take=self.batch,
+                include={"user": True},   # tg_id — ключ шарда
+            )
+            if not page:
+                break
+            cursor = page[-1].id
+            rows = [r for r in page if self._mine(r.user.tg_id) and r.refreshToken]
+            scanned += len(rows)
+            results = await asyncio.gather(*(self._refresh(sem, r) for r in rows))
+            done = [(r.userId, t) for r, t in zip(rows, results) if t is not None]
+            errors = [r for r, t in zip(rows, results) if t is None]
+            failed += len(errors)
+            if done or errors:
+                try:
+                    await self._write(done, errors, now)
+                except Exception as e:
+                    # старые refreshToken уже недействительны — пишем новые по одному (с повтором)
+                    print("DEBUG fatsecret sweep: пачка не записана, пишем по одному:", e)
+                    for user_id, t in done:
+                        await self.tokens.save(user_id, t)
+                for user_id, t in done:
+                    self.tokens.remember(user_id, t)
+                refreshed += len(done)
+            if len(page) < self.batch:
+                break
+        elapsed = time.perf_counter() - started
+        self.sweeps += 1
+        self.last = {
+            "scanned": scanned,
+            "refreshed": refreshed,
+            "failed": failed,
+            "elapsed": round(elapsed, 3),
+            "per_sec": round(refreshed / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+        if scanned:
+            print("DEBUG fatsecret sweep:", self.last)
+        return self.last
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print("DEBUG fatsecret sweep: проход не удался:", e)
+            await asyncio.sleep(self.every)
+
+    def start(self, shard: tuple = (0, 1)):
+        if not FATSECRET_CLIENT_ID:
+            return    # FatSecret не настроен
+        self.shard = shard
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"sweeps": self.sweeps, **self.last}
+
+
+sweeper = TokenSweeper()
@@ -0,0 +1,246 @@
+# fatsecret_tokens.py
+"""
+Менеджер токенов FatSecret.
+
+- токен приложения (client_credentials) живёт в памяти и обновляется фоновой
+  задачей за FATSECRET_REFRESH_MARGIN секунд до истечения expires_in —
+  хендлеры получают его без запроса к /connect/token;
+- пользовательские токены (таблица FatSecretToken) кэшируются в памяти; если
+  до истечения осталось меньше FATSECRET_REFRESH_MARGIN, отдаём текущий
+  (ещё живой) токен и в фоне обновляем его по refreshToken;
+- single-flight: одновременные вызовы делят одно обновление на ключ;
+- FatSecret ротирует refreshToken: новый сначала пишется в БД, потом в кэш;
+  не записалось — токен всё равно кэшируется (старый уже недействителен),
+  а запись повторяется (flush_unsaved — каждым проходом sweeper и при stop).
+Ждать /connect/token приходится только если токен уже истёк (после простоя).
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from database import db
+from fatsecret_client import FATSECRET_CLIENT_ID, client as fs_client
+
+FATSECRET_REFRESH_MARGIN = float(os.getenv("FATSECRET_REFRESH_MARGIN", "300"))
+FATSECRET_TOKEN_CACHE = int(os.getenv("FATSECRET_TOKEN_CACHE", "20000"))
+
+
+class FatSecretTokenError(Exception):
+    pass
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def token_fields(token_data: dict, *, refresh_fallback: str = "") -> dict:
+    """Поля FatSecretToken из ответа /connect/token."""
+    expires_in = int(token_data.get("expires_in", 3600))
+    return {
+        "accessToken": token_data["access_token"],
+        "refreshToken": token_data.get("refresh_token") or refresh_fallback,
+        "expiresAt": _utcnow() + timedelta(seconds=expires_in),
+        "scope": token_data.get("scope"),
+        "tokenType": token_data.get("token_type"),
+        "refreshFailures": 0,
+        "nextRefreshAt": None,
+    }
+
+
+class UserToken:
+    __slots__ = ("access", "refresh", "expires_at")
+
+    def __init__(self, access: str, refresh: str, expires_at: datetime):
+        self.access = access
+        self.refresh = refresh
+        # Prisma отдаёт aware-datetime; старые записи могли сохраниться как naive UTC
+        self.expires_at = expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+
+    @classmethod
+    def from_row(cls, row) -> "UserToken":
+        return cls(row.accessToken, row.refreshToken, row.expiresAt)
+
+    def as_fields(self) -> dict:
+        """Поля FatSecretToken для записи обновлённого токена."""
+        return {"accessToken": self.access, "refreshToken": self.refresh, "expiresAt": self.expires_at,
+                "refreshFailures": 0, "nextRefreshAt": None}
+
+
+class TokenManager:
+    def __init__(self, *, client=fs_client, database=db, margin: float = FATSECRET_REFRESH_MARGIN,
+                 cache_size: int = FATSECRET_TOKEN_CACHE):
+        self.client = client
+        self.db = database
+        self.margin = margin
+        self.cache_size = cache_size
+        self._app: Optional[dict] = None
+        self._app_expires = 0.0                      # monotonic
+        self._users: "OrderedDict[int, UserToken]" = OrderedDict()
+        self._flights: dict = {}
+        self._unsaved: dict[int, UserToken] = {}     # userId → обновлённый токен, не записанный в БД
+        self._app_task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.waited = 0          # сколько раз вызывающему пришлось ждать обновления
+
+    # ---------- single-flight ----------
+
+    async def _single(self, key, factory: Callable[[], Awaitable]):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda _t, k=key: self._flights.pop(k, None))
+        return await asyncio.shield(task)
+
+    def _spawn(self, key, factory: Callable[[], Awaitable]):
+        if key in self._flights:
+            return
+        task = asyncio.ensure_future(self._single(key, factory))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())   # не терять исключения молча
+
+    # ---------- токен приложения ----------
+
+    async def _fetch_app(self) -> dict:
+        data = await self.client.get_client_token()
+        if "access_token" not in data:
+            self.refresh_failures += 1
+            raise FatSecretTokenError(data)
+        self.refreshes += 1
+        self._app = data
+        self._app_expires = time.monotonic() + int(data.get("expires_in", 3600))
+        return data
+
+    async def client_token(self) -> dict:
+        """Ответ /connect/token (client_credentials) из памяти."""
+        left = self._app_expires - time.monotonic()
+        if self._app is not None and left > 0:
+            if left < self.margin:
+                self._spawn("app", self._fetch_app)
+            return self._app
+        self.waited += 1
+        return await self._single("app", self._fetch_app)
+
+    async def _app_loop(self):
+        while True:
+            delay = self._app_expires - self.margin - time.monotonic()
+            await asyncio.sleep(max(5.0, delay))
+            try:
+                await self._single("app", self._fetch_app)
+            except Exception as e:
+                print("DEBUG fatsecret: не удалось обновить токен приложения:", e)
+                await asyncio.sleep(10)
+
+    async def start(self):
+        if not FATSECRET_CLIENT_ID:
+            return    # FatSecret не настроен
+        try:
+            await self._single("app", self._fetch_app)
+        except Exception as e:
+            print("DEBUG fatsecret: токен приложения не получен при старте:", e)
+        if self._app_task is None or self._app_task.done():
+            self._app_task = asyncio.create_task(self._app_loop())
+
+    async def stop(self):
+        if self._app_task is not None:
+            self._app_task.cancel()
+            await asyncio.gather(self._app_task, return_exceptions=True)
+            self._app_task = None
+        await self.flush_unsaved()
+
+    # ---------- пользовательские токены ----------
+
+    def remember(self, user_id: int, token: UserToken):
+        if self._unsaved.get(user_id) not in (None, token):
+            del self._unsaved[user_id]     # новая привязка аккаунта — старый незаписанный токен не нужен
+        self._users[user_id] = token
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.cache_size:
+            self._users.popitem(last=False)
+
+    def forget(self, user_id: int):
+        self._users.pop(user_id, None)
+
+    async def _load(self, user_id: int) -> Optional[UserToken]:
+        row = await self.db.fatsecrettoken.find_unique(where={"userId": user_id})
+        if row is None:
+            return None
+        token = UserToken.from_row(row)
+        self.remember(user_id, token)
+        return token
+
+    async def _exchange(self, user_id: int, token: UserToken) -> Optional[UserToken]:
+        """Обмен refreshToken на новый токен; запись в БД и кэш — на вызывающем."""
+        if not token.refresh:
+            return None
+        data = await self.client.refresh_token(token.refresh)
+        if "access_token" not in data:
+            self.refresh_failures += 1
+            print("DEBUG fatsecret: refresh не удался для userId", user_id, data)
+            return None
+        fields = token_fields(data, refresh_fallback=token.refresh)
+        self.refreshes += 1
+        return UserToken(fields["accessToken"], fields["refreshToken"], fields["expiresAt"])
+
+    async def save(self, user_id: int, token: UserToken) -> bool:
+        """Записать обновлённый токен в БД; при ошибке — запомнить для повтора."""
+        try:
+            await self.db.fatsecrettoken.update(where={"userId": user_id}, data=token.as_fields())
+        except Exception as e:
+            print("DEBUG fatsecret: токен userId", user_id, "не записан, повторим позже:", e)
+            self._unsaved[user_id] = token
+            return False
+        self._unsaved.pop(user_id, None)
+        return True
+
+    async def flush_unsaved(self):
+        for user_id, token in list(self._unsaved.items()):
+            if self._unsaved.get(user_id) is token:
+                await self.save(user_id, token)
+
+    async def refresh_user(self, user_id: int, token: UserToken) -> Optional[UserToken]:
+        """Обновить токен пользователя по refreshToken и записать в БД (без single-flight)."""
+        fresh = await self._exchange(user_id, token)
+        if fresh is None:
+            return None
+        await self.save(user_id, fresh)
+        self.remember(user_id, fresh)
+        return fresh
+
+    async def refresh_user_once(self, user_id: int, token: UserToken) -> Optional[UserToken]:
+        return await self._single(("user", user_id), lambda: self.refresh_user(user_id, token))
+
+    async def exchange_once(self, user_id: int, token: UserToken) -> Optional[UserToken]:
+        """Как refresh_user_once, но без записи в БД и кэша — sweeper пишет пачкой, затем remember."""
+        return await self._single(("user", user_id), lambda: self._exchange(user_id, token))
+
+    async def user_token(self, user_id: int) -> Optional[str]:
+        """Живой access_token пользователя (User.id) или None."""
+        token = self._users.get(user_id) or self._unsaved.get(user_id) or await self._load(user_id)
+        if token is None:
+            return None
+        left = (token.expires_at - _utcnow()).total_seconds()
+        if left > self.margin:
+            return token.access
+        if left > 0:
+            self._spawn(("user", user_id), lambda: self.refresh_user(user_id, token))
+            return token.access
+        self.waited += 1
+        token = await self.refresh_user_once(user_id, token)
+        return token.access if token else None
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._users),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "waited": self.waited,
+            "inflight": len(self._flights),
+            "unsaved": len(self._unsaved),
+        }
+
+
+tokens = TokenManager()
@@ -0,0 +1,191 @@
+# food_diary.py
+"""
+Дневник питания FatSecret с кэшем по (userId, дата).
+
+- записи хранятся компактно: кортеж DiaryEntry на запись, без исходного JSON;
+- прошедшие дни не меняются → FOOD_DIARY_PAST_TTL (по умолчанию сутки),
+  сегодняшний (и будущие) — FOOD_DIARY_TODAY_TTL секунд;
+- get_range() тянет недостающие дни параллельно, не больше
+  FOOD_DIARY_CONCURRENCY запросов на пользователя; одинаковые одновременные
+  запросы одного дня делят один вызов API;
+- invalidate() — сбросить день/все дни пользователя (после записи в дневник,
+  отвязки FatSecret и т.п.); stats() — доля попаданий в кэш.
+Даты — строки YYYY-MM-DD в UTC, как в fatsecret_client.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import date as date_cls, datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from fatsecret_client import client as fs_client
+from fatsecret_tokens import tokens
+
+FOOD_DIARY_PAST_TTL = float(os.getenv("FOOD_DIARY_PAST_TTL", "86400"))
+FOOD_DIARY_TODAY_TTL = float(os.getenv("FOOD_DIARY_TODAY_TTL", "60"))
+FOOD_DIARY_CACHE_SIZE = int(os.getenv("FOOD_DIARY_CACHE_SIZE", "50000"))   # дней
+FOOD_DIARY_CONCURRENCY = int(os.getenv("FOOD_DIARY_CONCURRENCY", "4"))
+
+
+class DiaryEntry(NamedTuple):
+    name: str
+    meal: str
+    calories: float
+    protein: float
+    fat: float
+    carbohydrate: float
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def compact(response: dict) -> tuple:
+    """Ответ food_entries.get.v2 → кортеж DiaryEntry."""
+    raw = (response or {}).get("food_entries") or {}
+    items = raw.get("food_entry") or []
+    if isinstance(items, dict):      # FatSecret отдаёт одиночную запись объектом, а не списком
+        items = [items]
+    return tuple(
+        DiaryEntry(
+            it.get("food_entry_name", ""),
+            it.get("meal", ""),
+            _num(it.get("calories")),
+            _num(it.get("protein")),
+            _num(it.get("fat")),
+            _num(it.get("carbohydrate")),
+        )
+        for it in items
+    )
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _settled_before() -> str:
+    """Дни раньше этой даты уже закрыты у всех: «сегодня» по UTC минус сутки запаса —
+    у пользователя западнее UTC вчерашний по UTC день ещё идёт."""
+    return (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def date_range(start: str, end: str) -> list:
+    d0, d1 = date_cls.fromisoformat(start), date_cls.fromisoformat(end)
+    return [(d0 + timedelta(days=i)).isoformat() for i in range((d1 - d0).days + 1)]
+
+
+class FoodDiary:
+    def __init__(self, *, client=fs_client, manager=tokens, maxsize: int = FOOD_DIARY_CACHE_SIZE,
+                 past_ttl: float = FOOD_DIARY_PAST_TTL, today_ttl: float = FOOD_DIARY_TODAY_TTL,
+                 concurrency: int = FOOD_DIARY_CONCURRENCY):
+        self.client = client
+        self.tokens = manager
+        self.maxsize = maxsize
+        self.past_ttl = past_ttl
+        self.today_ttl = today_ttl
+        self.concurrency = concurrency
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()   # (user_id, date) → (expires, entries)
+        self._flights: dict = {}
+        self._gen: dict = {}        # user_id → поколение; invalidate() не даёт записать устаревший ответ
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    # ---------- кэш ----------
+
+    def peek(self, user_id: int, date: str) -> Optional[tuple]:
+        key = (user_id, date)
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return item[1]
+
+    def _put(self, user_id: int, date: str, entries: tuple):
+        ttl = self.past_ttl if date < _settled_before() else self.today_ttl
+        key = (user_id, date)
+        self._cache[key] = (time.monotonic() + ttl, entries)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: int, date: Optional[str] = None):
+        """Сбросить день (или все дни) пользователя."""
+        self._gen[user_id] = self._gen.get(user_id, 0) + 1
+        if date is not None:
+            self._cache.pop((user_id, date), None)
+            return
+        for key in [k for k in self._cache if k[0] == user_id]:
+            del self._cache[key]
+
+    # ---------- загрузка ----------
+
+    async def _fetch(self, user_id: int, access_token: str, date: str) -> tuple:
+        gen = self._gen.get(user_id, 0)
+        self.fetches += 1
+        response = await self.client.get_food_entries(access_token, date)
+        entries = compact(response)
+        # ошибку API (в т.ч. просроченный токен) не кэшируем — иначе день «пустой» на past_ttl
+        if "error" not in (response or {}) and self._gen.get(user_id, 0) == gen:
+            self._put(user_id, date, entries)
+        return entries
+
+    async def _load(self, user_id: int, access_token: str, date: str) -> tuple:
+        key = (user_id, date)
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(user_id, access_token, date))
+            self._flights[key] = task
+            task.add_done_callback(lambda _t: self._flights.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_day(self, user_id: int, date: Optional[str] = None) -> Optional[tuple]:
+        """Записи за день; None, если FatSecret не подключён."""
+        date = date or _today()
+        days = await self.get_range(user_id, date, date)
+        return None if days is None else days[date]
+
+    async def get_range(self, user_id: int, start: str, end: str) -> Optional[dict]:
+        """{дата: записи} за start..end включительно; None, если FatSecret не подключён."""
+        result: dict = {}
+        missing = []
+        for d in date_range(start, end):
+            entries = self.peek(user_id, d)
+            if entries is None:
+                self.misses += 1
+                missing.append(d)
+            else:
+                self.hits += 1
+                result[d] = entries
+        if missing:
+            access_token = await self.tokens.user_token(user_id)
+            if access_token is None:
+                return None
+            sem = asyncio.Semaphore(self.concurrency)
+
+            async def one(d: str):
+                async with sem:
+                    result[d] = await self._load(user_id, access_token, d)
+
+            await asyncio.gather(*(one(d) for d in missing))
+        return {d: result[d] for d in sorted(result)}
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "fetches": self.fetches,
+        }
+
+
+diary = FoodDiary()
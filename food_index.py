@@ -0,0 +1,392 @@
+# food_index.py
+"""
+Локальный индекс продуктов для inline-подсказок (@bot греч) без вызова
+FatSecret на каждое нажатие клавиши.
+
+Продукты, которые бот уже видел в ответах FatSecret (food_search), копятся в
+памяти и периодически сливаются в компактный файл FOOD_INDEX_PATH. Файл
+открывается через mmap, массивы берутся np.frombuffer — загрузка без разбора,
+память общая между процессами/шардами.
+
+- нормализация: регистр, ё→е, кириллица транслитерируется в латиницу —
+  «гречка», «grechka» и «Grechka» дают один ключ;
+- префиксный поиск: отсортированные слова названий (плоский trie) с 8-байтным
+  ключом uint64 → np.searchsorted, дальше сверка полного префикса;
+- нечёткий поиск: постинги самых редких триграмм запроса (в пределах
+  FOOD_INDEX_MAX_HITS), счёт совпадений сортировкой, оценка Дайса;
+  включается, только когда префиксных совпадений не хватает.
+"""
+import asyncio
+import contextlib
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+FOOD_INDEX_PATH = Path(os.getenv("FOOD_INDEX_PATH", Path(__file__).parent / "data" / "foods.idx"))
+FOOD_INDEX_PENDING_MAX = int(os.getenv("FOOD_INDEX_PENDING_MAX", "5000"))   # новых продуктов до пересборки
+FOOD_INDEX_REBUILD_EVERY = float(os.getenv("FOOD_INDEX_REBUILD_EVERY", "600"))
+FOOD_INDEX_MAX_HITS = int(os.getenv("FOOD_INDEX_MAX_HITS", "30000"))   # бюджет постингов на нечёткий запрос
+
+_MAGIC = b"FIDX0001"
+_HEADER = struct.Struct("<8s6Q")   # magic, foods, tokens, trigrams, names_len, tokens_len, postings
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Единый ключ для кириллицы и латиницы: «Гречка ядрица» → «grechka yadrica»."""
+    return " ".join(_WORD.findall(text.casefold().translate(_TRANSLIT)))
+
+
+def _key8(b: bytes) -> int:
+    return int.from_bytes(b[:8].ljust(8, b"\0"), "big")
+
+
+def _trigrams(norm: str) -> set:
+    padded = f" {norm} "
+    return {zlib.crc32(padded[i:i + 3].encode()) for i in range(len(padded) - 2)}
+
+
+# ---------- запись файла ----------
+
+def _write(path: Path, foods: Dict[int, str]):
+    ids = sorted(foods)
+    names = [foods[i].encode() for i in ids]
+    norms = [normalize(foods[i]) for i in ids]
+
+    tokens: List[Tuple[bytes, int]] = []
+    postings: Dict[int, List[int]] = {}
+    ntri = np.zeros(len(ids), np.uint16)
+    for idx, norm in enumerate(norms):
+        words = norm.split()
+        # слово и все «хвосты» названия: «грудка» найдёт «куриная грудка»
+        tokens.extend((" ".join(words[k:]).encode(), idx) for k in range(len(words)))
+        tri = _trigrams(norm)
+        ntri[idx] = min(len(tri), 65535)
+        for t in tri:
+            postings.setdefault(t, []).append(idx)
+    tokens.sort()
+    tri_keys = sorted(postings)
+
+    def offsets(chunks: Iterable[bytes]) -> np.ndarray:
+        lens = [len(c) for c in chunks]
+        return np.concatenate(([0], np.cumsum(lens, dtype=np.uint64))).astype(np.uint32)
+
+    tok_bytes = [t for t, _ in tokens]
+    post_off = np.concatenate(([0], np.cumsum([len(postings[k]) for k in tri_keys], dtype=np.uint64)))
+    parts = [
+        np.array(ids, np.uint64).tobytes(),
+        offsets(names).tobytes(), b"".join(names),
+        np.array([_key8(t) for t in tok_bytes], np.uint64).tobytes(),
+        offsets(tok_bytes).tobytes(), b"".join(tok_bytes),
+        np.array([i for _, i in tokens], np.uint32).tobytes(),
+        np.array(tri_keys, np.uint32).tobytes(),
+        post_off.astype(np.uint32).tobytes(),
+        np.array([i for k in tri_keys for i in postings[k]], np.uint32).tobytes(),
+        ntri.tobytes(),
+    ]
+    header = _HEADER.pack(_MAGIC, len(ids), len(tokens), len(tri_keys),
+                          sum(map(len, names)), sum(map(len, tok_bytes)), int(post_off[-1]))
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for p in parts:
+            f.write(p)
+            f.write(b"\0" * (-f.tell() % 8))    # выравнивание для frombuffer
+    os.replace(tmp, path)
+
+
+# ---------- чтение ----------
+
+class FoodIndex:
+    """Неизменяемый индекс поверх mmap-файла."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._mm = None
+        self.size = 0
+        if path is not None and path.exists() and path.stat().st_size >= _HEADER.size:
+            self._open(path)
+
+    def _open(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, n_tok, n_tri, names_len, tok_len, n_post = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path}: не файл индекса продуктов")
+        pos = _HEADER.size
+
+        def take(dtype, count):
+            nonlocal pos
+            arr = np.frombuffer(self._mm, dtype=dtype, count=count, offset=pos)
+            pos += arr.nbytes + (-arr.nbytes % 8)
+            return arr
+
+        self.ids = take(np.uint64, n)
+        self.name_off = take(np.uint32, n + 1)
+        self.names = take(np.uint8, names_len)
+        self.tok_key = take(np.uint64, n_tok)
+        self.tok_off = take(np.uint32, n_tok + 1)
+        self.tok_blob = take(np.uint8, tok_len)
+        self.tok_food = take(np.uint32, n_tok)
+        self.tri_key = take(np.uint32, n_tri)
+        self.tri_off = take(np.uint32, n_tri + 1)
+        self.tri_post = take(np.uint32, n_post)
+        self.ntri = take(np.uint16, n)
+        self.size = n
+
+    _ARRAYS = ("ids", "name_off", "names", "tok_key", "tok_off", "tok_blob", "tok_food",
+               "tri_key", "tri_off", "tri_post", "ntri")
+
+    def close(self):
+        if self._mm is None:
+            return
+        for attr in self._ARRAYS:
+            self.__dict__.pop(attr, None)     # массивы-представления держат буфер mmap
+        self.size = 0
+        try:
+            self._mm.close()
+        except BufferError:
+            pass    # представления ещё живут у вызывающего — mmap закроет сборщик мусора
+        self._mm = None
+
+    def name(self, idx: int) -> str:
+        return self.names[self.name_off[idx]:self.name_off[idx + 1]].tobytes().decode()
+
+    def _token(self, t: int) -> bytes:
+        return self.tok_blob[self.tok_off[t]:self.tok_off[t + 1]].tobytes()
+
+    def __contains__(self, food_id: int) -> bool:
+        if not self.size:
+            return False
+        i = int(np.searchsorted(self.ids, np.uint64(food_id)))     # ids отсортированы при записи
+        return i < self.size and int(self.ids[i]) == food_id
+
+    def items(self) -> Iterable[Tuple[int, str]]:
+        for i in range(self.size):
+            yield int(self.ids[i]), self.name(i)
+
+    def prefix(self, norm: str, limit: int) -> List[int]:
+        """Индексы продуктов, у которых слово (или хвост названия) начинается с norm."""
+        if not self.size or not norm:
+            return []
+        p = norm.encode()
+        head = p[:8]
+        # ключ — np.uint64: с питоновским int numpy привёл бы весь массив к float64
+        lo = int(np.searchsorted(self.tok_key, np.uint64(_key8(head)), "left"))
+        hi = int(np.searchsorted(self.tok_key, np.uint64(_key8(head + b"\xff" * (8 - len(head)))), "right"))
+        out: List[int] = []
+        seen = set()
+        for t in range(lo, hi):
+            if len(p) > 8 and not self._token(t).startswith(p):
+                continue
+            idx = int(self.tok_food[t])
+            if idx not in seen:
+                seen.add(idx)
+                out.append(idx)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def fuzzy(self, norm: str, limit: int, min_score: float = 0.5) -> List[int]:
+        """Индексы продуктов по похожести триграмм (коэффициент Дайса)."""
+        if not self.size or len(norm) < 2:
+            return []
+        tri = np.array(sorted(_trigrams(norm)), np.uint32)
+        pos = np.searchsorted(self.tri_key, tri)
+        inside = pos < len(self.tri_key)
+        pos, tri_in = pos[inside], tri[inside]
+        pos = pos[self.tri_key[pos] == tri_in]
+        lists = sorted((self.tri_post[self.tri_off[k]:self.tri_off[k + 1]] for k in pos), key=len)
+        # самые частые триграммы почти не различают продукты — берём редкие в пределах бюджета
+        budget, used = FOOD_INDEX_MAX_HITS, []
+        for l in lists:
+            if used and budget < len(l):
+                break
+            used.append(l)
+            budget -= len(l)
+        if not used:
+            return []
+        # счёт совпадений сортировкой: на десятках тысяч постингов быстрее bincount по всем продуктам
+        hits = np.sort(np.concatenate(used))
+        starts = np.flatnonzero(np.r_[True, hits[1:] != hits[:-1]])
+        counts = np.diff(np.r_[starts, len(hits)])
+        need = max(1, int(np.ceil(min_score * (len(tri) + 1) / 2)))
+        keep = counts >= min(need, len(used))
+        cand, counts = hits[starts[keep]], counts[keep]
+        if not len(cand):
+            return []
+        score = 2.0 * counts / (self.ntri[cand].astype(np.float64) + len(tri))
+        keep = score >= min_score
+        cand, score = cand[keep], score[keep]
+        if len(cand) > limit:
+            top = np.argpartition(-score, limit)[:limit]
+            cand, score = cand[top], score[top]
+        return cand[np.argsort(-score, kind="stable")].tolist()
+
+
+@contextlib.contextmanager
+def _file_lock(path: Path):
+    """Межпроцессная блокировка файла: flock на POSIX, msvcrt.locking на Windows."""
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FoodCatalog:
+    """Индекс на диске + продукты, увиденные с последней пересборки."""
+
+    def __init__(self, path: Path = FOOD_INDEX_PATH, *, pending_max: int = FOOD_INDEX_PENDING_MAX):
+        self.path = Path(path)
+        self.pending_max = pending_max
+        self.index = FoodIndex(self.path)
+        self.pending: Dict[int, str] = {}
+        self._pending_norm: Dict[int, str] = {}
+        self.last_build = time.monotonic()
+        self.queries = 0
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- пополнение ----------
+
+    def learn(self, food_id, name: str):
+        try:
+            food_id = int(food_id)
+        except (TypeError, ValueError):
+            return
+        if not name or food_id < 0 or food_id in self.pending or food_id in self.index:
+            return      # уже в индексе — не тащим его в pending и не переписываем файл зря
+        self.pending[food_id] = name
+        self._pending_norm[food_id] = normalize(name)
+
+    def learn_response(self, response: dict):
+        """Продукты из ответа foods.search или food.get.v2."""
+        food = (response or {}).get("food")
+        if isinstance(food, dict):
+            self.learn(food.get("food_id"), food.get("food_name"))
+            return
+        items = ((response or {}).get("foods") or {}).get("food") or []
+        if isinstance(items, dict):
+            items = [items]
+        for it in items:
+            name = it.get("food_name")
+            if it.get("brand_name"):
+                name = f"{name} ({it['brand_name']})"
+            self.learn(it.get("food_id"), name)
+
+    def needs_rebuild(self) -> bool:
+        if not self.pending:
+            return False
+        return (len(self.pending) >= self.pending_max
+                or time.monotonic() - self.last_build >= FOOD_INDEX_REBUILD_EVERY)
+
+    def _merge(self, pending: Dict[int, str]):
+        """Слить продукты в файл на диске (блокирующе — в отдельном потоке; self.index не трогает)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # шарды пишут один файл: под блокировкой перечитываем свежую версию и дописываем свои
+        with _file_lock(self.path.with_suffix(".lock")):
+            current = FoodIndex(self.path)
+            foods = dict(current.items())
+            current.close()
+            foods.update(pending)
+            _write(self.path, foods)
+
+    async def rebuild(self):
+        """Слить новые продукты в индекс: запись файла — в потоке, подмена индекса — в цикле событий."""
+        pending = dict(self.pending)     # снимок на цикле: suggest() в это время читает pending
+        await asyncio.to_thread(self._merge, pending)
+        old, self.index = self.index, FoodIndex(self.path)
+        old.close()
+        for food_id in pending:
+            self.pending.pop(food_id, None)
+            self._pending_norm.pop(food_id, None)
+        self.last_build = time.monotonic()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(30)
+            if self.needs_rebuild():
+                try:
+                    await self.rebuild()
+                except Exception as e:
+                    print("DEBUG food index: пересборка не удалась:", e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pending:
+            await self.rebuild()
+
+    # ---------- поиск ----------
+
+    def suggest(self, query: str, limit: int = 20) -> List[Tuple[int, str]]:
+        """[(food_id, название)] — сначала совпадения по префиксу, затем нечёткие."""
+        self.queries += 1
+        norm = normalize(query)
+        if not norm:
+            return []
+        out: List[Tuple[int, str]] = []
+        seen = set()
+
+        def add(food_id: int, name: str):
+            if food_id not in seen:
+                seen.add(food_id)
+                out.append((food_id, name))
+
+        for food_id, n in self._pending_norm.items():
+            if n.startswith(norm) or f" {norm}" in n:
+                add(food_id, self.pending[food_id])
+                if len(out) >= limit:
+                    return out
+        for idx in self.index.prefix(norm, limit):
+            add(int(self.index.ids[idx]), self.index.name(idx))
+        if len(out) < limit:
+            for idx in self.index.fuzzy(norm, limit):
+                add(int(self.index.ids[idx]), self.index.name(idx))
+        return out[:limit]
+
+    def stats(self) -> dict:
+        return {"indexed": self.index.size, "pending": len(self.pending), "queries": self.queries}
+
+
+catalog = FoodCatalog()
@@ -0,0 +1,162 @@
+# food_search.py
+"""
+Поиск продуктов FatSecret (foods.search) и карточки продуктов (food.get.v2)
+с кэшем — пользователи ищут одно и то же («гречка», «куриная грудка»), а
+каждый вызов API платный и под лимитом.
+
+- запрос нормализуется (регистр, ё→е, лишние пробелы/знаки) и кэшируется
+  в LRU+TTL вместе с номером страницы;
+- одинаковые одновременные запросы делят один вызов API (single-flight);
+- карточки продуктов кэшируются по food_id отдельно и дольше;
+- stats(): попадания/промахи, hit ratio, вызовы API, склеенные запросы.
+Токен — клиентский (client_credentials) из fatsecret_tokens.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable
+
+from fatsecret_client import client as fs_client
+from fatsecret_tokens import tokens
+from food_index import catalog
+
+FOOD_SEARCH_CACHE_SIZE = int(os.getenv("FOOD_SEARCH_CACHE_SIZE", "20000"))
+FOOD_SEARCH_TTL = float(os.getenv("FOOD_SEARCH_TTL", "21600"))          # 6 ч
+FOOD_DETAIL_CACHE_SIZE = int(os.getenv("FOOD_DETAIL_CACHE_SIZE", "50000"))
+FOOD_DETAIL_TTL = float(os.getenv("FOOD_DETAIL_TTL", "86400"))
+FOOD_SEARCH_PAGE = int(os.getenv("FOOD_SEARCH_PAGE", "20"))
+
+_SPACES = re.compile(r"\s+")
+_JUNK = re.compile(r"[^\w\s%-]+")
+
+
+def normalize_query(query: str) -> str:
+    """«  Куриная  грудка!» → «куриная грудка»."""
+    q = query.casefold().replace("ё", "е")
+    q = _JUNK.sub(" ", q)
+    return _SPACES.sub(" ", q).strip()
+
+
+class TTLCache:
+    """LRU с TTL на запись."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    def put(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+async def _client_access_token() -> str:
+    return (await tokens.client_token())["access_token"]
+
+
+class FoodSearch:
+    def __init__(self, *, client=fs_client, access_token: Callable[[], Awaitable[str]] = _client_access_token,
+                 index=catalog, search_size: int = FOOD_SEARCH_CACHE_SIZE, search_ttl: float = FOOD_SEARCH_TTL,
+                 detail_size: int = FOOD_DETAIL_CACHE_SIZE, detail_ttl: float = FOOD_DETAIL_TTL):
+        self.client = client
+        self.access_token = access_token
+        self.index = index          # увиденные продукты пополняют локальный индекс подсказок
+        self.searches = TTLCache(search_size, search_ttl)
+        self.details = TTLCache(detail_size, detail_ttl)
+        self._flights: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream = 0
+
+    async def _cached(self, cache: TTLCache, key, fetch: Callable[[], Awaitable]):
+        value = cache.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        task = self._flights.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            async def run():
+                self.upstream += 1
+                result = await fetch()
+                if "error" not in result:      # ошибки API не кэшируем
+                    cache.put(key, result)
+                    if self.index is not None:
+                        self.index.learn_response(result)
+                return result
+
+            task = asyncio.ensure_future(run())
+            self._flights[key] = task
+            task.add_done_callback(lambda _t: self._flights.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def search(self, query: str, *, page: int = 0, max_results: int = FOOD_SEARCH_PAGE) -> dict:
+        """Ответ foods.search для нормализованного запроса."""
+        q = normalize_query(query)
+        if not q:
+            return {"foods": {"total_results": "0"}}
+
+        async def fetch():
+            return await self.client.call(
+                await self.access_token(), "foods.search",
+                search_expression=q, page_number=page, max_results=max_results,
+            )
+
+        return await self._cached(self.searches, ("search", q, page, max_results), fetch)
+
+    async def food(self, food_id) -> dict:
+        """Карточка продукта (food.get.v2) по food_id."""
+        food_id = str(food_id)
+
+        async def fetch():
+            return await self.client.call(await self.access_token(), "food.get.v2", food_id=food_id)
+
+        return await self._cached(self.details, ("food", food_id), fetch)
+
+    def invalidate(self, food_id=None):
+        """Сбросить карточку продукта или (без аргумента) весь кэш поиска."""
+        if food_id is None:
+            self.searches.clear()
+        else:
+            self.details.pop(("food", str(food_id)))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "searches_cached": len(self.searches),
+            "foods_cached": len(self.details),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "coalesced": self.coalesced,
+            "upstream": self.upstream,
+        }
+
+
+food_search = FoodSearch()
@@ -0,0 +1,215 @@
+# fsm_storage.py
+"""
+FSM-хранилище aiogram в Postgres (модель FsmState в prisma/schema.prisma).
+
+- чтения идут из кэша в памяти, БД трогаем только при первом обращении к ключу
+  (или когда запись в кэше устарела — FSM_CACHE_TTL);
+- записи (set_state / set_data / update_data) только помечают ключ «грязным»,
+  а FsmFlushMiddleware сбрасывает его в БД одним upsert в конце апдейта.
+  Если апдейт пришёл мимо middleware — сработает отложенный сброс через FSM_FLUSH_DELAY.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.types import TelegramObject
+from prisma import Json, Prisma
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "db").lower()      # db | memory
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "20000"))
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "600"))
+FSM_FLUSH_DELAY = float(os.getenv("FSM_FLUSH_DELAY", "1.0"))
+
+
+class _Entry:
+    __slots__ = ("state", "data", "loaded_at", "dirty")
+
+    def __init__(self, state: Optional[str], data: dict, loaded_at: float):
+        self.state = state
+        self.data = data
+        self.loaded_at = loaded_at
+        self.dirty = False
+
+
+class PrismaStorage(BaseStorage):
+    def __init__(self, db: Prisma, *, cache_size: int = FSM_CACHE_SIZE,
+                 cache_ttl: float = FSM_CACHE_TTL, flush_delay: float = FSM_FLUSH_DELAY):
+        self.db = db
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_delay = flush_delay
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._flushing: set[asyncio.Task] = set()
+        self._locks: dict[str, asyncio.Lock] = {}
+        # статистика: сколько записей в БД реально сделали и сколько «склеили»
+        self.reads = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id:
+            parts.append(str(key.thread_id))
+        if getattr(key, "business_connection_id", None):
+            parts.append(key.business_connection_id)
+        if key.destiny != "default":
+            parts.append(key.destiny)
+        return ":".join(parts)
+
+    def _lock(self, k: str) -> asyncio.Lock:
+        lock = self._locks.get(k)
+        if lock is None:
+            lock = self._locks[k] = asyncio.Lock()
+        return lock
+
+    async def _load(self, k: str) -> _Entry:
+        entry = self._cache.get(k)
+        now = time.monotonic()
+        if entry is not None and (entry.dirty or now - entry.loaded_at < self.cache_ttl):
+            self._cache.move_to_end(k)
+            return entry
+        async with self._lock(k):
+            entry = self._cache.get(k)
+            if entry is not None and (entry.dirty or now - entry.loaded_at < self.cache_ttl):
+                return entry
+            self.reads += 1
+            row = await self.db.fsmstate.find_unique(where={"key": k})
+            entry = _Entry(row.state, dict(row.data or {}), now) if row else _Entry(None, {}, now)
+            self._cache[k] = entry
+            self._evict()
+            return entry
+
+    def _evict(self):
+        # выкидываем самые старые чистые записи; грязные ждут сброса
+        if len(self._cache) <= self.cache_size:
+            return
+        for k in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if not self._cache[k].dirty:
+                del self._cache[k]
+                self._locks.pop(k, None)
+
+    def _mark_dirty(self, k: str, entry: _Entry):
+        if entry.dirty:
+            self.coalesced += 1
+        entry.dirty = True
+        self._schedule(k)
+
+    def _schedule(self, k: str):
+        if k not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[k] = loop.call_later(self.flush_delay, self._flush_later, k)
+
+    def _flush_later(self, k: str):
+        task = asyncio.ensure_future(self._flush_logged(k))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _flush_logged(self, k: str):
+        try:
+            await self._flush_key(k)
+        except Exception as e:
+            print("DEBUG fsm: не удалось записать состояние", k, e)   # повтор уже запланирован
+
+    async def _flush_key(self, k: str):
+        timer = self._timers.pop(k, None)
+        if timer:
+            timer.cancel()
+        entry = self._cache.get(k)
+        if entry is None or not entry.dirty:
+            return
+        async with self._lock(k):
+            if not entry.dirty:
+                return
+            entry.dirty = False
+            state, data = entry.state, dict(entry.data)
+            try:
+                self.writes += 1
+                if state is None and not data:
+                    await self.db.fsmstate.delete_many(where={"key": k})
+                else:
+                    await self.db.fsmstate.upsert(
+                        where={"key": k},
+                        data={
+                            "create": {"key": k, "state": state, "data": Json(data)},
+                            "update": {"state": state, "data": Json(data)},
+                        },
+                    )
+            except Exception:
+                self.failures += 1
+                entry.dirty = True
+                self._schedule(k)    # ключ остаётся грязным — повторим через flush_delay
+                raise
+            entry.loaded_at = time.monotonic()
+
+    async def flush(self, key: Optional[StorageKey] = None):
+        """Сбросить в БД один ключ или все грязные ключи."""
+        if key is not None:
+            await self._flush_key(self._key(key))
+            return
+        for k in [k for k, e in self._cache.items() if e.dirty]:
+            await self._flush_logged(k)   # один сбойный ключ не мешает остальным
+
+    # ---------- интерфейс BaseStorage ----------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        entry = await self._load(k)
+        entry.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(k, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self._key(key)
+        entry = await self._load(k)
+        entry.data = dict(data)
+        self._mark_dirty(k, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return dict((await self._load(self._key(key))).data)
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        k = self._key(key)
+        entry = await self._load(k)
+        entry.data.update(data)
+        self._mark_dirty(k, entry)
+        return dict(entry.data)
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.flush()
+
+
+class FsmFlushMiddleware(BaseMiddleware):
+    """Сбрасывает FSM-ключ апдейта в БД один раз — после всех хендлеров."""
+
+    def __init__(self, storage: PrismaStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            ctx = data.get("state")
+            if ctx is not None:
+                try:
+                    await self.storage.flush(ctx.key)
+                except Exception as e:
+                    # хендлеры уже отработали; ключ остался грязным и запишется по таймеру
+                    print("DEBUG fsm: не удалось записать состояние после апдейта", ctx.key, e)
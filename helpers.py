@@ -1,41 +1,67 @@
 # helpers.py
-import asyncio
-from aiogram import Bot
-from aiogram.types import Message, ReplyKeyboardMarkup
+from aiogram.methods import SendMessage
+from aiogram.types import Message
+from expiry import engine as expiry
+from keyboards import empty_kb
+from screens import Screen, encoded_markup
+from sender import INTERACTIVE, send
 
-# Временное хранилище ID сообщений на пользователя (если понадобится)
-_temp_message_ids = {}  # user_id → message_id
 
+def _answer(message: Message, text: str, reply_markup, parse_mode, priority: int):
+    encoded = encoded_markup(reply_markup)
+    if encoded is not None:
+        # клавиатура из каталога screens: отдаём готовый JSON, без валидации и сериализации;
+        # тему форума и бизнес-подключение берём так же, как message.answer
+        method = SendMessage.model_construct(
+            chat_id=message.chat.id,
+            message_thread_id=message.message_thread_id if message.is_topic_message else None,
+            business_connection_id=message.business_connection_id,
+            text=text, parse_mode=parse_mode, reply_markup=encoded,
+        )
+        call = lambda: message.bot(method)
+    else:
+        call = lambda: message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    # все отправки идут через sender.scheduler (лимиты Telegram, приоритеты, 429)
+    return send(message.chat.id, call, priority=priority)
 
-async def send_temp(message: Message, text: str, *, reply_markup=None, parse_mode=None, delay: int = 30):
+
+async def send_temp(message: Message, text: str, *, reply_markup=None, parse_mode=None, delay: int = 30,
+                    priority: int = INTERACTIVE):
     """
     По умолчанию показываем ПУСТУЮ reply-клавиатуру, чтобы НЕ всплывала системная.
+    Сообщение удаляется через delay секунд (expiry.engine); delay=0 — не удалять.
     """
     if reply_markup is None:
-        reply_markup = ReplyKeyboardMarkup(keyboard=[], resize_keyboard=True, is_persistent=False)
-    return await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
-
-
-async def _expire_message(bot: Bot, chat_id: int, message_id: int, delay: int = 30):
-    """Удаляет сообщение через delay секунд (если не удалено раньше)."""
-    await asyncio.sleep(delay)
-    try:
-        await bot.delete_message(chat_id, message_id)
-    except Exception:
-        pass
+        reply_markup = empty_kb()
+    sent = await _answer(message, text, reply_markup, parse_mode, priority)
+    if delay:
+        expiry.schedule(message.bot, sent.chat.id, sent.message_id, delay)
+    return sent
 
 
-async def send_keep(message: Message, text: str, *, reply_markup=None, parse_mode=None):
+async def send_keep(message: Message, text: str, *, reply_markup=None, parse_mode=None,
+                    priority: int = INTERACTIVE):
     """
     Сообщение без удаления. Используй для экранов меню и навигации.
     (reply_markup передаём вручную — тут по умолчанию ничего не подставляем)
     """
-    return await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    return await _answer(message, text, reply_markup, parse_mode, priority)
 
 
-async def send_ephemeral(message: Message, text: str, *, reply_markup=None, parse_mode=None):
+async def send_ephemeral(message: Message, text: str, *, reply_markup=None, parse_mode=None,
+                         priority: int = INTERACTIVE):
     """
     Одноразовое сообщение без хранения ID — не очищает другие.
     (reply_markup передаём вручную — тут по умолчанию ничего не подставляем)
     """
-    return await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
+    return await _answer(message, text, reply_markup, parse_mode, priority)
+
+
+async def send_screen(message: Message, screen: Screen, *, keep: bool = False, delay: int = 30,
+                      priority: int = INTERACTIVE):
+    """Отправить статический экран из каталога (screens.Screen): send_temp или send_keep."""
+    if keep:
+        return await send_keep(message, screen.text, reply_markup=screen.reply_markup,
+                               parse_mode=screen.parse_mode, priority=priority)
+    return await send_temp(message, screen.text, reply_markup=screen.reply_markup,
+                           parse_mode=screen.parse_mode, delay=delay, priority=priority)
@@ -1,67 +1,97 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, WebAppInfo
 import os
+from screens import Screen, static_markup
 APP_URL = os.getenv("APP_URL")
-def client_kb(has_tariff: bool = False) -> ReplyKeyboardMarkup:
-    if not has_tariff:
-        # Меню до покупки
-        rows = [
-            [KeyboardButton(text="Подробное описание")],
-            [KeyboardButton(text="Тариф"), KeyboardButton(text="Профиль")],
-            [KeyboardButton(text="Бесплатная консультация")],
-        ]
-    else:
-        # Меню после покупки
-        rows = [
-            [KeyboardButton(text="Тариф"), KeyboardButton(text="Профиль"),
-            KeyboardButton(text="Приложение", web_app=WebAppInfo(url=APP_URL or "https://example.com"))],
-        ]
-    return ReplyKeyboardMarkup(
-        keyboard=rows,
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
 
+# Клавиатуры собираются один раз при импорте (см. screens.py) — функции ниже
+# отдают готовые неизменяемые экземпляры.
+
+# Меню до покупки
+_CLIENT_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Подробное описание")],
+        [KeyboardButton(text="Тариф"), KeyboardButton(text="Профиль")],
+        [KeyboardButton(text="Бесплатная консультация")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+# Меню после покупки
+_CLIENT_KB_PAID = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Тариф"), KeyboardButton(text="Профиль"),
+        KeyboardButton(text="Приложение", web_app=WebAppInfo(url=APP_URL or "https://example.com"))],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+_CLIENT_MAIN_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Профиль"), KeyboardButton(text="Тариф")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+_TARIFFS_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="💼 Базовый")],
+        [KeyboardButton(text="🤑 Выгодный")],
+        [KeyboardButton(text="💎 Максимум")],
+        [KeyboardButton(text="⬅️ Назад")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+_TARIFF_DETAIL_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="💳 Купить")],
+        [KeyboardButton(text="⬅️ Назад")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+# Пустая reply-клавиатура, чтобы Telegram не поднимал системную клавиатуру устройства
+_EMPTY_KB = static_markup(ReplyKeyboardMarkup(keyboard=[], resize_keyboard=True, is_persistent=False))
+
+
+def client_kb(has_tariff: bool = False) -> ReplyKeyboardMarkup:
+    return _CLIENT_KB_PAID if has_tariff else _CLIENT_KB
 
 
 def client_main_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Профиль"), KeyboardButton(text="Тариф")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _CLIENT_MAIN_KB
 
 
 def tariffs_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💼 Базовый")],
-            [KeyboardButton(text="🤑 Выгодный")],
-            [KeyboardButton(text="💎 Максимум")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
-
+    return _TARIFFS_KB
 
 
 def tariff_detail_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💳 Купить")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _TARIFF_DETAIL_KB
 
 def empty_kb() -> ReplyKeyboardMarkup:
-    # Пустая reply-клавиатура, чтобы Telegram не поднимал системную клавиатуру устройства
-    return ReplyKeyboardMarkup(keyboard=[], resize_keyboard=True, is_persistent=False)
+    return _EMPTY_KB
+
+
+# ---------- статические экраны меню клиента ----------
+CLIENT_MENU = {
+    False: Screen("🏠 Меню клиента", _CLIENT_KB),
+    True:  Screen("🏠 Меню клиента", _CLIENT_KB_PAID),
+}
+CLIENT_HOME = {
+    False: Screen("🏠 Главное меню клиента", _CLIENT_KB),
+    True:  Screen("🏠 Главное меню клиента", _CLIENT_KB_PAID),
+}
+TARIFFS_SCREEN = Screen("Выберите подходящий тариф:", _TARIFFS_KB, "Markdown")
+TARIFFS_CHANGE_SCREEN = Screen("Выберите новый тариф:", _TARIFFS_KB, "Markdown")
@@ -0,0 +1,223 @@
+# metrics.py
+"""
+Метрики в формате Prometheus (text exposition 0.0.4) без внешних зависимостей.
+
+Гистограммы задержек (секунды) с числом вызовов и статусом ok/error:
+- rosfit_handler_seconds{module, handler}  — хендлеры aiogram любого типа события
+  (inner-middleware на каждом наблюдателе dp, наследуется всеми роутерами: reg,
+  tariff_handlers, bot, broadcast; text_dispatch вызывает хендлеры через ту же цепочку);
+- rosfit_db_seconds{backend, model, method} — каждый запрос Prisma (и asyncpg при FAST_DB=1);
+- rosfit_bot_api_seconds{method}           — каждый метод Bot API (middleware сессии aiogram);
+- rosfit_fatsecret_seconds{op}             — запросы к FatSecret;
+- rosfit_send_seconds{lane}                — отправка через sender (ожидание в очереди + Bot API).
+
+Плюс числовые поля stats() компонентов (register) — как gauge
+rosfit_<компонент>_<поле>. HTTP: GET http://METRICS_HOST:METRICS_PORT/metrics
+(METRICS_PORT=0 — сервер не поднимается; у воркера шарда порт METRICS_PORT + index).
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}      # значения меток → [счётчики корзин..., +Inf, сумма]
+        self.listener: Optional[Callable[["Histogram", tuple, float], None]] = None   # profiler
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+        if self.listener is not None:
+            self.listener(self, labels, value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {total}")
+        return lines
+
+
+HANDLER = Histogram("rosfit_handler_seconds", "Время хендлеров aiogram", ("module", "handler", "status"))
+DB = Histogram("rosfit_db_seconds", "Время запросов к БД", ("backend", "model", "method", "status"))
+BOT_API = Histogram("rosfit_bot_api_seconds", "Время вызовов Bot API", ("method", "status"))
+FATSECRET = Histogram("rosfit_fatsecret_seconds", "Время запросов к FatSecret", ("op", "status"))
+SEND = Histogram("rosfit_send_seconds", "Отправка через sender: очередь + Bot API", ("lane", "status"))
+HISTOGRAMS = (HANDLER, DB, BOT_API, FATSECRET, SEND)
+
+_collectors: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, stats: Callable[[], dict]):
+    """Отдавать числовые поля stats() компонента как gauge rosfit_<name>_<поле>."""
+    _collectors[name] = stats
+
+
+def _gauges(prefix: str, stats: dict, lines: list, labels: str = ""):
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            lines.append(f"{prefix}_{key}{labels} {value}")
+        elif isinstance(value, dict):
+            # вложенные {метка: число} (полосы sender, хендлеры text_dispatch...) → метка key
+            for sub, v in value.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    lines.append(f'{prefix}_{key}{{key="{_escape(sub)}"}} {v}')
+
+
+def render() -> str:
+    lines: list[str] = []
+    for hist in HISTOGRAMS:
+        lines.extend(hist.render())
+    for name, stats in list(_collectors.items()):
+        try:
+            _gauges(f"rosfit_{name}", stats(), lines)
+        except Exception as e:
+            print("DEBUG metrics: stats() не удался", name, e)
+    return "\n".join(lines) + "\n"
+
+
+# ---------- хендлеры ----------
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: на dp.<событие> наследуется всеми вложенными роутерами."""
+
+    def __init__(self):
+        self._names: dict[int, tuple] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        obj = data.get("handler")
+        key = id(obj)
+        names = self._names.get(key)
+        if names is None:
+            callback = getattr(obj, "callback", None)
+            names = self._names[key] = (
+                getattr(callback, "__module__", "?"), getattr(callback, "__name__", "?"),
+            )
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            HANDLER.observe(names + (status,), time.perf_counter() - started)
+
+
+def instrument_dispatcher(dp):
+    # на всех наблюдателях, кроме update (его «хендлер» — весь разбор апдейта): роутеры
+    # подключаются позже, а inner-middleware без найденного хендлера не вызывается
+    mw = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name != "update":
+            observer.middleware(mw)
+
+
+# ---------- Bot API ----------
+
+class BotApiMetrics(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot: Bot, method):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await make_request(bot, method)
+            status = "ok"
+            return result
+        finally:
+            BOT_API.observe((type(method).__name__, status), time.perf_counter() - started)
+
+
+def instrument_bot(bot: Bot):
+    if not getattr(bot.session, "_rosfit_metrics", False):
+        bot.session.middleware(BotApiMetrics())
+        bot.session._rosfit_metrics = True
+
+
+# ---------- БД ----------
+
+def observe_db(backend: str, model: str, method: str, status: str, seconds: float):
+    DB.observe((backend, model, method, status), seconds)
+
+
+def timed_db(fn, backend: str, model: str, method: str):
+    """Обёртка корутины: время каждого вызова → rosfit_db_seconds."""
+    async def timed(*args, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            DB.observe((backend, model, method, status), time.perf_counter() - started)
+    return timed
+
+
+# ---------- HTTP ----------
+
+_runner: Optional[web.AppRunner] = None
+
+
+async def _handle(_request: web.Request) -> web.Response:
+    return web.Response(body=render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    global _runner
+    if not port or _runner is not None:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _handle)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    await web.TCPSite(_runner, host, port).start()
+    print(f"DEBUG metrics: http://{host}:{port}/metrics")
+
+
+async def stop():
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
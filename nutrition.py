@@ -0,0 +1,190 @@
+# nutrition.py
+"""
+Агрегация КБЖУ по дневникам FatSecret в колоночном виде (NumPy).
+
+Записи (кортежи в раскладке food_diary.DiaryEntry или сырой ответ
+food_entries.get.v2) один раз раскладываются в NutritionFrame — плоские массивы user / day / meal и матрицу
+values[n, 4] (ккал, белки, жиры, углеводы). Дальше всё считается векторно,
+без цикла по записям:
+
+- daily_totals()   → сетка [пользователь, день, нутриент];
+- meal_totals()    → [пользователь, день, приём пищи, нутриент];
+- weekly_totals()  → суммы по календарным неделям (пн–вс);
+- rolling_mean()   → скользящее среднее по дням;
+- deviation()      → отклонение от целей пользователя (доля от цели).
+"""
+from datetime import date as date_cls
+from itertools import chain, repeat
+from operator import itemgetter
+from typing import Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+
+NUTRIENTS = ("calories", "protein", "fat", "carbohydrate")
+MEALS = ("breakfast", "lunch", "dinner", "other")
+# FatSecret пишет приём пищи с заглавной буквы ("Breakfast")
+_MEAL_INDEX = {**{m: i for i, m in enumerate(MEALS)}, **{m.capitalize(): i for i, m in enumerate(MEALS)}}
+_VALUES = itemgetter(2, 3, 4, 5)
+_MEAL = itemgetter(1)
+_EPOCH = date_cls(1970, 1, 1).toordinal()
+
+
+def day_number(date: str) -> int:
+    """YYYY-MM-DD → номер дня от 1970-01-01."""
+    return date_cls.fromisoformat(date).toordinal() - _EPOCH
+
+
+def day_string(day: int) -> str:
+    return date_cls.fromordinal(int(day) + _EPOCH).isoformat()
+
+
+class NutritionFrame:
+    __slots__ = ("user", "day", "meal", "values")
+
+    def __init__(self, user: np.ndarray, day: np.ndarray, meal: np.ndarray, values: np.ndarray):
+        self.user = user          # int64[n]  — User.id
+        self.day = day            # int32[n]  — номер дня
+        self.meal = meal          # int8[n]   — индекс в MEALS
+        self.values = values      # float64[n, 4] — NUTRIENTS
+
+    def __len__(self) -> int:
+        return len(self.user)
+
+    @classmethod
+    def from_diaries(cls, diaries: Mapping[int, Mapping[str, Sequence[tuple]]]) -> "NutritionFrame":
+        """{user_id: {дата: записи}} (как возвращает FoodDiary.get_range) → кадр."""
+        user_keys, day_keys, counts, flat = [], [], [], []
+        day_cache: dict = {}
+        for user_id, by_date in diaries.items():
+            for date, entries in by_date.items():
+                if not entries:
+                    continue
+                d = day_cache.get(date)
+                if d is None:
+                    d = day_cache[date] = day_number(date)
+                user_keys.append(user_id)
+                day_keys.append(d)
+                counts.append(len(entries))
+                flat.extend(entries)
+        n = len(flat)
+        if not n:
+            return cls.empty()
+        # единственный проход по записям — внутри fromiter, без промежуточных списков
+        values = np.fromiter(chain.from_iterable(map(_VALUES, flat)), np.float64, n * len(NUTRIENTS))
+        meals = np.fromiter(map(_MEAL_INDEX.get, map(_MEAL, flat), repeat(3)), np.int8, n)
+        return cls(
+            np.repeat(np.array(user_keys, dtype=np.int64), counts),
+            np.repeat(np.array(day_keys, dtype=np.int32), counts),
+            meals,
+            values.reshape(n, len(NUTRIENTS)),
+        )
+
+    @classmethod
+    def from_responses(cls, responses: Mapping[int, Mapping[str, dict]]) -> "NutritionFrame":
+        """{user_id: {дата: ответ food_entries.get.v2}} → кадр."""
+        from food_diary import compact   # тянет клиент FatSecret — только когда нужен разбор JSON
+        return cls.from_diaries({
+            user_id: {date: compact(resp) for date, resp in by_date.items()}
+            for user_id, by_date in responses.items()
+        })
+
+    @classmethod
+    def empty(cls) -> "NutritionFrame":
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int8),
+                   np.empty((0, len(NUTRIENTS)), np.float64))
+
+
+class Grid:
+    """Плотная сетка агрегатов: users[u], first_day + d * step — оси, data[u, d, ...]."""
+    __slots__ = ("users", "first_day", "data", "step")
+
+    def __init__(self, users: np.ndarray, first_day: int, data: np.ndarray, step: int = 1):
+        self.users = users
+        self.first_day = first_day
+        self.data = data
+        self.step = step          # 1 — дни, 7 — недели
+
+    def dates(self) -> list:
+        """Даты колонок (для недель — понедельники)."""
+        return [day_string(self.first_day + i * self.step) for i in range(self.data.shape[1])]
+
+    def row(self, user_id: int) -> np.ndarray:
+        i = int(np.searchsorted(self.users, user_id))
+        if i >= len(self.users) or self.users[i] != user_id:
+            raise KeyError(user_id)
+        return self.data[i]
+
+
+def _axes(frame: NutritionFrame, first_day: Optional[int], last_day: Optional[int]):
+    users, u_idx = np.unique(frame.user, return_inverse=True)
+    lo = int(frame.day.min()) if first_day is None else first_day
+    hi = int(frame.day.max()) if last_day is None else last_day
+    d_idx = frame.day.astype(np.int64) - lo
+    keep = (d_idx >= 0) & (d_idx <= hi - lo)
+    return users, lo, hi - lo + 1, u_idx, d_idx, keep
+
+
+def _scatter(cells: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    # bincount по каждому нутриенту заметно быстрее np.add.at
+    return np.stack([np.bincount(cells, weights=values[:, j], minlength=size)
+                     for j in range(values.shape[1])], axis=-1)
+
+
+def daily_totals(frame: NutritionFrame, *, first_day: Optional[int] = None,
+                 last_day: Optional[int] = None) -> Grid:
+    """Суммы за день: data[u, d, нутриент]; дни без записей — нули."""
+    if not len(frame):
+        return Grid(np.empty(0, np.int64), first_day or 0, np.zeros((0, 0, len(NUTRIENTS))))
+    users, lo, n_days, u_idx, d_idx, keep = _axes(frame, first_day, last_day)
+    cells = u_idx[keep] * n_days + d_idx[keep]
+    data = _scatter(cells, frame.values[keep], len(users) * n_days)
+    return Grid(users, lo, data.reshape(len(users), n_days, len(NUTRIENTS)))
+
+
+def meal_totals(frame: NutritionFrame, *, first_day: Optional[int] = None,
+                last_day: Optional[int] = None) -> Grid:
+    """Суммы по приёмам пищи: data[u, d, приём, нутриент]."""
+    if not len(frame):
+        return Grid(np.empty(0, np.int64), first_day or 0, np.zeros((0, 0, len(MEALS), len(NUTRIENTS))))
+    users, lo, n_days, u_idx, d_idx, keep = _axes(frame, first_day, last_day)
+    n_meals = len(MEALS)
+    cells = (u_idx[keep] * n_days + d_idx[keep]) * n_meals + frame.meal[keep]
+    data = _scatter(cells, frame.values[keep], len(users) * n_days * n_meals)
+    return Grid(users, lo, data.reshape(len(users), n_days, n_meals, len(NUTRIENTS)))
+
+
+def weekly_totals(daily: Grid) -> Grid:
+    """Суммы по календарным неделям (пн–вс); first_day результата — понедельник первой недели."""
+    n_days = daily.data.shape[1]
+    if not n_days:
+        return daily
+    # 1970-01-01 — четверг: (day + 3) // 7 — номер недели с понедельника
+    weeks = (np.arange(daily.first_day, daily.first_day + n_days) + 3) // 7
+    starts = np.flatnonzero(np.r_[True, weeks[1:] != weeks[:-1]])
+    data = np.add.reduceat(daily.data, starts, axis=1)
+    return Grid(daily.users, int(weeks[0]) * 7 - 3, data, step=7)
+
+
+def rolling_mean(daily: Grid, window: int = 7) -> Grid:
+    """Скользящее среднее за window дней; первые window-1 дней — по доступному префиксу."""
+    csum = np.cumsum(daily.data, axis=1)
+    out = csum.copy()
+    out[:, window:] -= csum[:, :-window]
+    counts = np.minimum(np.arange(1, daily.data.shape[1] + 1), window)
+    counts = counts.reshape((1, -1) + (1,) * (daily.data.ndim - 2))
+    return Grid(daily.users, daily.first_day, out / counts, daily.step)
+
+
+def deviation(daily: Grid, targets: Mapping[int, Iterable[float]]) -> Grid:
+    """
+    (факт − цель) / цель по каждому нутриенту; targets — {user_id: (ккал, б, ж, у)}.
+    Пользователи без цели и нулевые цели дают NaN.
+    """
+    t = np.full((len(daily.users), len(NUTRIENTS)), np.nan)
+    for i, user_id in enumerate(daily.users.tolist()):
+        goal = targets.get(user_id)
+        if goal is not None:
+            t[i] = goal
+    t[t == 0] = np.nan
+    t = t[:, None, :]
+    return Grid(daily.users, daily.first_day, (daily.data - t) / t, daily.step)
@@ -0,0 +1,201 @@
+# profile_buffer.py
+"""
+Буфер правок профиля (EditClientFSM): каждое поле, изменённое в меню
+«✏️ Изменить данные», не пишется в БД сразу, а копится по пользователю и
+уходит одним users.update(...):
+
+- через PROFILE_FLUSH_DELAY секунд после первой несохранённой правки;
+- при выходе из EditClientFSM (ProfileFlushMiddleware после хендлера);
+- при остановке бота (flush_all в on_shutdown).
+
+Неудачная запись повторяется по тому же таймеру, но не больше
+PROFILE_MAX_RETRIES раз подряд: затем правки отбрасываются, строка
+сбрасывается из UserCache (чтобы не показывать несохранённое), а
+пользователю уходит сообщение через notify.
+
+Чтения остаются согласованными: правка сразу отражается в кэше UserCache,
+а overlay накладывает несохранённые поля на строки, пришедшие из БД.
+stats() — сессии редактирования, правки, записи в БД и сколько записей сэкономлено.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from user_cache import UserCache
+
+PROFILE_FLUSH_DELAY = float(os.getenv("PROFILE_FLUSH_DELAY", "5"))
+PROFILE_MAX_RETRIES = int(os.getenv("PROFILE_MAX_RETRIES", "3"))
+PROFILE_LOST_TEXT = "⚠️ Не удалось сохранить изменения профиля. Пожалуйста, внесите их ещё раз."
+EDIT_STATES_PREFIX = "EditClientFSM:"
+
+
+class _Session:
+    __slots__ = ("edits", "writes")
+
+    def __init__(self):
+        self.edits = 0
+        self.writes = 0
+
+
+class ProfileWriteBuffer:
+    def __init__(self, users: UserCache, *, delay: float = PROFILE_FLUSH_DELAY,
+                 max_retries: int = PROFILE_MAX_RETRIES):
+        self.users = users
+        self.delay = delay
+        self.max_retries = max_retries
+        self.notify: Optional[Callable[[int, str], Awaitable[Any]]] = None   # tg_id, текст → сообщение (bot.py)
+        self._failures: Dict[int, int] = {}       # неудачных записей подряд
+        self.pending: Dict[int, dict] = {}
+        self._inflight: Dict[int, dict] = {}      # правки, которые сейчас пишутся в БД
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._flushing: Dict[int, asyncio.Task] = {}
+        self._scheduled: set[asyncio.Task] = set()   # flush по таймеру
+        self._sessions: Dict[int, _Session] = {}
+        users.overlay = self._overlay
+        self.sessions = 0
+        self.edits = 0
+        self.writes = 0
+        self.failures = 0
+        self.lost = 0
+
+    def _overlay(self, tg_id: int) -> Optional[dict]:
+        writing, pending = self._inflight.get(tg_id), self.pending.get(tg_id)
+        if writing and pending:
+            return {**writing, **pending}
+        return pending or writing
+
+    def has_session(self, tg_id: int) -> bool:
+        return tg_id in self._sessions
+
+    # ---------- правки ----------
+
+    def stage(self, tg_id: int, data: dict):
+        """Запомнить изменение полей User; в БД уйдёт одним update."""
+        self.pending.setdefault(tg_id, {}).update(data)
+        self.users.apply(tg_id, data)
+        self.edits += 1
+        self._sessions.setdefault(tg_id, _Session()).edits += 1
+        if tg_id not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[tg_id] = loop.call_later(self.delay, self._flush_soon, tg_id)
+
+    def _flush_soon(self, tg_id: int):
+        self._timers.pop(tg_id, None)
+        task = asyncio.ensure_future(self.flush(tg_id))
+        self._scheduled.add(task)
+        task.add_done_callback(self._scheduled.discard)
+
+    async def flush(self, tg_id: int):
+        """Записать накопленные правки пользователя (одновременные вызовы ждут одну запись)."""
+        timer = self._timers.pop(tg_id, None)
+        if timer is not None:
+            timer.cancel()
+        running = self._flushing.get(tg_id)
+        if running is not None:
+            await asyncio.shield(running)
+        if tg_id not in self.pending:
+            return
+        task = asyncio.ensure_future(self._write(tg_id))
+        self._flushing[tg_id] = task
+        try:
+            await asyncio.shield(task)
+        finally:
+            if self._flushing.get(tg_id) is task:
+                del self._flushing[tg_id]
+
+    async def _write(self, tg_id: int):
+        data = self.pending.pop(tg_id, None)
+        if data is None:
+            return    # уже забрал параллельный flush
+        self._inflight[tg_id] = data
+        try:
+            await self.users.update(tg_id, data)
+        except Exception as e:
+            self.failures += 1
+            print("DEBUG profile: не удалось записать правки", tg_id, e)
+            attempts = self._failures[tg_id] = self._failures.get(tg_id, 0) + 1
+            if attempts >= self.max_retries:
+                self._drop(tg_id, data)
+                return
+            # возвращаем в pending (более свежие правки важнее) и повторим позже
+            self.pending[tg_id] = {**data, **self.pending.get(tg_id, {})}
+            if tg_id not in self._timers:
+                loop = asyncio.get_running_loop()
+                self._timers[tg_id] = loop.call_later(self.delay, self._flush_soon, tg_id)
+            return
+        finally:
+            self._inflight.pop(tg_id, None)
+        self._failures.pop(tg_id, None)
+        self.writes += 1
+        session = self._sessions.get(tg_id)
+        if session is not None:
+            session.writes += 1
+
+    def _drop(self, tg_id: int, data: dict):
+        self._failures.pop(tg_id, None)
+        self.lost += 1
+        print("DEBUG profile: правки отброшены после", self.max_retries, "попыток", tg_id, data)
+        self.users.invalidate(tg_id)    # следующее чтение — из БД, без несохранённых полей
+        if self.notify is not None:
+            task = asyncio.ensure_future(self._notify(tg_id))
+            self._scheduled.add(task)
+            task.add_done_callback(self._scheduled.discard)
+
+    async def _notify(self, tg_id: int):
+        try:
+            await self.notify(tg_id, PROFILE_LOST_TEXT)
+        except Exception as e:
+            print("DEBUG profile: не удалось сообщить об ошибке сохранения", tg_id, e)
+
+    async def end_session(self, tg_id: int):
+        """Пользователь вышел из редактирования: записать всё и подвести итог сессии."""
+        await self.flush(tg_id)
+        session = self._sessions.pop(tg_id, None)
+        if session is None:
+            return
+        self.sessions += 1
+        print(f"DEBUG profile: {tg_id} правок={session.edits} записей={session.writes} "
+              f"сэкономлено={session.edits - session.writes}")
+
+    async def flush_all(self):
+        await asyncio.gather(*self._scheduled, return_exceptions=True)
+        await asyncio.gather(*(self.end_session(t) for t in list(self._sessions)),
+                             *(self.flush(t) for t in list(self.pending)))
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "sessions": self.sessions,
+            "edits": self.edits,
+            "writes": self.writes,
+            "saved": self.edits - self.writes,
+            "saved_per_session": round((self.edits - self.writes) / self.sessions, 2) if self.sessions else 0.0,
+            "failures": self.failures,
+            "lost": self.lost,
+        }
+
+
+class ProfileFlushMiddleware(BaseMiddleware):
+    """Outer-middleware на update: после хендлера, если у пользователя есть правки и он уже не в EditClientFSM, пишем их."""
+
+    def __init__(self, buffer: ProfileWriteBuffer):
+        self.buffer = buffer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            from_user = data.get("event_from_user")
+            if from_user is not None and self.buffer.has_session(from_user.id):
+                state = data.get("state")
+                current: Optional[str] = await state.get_state() if state is not None else None
+                if not (current or "").startswith(EDIT_STATES_PREFIX):
+                    await self.buffer.end_session(from_user.id)
@@ -0,0 +1,326 @@
+# profiler.py
+"""
+Профилировщик медленных апдейтов (включается PROFILE_UPDATES=1).
+
+UpdateProfilerMiddleware — самый внешний outer-middleware на dp.update —
+заводит на апдейт трассу (ContextVar). Замеры metrics (хендлер, Prisma/asyncpg,
+Bot API, FatSecret, ожидание в sender) попадают в трассу того апдейта,
+в контексте которого выполнялись: получается разбивка по стадиям и
+список вызовов со смещением от начала апдейта.
+
+Трасса пишется на диск, если апдейт шёл дольше PROFILE_SLOW секунд или
+попал в выборку PROFILE_SAMPLE_RATE. Для таких апдейтов фоновый поток раз в
+PROFILE_SAMPLE_INTERVAL секунд снимает стек потока цикла событий (что цикл
+выполняет прямо сейчас) — начиная с PROFILE_SAMPLE_AFTER секунд от начала
+апдейта или сразу, если апдейт в выборке. Стеки хранятся свёрнутыми
+("a;b;c" → число попаданий), как для flamegraph.
+
+Детектор задержек цикла: задача-пульс каждые PROFILE_LAG_EVERY секунд;
+если пульса нет дольше PROFILE_LAG_THRESHOLD, поток снимает стеки того, что
+держит цикл, и после возобновления пишется запись kind="lag".
+
+Записи — JSON-строки в кольце из PROFILE_FILES файлов по PROFILE_FILE_BYTES
+в PROFILE_DIR (пишет тот же фоновый поток, цикл событий не ждёт диска).
+У каждого воркера шарда своё кольцо: profile-shard<index>-<i>.jsonl.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+import metrics
+
+PROFILE_UPDATES = os.getenv("PROFILE_UPDATES", "0") == "1"
+PROFILE_SLOW = float(os.getenv("PROFILE_SLOW", "1.0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SAMPLE_AFTER = float(os.getenv("PROFILE_SAMPLE_AFTER", "0.25"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+PROFILE_LAG_EVERY = float(os.getenv("PROFILE_LAG_EVERY", "0.05"))
+PROFILE_LAG_THRESHOLD = float(os.getenv("PROFILE_LAG_THRESHOLD", "0.2"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(__file__).parent / "data" / "profiles")))
+PROFILE_FILES = int(os.getenv("PROFILE_FILES", "8"))
+PROFILE_FILE_BYTES = int(os.getenv("PROFILE_FILE_BYTES", str(4 * 1024 * 1024)))
+
+MAX_CALLS = 200         # вызовов в одной трассе
+MAX_STACKS = 500        # стеков в одной трассе / записи о задержке
+STACK_DEPTH = 40
+
+_STAGES = {metrics.HANDLER: "handler", metrics.DB: "db", metrics.BOT_API: "bot_api",
+           metrics.FATSECRET: "fatsecret", metrics.SEND: "send"}
+_trace: contextvars.ContextVar[Optional["_Trace"]] = contextvars.ContextVar("profile_trace", default=None)
+
+
+def _stack(frame) -> str:
+    parts = []
+    while frame is not None and len(parts) < STACK_DEPTH:
+        code = frame.f_code
+        parts.append(f"{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Trace:
+    __slots__ = ("update_id", "kind", "user", "started", "sampled", "done", "stages", "calls", "stacks", "samples")
+
+    def __init__(self, update: Update, sampled: bool):
+        self.update_id = update.update_id
+        self.kind = update.event_type
+        user = getattr(update.event, "from_user", None)
+        self.user = user.id if user else None
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.done = False
+        self.stages: dict[str, float] = {}
+        self.calls: list = []
+        self.stacks: dict[str, int] = {}
+        self.samples = 0
+
+    def note(self, stage: str, label, seconds: float):
+        if self.done:
+            return      # задача пережила апдейт — её время уже не про него
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if len(self.calls) < MAX_CALLS:
+            offset = time.perf_counter() - self.started - seconds
+            self.calls.append((stage, label, round(offset * 1000, 2), round(seconds * 1000, 2)))
+
+    def record(self, total: float, reason: str) -> dict:
+        stages = {k: round(v * 1000, 2) for k, v in self.stages.items()}
+        stages["outside_handler"] = round((total - self.stages.get("handler", 0.0)) * 1000, 2)
+        return {
+            "kind": "update",
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "reason": reason,
+            "update_id": self.update_id,
+            "type": self.kind,
+            "user": self.user,
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": stages,
+            "calls": self.calls,
+            "samples": self.samples,
+            "stacks": self.stacks,
+        }
+
+
+class RingLog:
+    """JSON-строки в кольце файлов <name>-<i>.jsonl: заполнен текущий — переходим к следующему (перезаписываем)."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, files: int = PROFILE_FILES, max_bytes: int = PROFILE_FILE_BYTES,
+                 name: str = "profile"):
+        self.directory = directory
+        self.name = name
+        self.files = files
+        self.max_bytes = max_bytes
+        self.index = 0
+        self._fh = None
+
+    def _path(self, i: int) -> Path:
+        return self.directory / f"{self.name}-{i}.jsonl"
+
+    def _open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        existing = [(self._path(i).stat().st_mtime, i) for i in range(self.files) if self._path(i).exists()]
+        if existing:
+            self.index = max(existing)[1]       # продолжаем самый свежий файл
+        self._fh = open(self._path(self.index), "a", encoding="utf-8")
+
+    def write(self, record: dict):
+        if self._fh is None:
+            self._open()
+        if self._fh.tell() >= self.max_bytes:
+            self._fh.close()
+            self.index = (self.index + 1) % self.files
+            self._fh = open(self._path(self.index), "w", encoding="utf-8")
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class UpdateProfiler:
+    def __init__(self, *, slow: float = PROFILE_SLOW, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 sample_after: float = PROFILE_SAMPLE_AFTER, interval: float = PROFILE_SAMPLE_INTERVAL,
+                 lag_every: float = PROFILE_LAG_EVERY, lag_threshold: float = PROFILE_LAG_THRESHOLD,
+                 log: Optional[RingLog] = None):
+        self.slow = slow
+        self.sample_rate = sample_rate
+        self.sample_after = sample_after
+        self.interval = interval
+        self.lag_every = lag_every
+        self.lag_threshold = lag_threshold
+        self.log = log or RingLog()
+        self._active: set = set()
+        self._queue: SimpleQueue = SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._beat = time.monotonic()
+        self._blocked: dict[str, int] = {}      # стеки, снятые пока цикл стоял
+        # метрики
+        self.traced = 0
+        self.slow_updates = 0
+        self.sampled_updates = 0
+        self.written = 0
+        self.lag_events = 0
+        self.lag_max = 0.0
+
+    # ---------- трассы ----------
+
+    def begin(self, update: Update) -> _Trace:
+        trace = _Trace(update, random.random() < self.sample_rate)
+        self.traced += 1
+        self._active.add(trace)
+        return trace
+
+    def finish(self, trace: _Trace):
+        trace.done = True
+        self._active.discard(trace)
+        total = time.perf_counter() - trace.started
+        if total >= self.slow:
+            self.slow_updates += 1
+            self._queue.put(trace.record(total, "slow"))
+        elif trace.sampled:
+            self.sampled_updates += 1
+            self._queue.put(trace.record(total, "sampled"))
+
+    def _listen(self, hist, labels: tuple, seconds: float):
+        trace = _trace.get()
+        if trace is not None:
+            trace.note(_STAGES[hist], ":".join(map(str, labels[:-1])), seconds)
+
+    # ---------- фоновый поток: стеки и запись на диск ----------
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = None
+        now = time.perf_counter()
+        for trace in list(self._active):
+            if (trace.sampled or now - trace.started >= self.sample_after) and len(trace.stacks) < MAX_STACKS:
+                stack = stack or _stack(frame)
+                trace.stacks[stack] = trace.stacks.get(stack, 0) + 1
+                trace.samples += 1
+        if time.monotonic() - self._beat > self.lag_threshold and len(self._blocked) < MAX_STACKS:
+            stack = stack or _stack(frame)
+            self._blocked[stack] = self._blocked.get(stack, 0) + 1
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                record = self._queue.get(timeout=self.interval)
+            except Empty:
+                record = None
+            if record is not None:
+                try:
+                    self.log.write(record)
+                    self.written += 1
+                except OSError as e:
+                    print("DEBUG profiler: не удалось записать профиль:", e)
+            self._sample()
+        while True:     # дописываем очередь при остановке
+            try:
+                self.log.write(self._queue.get_nowait())
+                self.written += 1
+            except (Empty, OSError):
+                break
+        self.log.close()
+
+    async def _lag_loop(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.lag_every)
+            lag = time.monotonic() - self._beat - self.lag_every
+            if lag >= self.lag_threshold:
+                stacks, self._blocked = self._blocked, {}
+                self.lag_events += 1
+                self.lag_max = max(self.lag_max, lag)
+                self._queue.put({
+                    "kind": "lag",
+                    "ts": datetime.now(timezone.utc).isoformat(),
+                    "lag_ms": round(lag * 1000, 2),
+                    "stacks": stacks,
+                })
+            elif self._blocked:
+                self._blocked = {}
+
+    # ---------- жизненный цикл ----------
+
+    def start(self, shard: tuple = (0, 1)):
+        if self._thread is not None:
+            return
+        if shard[1] > 1:
+            self.log.name = f"profile-shard{shard[0]}"   # воркеры шарда не пишут в одни файлы
+        self._loop_thread = threading.get_ident()
+        for hist in _STAGES:
+            hist.listener = self._listen
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._worker, name="update-profiler", daemon=True)
+        self._thread.start()
+        self._lag_task = asyncio.create_task(self._lag_loop(), context=contextvars.Context())
+        print(f"DEBUG profiler: включён, порог {self.slow}s, выборка {self.sample_rate}, файлы {self.log.directory / self.log.name}-*.jsonl")
+
+    async def stop(self):
+        for hist in _STAGES:
+            hist.listener = None
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+        if self._thread is not None:
+            self._stopping.set()
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "traced": self.traced,
+            "active": len(self._active),
+            "slow": self.slow_updates,
+            "sampled": self.sampled_updates,
+            "written": self.written,
+            "lag_events": self.lag_events,
+            "lag_max": round(self.lag_max, 3),
+        }
+
+
+class UpdateProfilerMiddleware(BaseMiddleware):
+    def __init__(self, profiler: UpdateProfiler):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        trace = self.profiler.begin(event)
+        token = _trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            _trace.reset(token)
+            self.profiler.finish(trace)
+
+
+profiler = UpdateProfiler()
+
+
+def install(dp):
+    """Повесить профилировщик самым внешним middleware (только при PROFILE_UPDATES=1)."""
+    if PROFILE_UPDATES:
+        dp.update.outer_middleware(UpdateProfilerMiddleware(profiler))
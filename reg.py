@@ -3,11 +3,16 @@ from aiogram.filters import StateFilter
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from prisma import Prisma
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from helpers import send_temp, send_keep   # <- вместо from bot import ...
+from helpers import send_temp, send_keep, send_screen   # <- вместо from bot import ...
 import re
-from keyboards import client_kb, empty_kb
+from keyboards import client_kb, empty_kb, CLIENT_MENU, CLIENT_HOME
+from screens import Screen, static_markup
+from text_dispatch import TextContains
+import database
+from user_cache import UserCache
+from user_loader import UserLoader
+from profile_buffer import ProfileWriteBuffer
 from aiogram.types import CallbackQuery
 NAME_RE = re.compile(r"^[A-Za-zА-Яа-яЁё][A-Za-zА-Яа-яЁё\-'\s]{1,29}$")
 
@@ -18,36 +23,66 @@ def _name_fix(v: str) -> str:
     return re.sub(r"\s+", " ", (v or "").strip()).title()
 
 router = Router()
-db = Prisma()
+db = database.db   # общий клиент Prisma процесса (database.py)
+# User — через database.users_db: asyncpg при FAST_DB=1, иначе тот же Prisma
+user_loader = UserLoader(database.users_db)                # склеивает одновременные чтения по tg_id в find_many
+users = UserCache(database.users_db, loader=user_loader)   # кэш User по tg_id, все чтения/записи профиля — через него
+profile_buffer = ProfileWriteBuffer(users)   # правки в EditClientFSM склеиваются в один update
 
-reg_kb = ReplyKeyboardMarkup(
+reg_kb = static_markup(ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="✅ Зарегистрироваться")],
         [KeyboardButton(text="❌ Отмена")],
     ],
     resize_keyboard=True,
     one_time_keyboard=False,   # оставляем меню на экране, но без "прилипания"
-)
+))
+
+_MAIN_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="💬 Бесплатная консультация"), KeyboardButton(text="📝 Регистрация")],
+        [KeyboardButton(text="ℹ️ О нас")],
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=False,
+))
 
 def main_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💬 Бесплатная консультация"), KeyboardButton(text="📝 Регистрация")],
-            [KeyboardButton(text="ℹ️ О нас")],
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=False,
-    )
+    return _MAIN_KB
 
 
-CLIENT_PROFILE_KB = ReplyKeyboardMarkup(
+CLIENT_PROFILE_KB = static_markup(ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="✏️ Изменить данные")],
         [KeyboardButton(text="⬅️ Назад")],
     ],
     resize_keyboard=True,
     one_time_keyboard=False,
+))
+
+_OFFER_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="✅ Принять"), KeyboardButton(text="❌ Отклонить")]],
+    resize_keyboard=True,
+    one_time_keyboard=False,   # без is_persistent
+))
+
+_CANCEL_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="⬅️ Назад")]],
+    resize_keyboard=True,
+    one_time_keyboard=False,
+))
+
+# ---------- статические экраны регистрации ----------
+OFFER_SCREEN = Screen(
+    "📄 *Оферта*\n\n"
+    "Здесь будет размещён текст пользовательского соглашения.\n"
+    "Нажмите *Принять*, чтобы продолжить регистрацию.",
+    _OFFER_KB,
+    "Markdown",
 )
+REG_START_SCREEN = Screen("❗ Для регистрации клиента заполните данные и нажмите «✅ Зарегистрироваться».", reg_kb)
+REG_DECLINED_SCREEN = Screen("❌ Регистрация отменена.", _MAIN_KB)
+REG_CANCELLED_SCREEN = Screen("❌ Отменено. Вы в главном меню.", _MAIN_KB)
 
 
 class ClientFSM(StatesGroup):
@@ -118,16 +153,12 @@ async def _preview_form(message: Message, state: FSMContext):
 
 async def show_client_reg(message: Message, state: FSMContext):
     await state.clear()
-    await send_temp(
-        message,
-        "❗ Для регистрации клиента заполните данные и нажмите «✅ Зарегистрироваться».",
-        reply_markup=reg_kb,
-    )
+    await send_screen(message, REG_START_SCREEN)
     await state.set_state(ClientFSM.first_name)
     await _preview_form(message, state)
     await ask_input(message, "✏️ Введите ваше *имя*:")
 
-@router.message(lambda m: isinstance(m.text, str) and "регистрац" in m.text.lower())
+@router.message(TextContains("регистрац"))   # вычисляется заранее в text_dispatch
 async def client_entry(message: Message, state: FSMContext):
     print("DEBUG: client_entry сработал:", message.text)
 
@@ -136,37 +167,14 @@ async def client_entry(message: Message, state: FSMContext):
     # Сразу запускаем регистрацию — даже если пользователь уже есть
     await state.set_state(ClientFSM.accept_offer)
     
-    await send_temp(
-    message,
-    "📄 *Оферта*\n\n"
-    "Здесь будет размещён текст пользовательского соглашения.\n"
-    "Нажмите *Принять*, чтобы продолжить регистрацию.",
-    reply_markup=ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text="✅ Принять"), KeyboardButton(text="❌ Отклонить")]],
-        resize_keyboard=True,
-        one_time_keyboard=False,   # без is_persistent
-    ),
-    parse_mode="Markdown"
-)
+    await send_screen(message, OFFER_SCREEN)
 
 @router.message(ClientFSM.accept_offer, F.text.in_({"✅ Принять", "Принять"}))
 async def accept_offer(message: Message, state: FSMContext):
-    await db.user.upsert(
-        where={"tg_id": message.from_user.id},
-        data={
-            "create": {
-                "tg_id": message.from_user.id,
-                "username": message.from_user.username,
-                "agreed_offer": True,
-            },
-            "update": {
-                "username": message.from_user.username,
-                "agreed_offer": True,
-            },
-        },
-    )
+    # согласие запишем вместе с анкетой одним upsert в client_age
+    await state.update_data(agreed_offer=True)
     await state.set_state(ClientFSM.first_name)
-    await send_temp(message, "❗ Для регистрации клиента заполните данные и нажмите «✅ Зарегистрироваться».", reply_markup=reg_kb)
+    await send_screen(message, REG_START_SCREEN)
     await _preview_form(message, state)
     await ask_input(message, "✏️ Введите ваше *имя*:")
 
@@ -176,7 +184,7 @@ async def accept_offer(message: Message, state: FSMContext):
 @router.message(ClientFSM.accept_offer, F.text.in_({"❌ Отклонить", "Отклонить"}))
 async def decline_offer(message: Message, state: FSMContext):
     await state.clear()
-    await send_temp(message, "❌ Регистрация отменена.", reply_markup=main_kb())
+    await send_screen(message, REG_DECLINED_SCREEN)
 
 
 @router.message(ClientFSM.email)
@@ -244,32 +252,19 @@ async def client_age(message: Message, state: FSMContext):
 
     data = await state.update_data(age=a)
     await _preview_form(message, state)
-    await db.user.upsert(
-    where={"tg_id": message.from_user.id},
-    data={
-        "create": {
-            "tg_id":      message.from_user.id,
-            "username":   message.from_user.username,
-            "first_name": data["first_name"],
-            "last_name":  data["last_name"],
-            "email":      data["email"],
-            "phone":      data["phone"],
-            "heightCm":   data.get("height_cm"),
-            "weightKg":   data.get("weight_kg"),
-            "age":        data.get("age"),
-        },
-        "update": {
-            "username":   message.from_user.username,
-            "first_name": data["first_name"],
-            "last_name":  data["last_name"],
-            "email":      data["email"],
-            "phone":      data["phone"],
-            "heightCm":   data.get("height_cm"),
-            "weightKg":   data.get("weight_kg"),
-            "age":        data.get("age"),
-        },
-    },
-)
+    profile = {
+        "username":   message.from_user.username,
+        "first_name": data["first_name"],
+        "last_name":  data["last_name"],
+        "email":      data["email"],
+        "phone":      data["phone"],
+        "heightCm":   data.get("height_cm"),
+        "weightKg":   data.get("weight_kg"),
+        "age":        data.get("age"),
+    }
+    if data.get("agreed_offer"):
+        profile["agreed_offer"] = True
+    await users.upsert(message.from_user.id, create=profile, update=profile)
 
 
     await state.clear()
@@ -293,12 +288,12 @@ async def reg_start(message: Message, state: FSMContext):
 @router.message(F.text == "❌ Отмена")
 async def reg_cancel(message: Message, state: FSMContext):
     await state.clear()
-    await send_temp(message, "❌ Отменено. Вы в главном меню.", reply_markup=main_kb())
+    await send_screen(message, REG_CANCELLED_SCREEN)
 
 
 @router.message(StateFilter(None), F.text.in_({"👤 Профиль", "Профиль"}))
 async def profile_open(message: Message):
-    u = await db.user.find_unique(where={"tg_id": message.from_user.id})
+    u = await users.get(message.from_user.id)
     if not u:
         await send_temp(message, "Профиль не найден. Зарегистрируйтесь", reply_markup=client_kb(False))
         return
@@ -319,31 +314,28 @@ async def profile_open(message: Message):
 @router.message(StateFilter(None), F.text == "⬅️ Назад")
 async def client_back(message: Message, state: FSMContext):
     await state.clear()
-    u = await db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_tariff = bool(u and u.tariffName)
-    await send_temp(message, "🏠 Меню клиента", reply_markup=client_kb(has_tariff))
+    u = await users.get(message.from_user.id)
+    await send_screen(message, CLIENT_MENU[bool(u and u.tariffName)])
 
 @router.message(StateFilter(EditClientFSM), F.text == "⬅️ Назад")
 async def edit_client_back(message: Message, state: FSMContext):
     await state.clear()
-    u = await db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_tariff = bool(u and u.tariffName)
-    await send_temp(message, "🏠 Меню клиента", reply_markup=client_kb(has_tariff))
+    u = await users.get(message.from_user.id)
+    await send_screen(message, CLIENT_MENU[bool(u and u.tariffName)])
 
     
 
 @router.message(StateFilter(None), F.text == "⬅️ На главную")
 async def back_to_main_menu(message: Message, state: FSMContext):
     await state.clear()
-    u = await db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_tariff = bool(u and u.tariffName)
-    await send_temp(message, "🏠 Главное меню клиента", reply_markup=client_kb(has_tariff))
+    u = await users.get(message.from_user.id)
+    await send_screen(message, CLIENT_HOME[bool(u and u.tariffName)])
 
 
 
 @router.message(StateFilter(None), F.text == "✏️ Изменить данные")
 async def client_edit_start(message: Message, state: FSMContext):
-    u = await db.user.find_unique(where={"tg_id": message.from_user.id})
+    u = await users.get(message.from_user.id)
     if not u:
         await send_temp(message, "Профиль не найден.")
         return
@@ -358,11 +350,7 @@ async def client_edit_start(message: Message, state: FSMContext):
     await _preview_edit_form(message, state)
 
 def cancel_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text="⬅️ Назад")]],
-        resize_keyboard=True,
-        one_time_keyboard=False,
-    )
+    return _CANCEL_KB
 
 
 @router.message(ClientFSM.first_name)
@@ -600,7 +588,7 @@ async def edit_first_name_set(message: Message, state: FSMContext):
         await send_temp(message, "Имя должно содержать только буквы, 2–30 символов.", reply_markup=cancel_kb())
         return
     v = _name_fix(v)
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"first_name": v})
+    profile_buffer.stage(message.from_user.id, {"first_name": v})   # в БД — одним update при выходе/по таймеру
     await state.update_data(first_name=v)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -612,7 +600,7 @@ async def edit_last_name_set(message: Message, state: FSMContext):
         await send_temp(message, "Фамилия должна содержать только буквы, 2–30 символов.", reply_markup=cancel_kb())
         return
     v = _name_fix(v)
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"last_name": v})
+    profile_buffer.stage(message.from_user.id, {"last_name": v})
     await state.update_data(last_name=v)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -623,7 +611,7 @@ async def edit_email_set(message: Message, state: FSMContext):
     if not _email_ok(v):
         await send_temp(message, "Неверный e-mail. Пример: user@example.com", reply_markup=cancel_kb())
         return
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"email": v})
+    profile_buffer.stage(message.from_user.id, {"email": v})
     await state.update_data(email=v)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -634,7 +622,7 @@ async def edit_phone_set(message: Message, state: FSMContext):
     if not _phone_ok(v):
         await send_temp(message, "Неверный телефон. Пример: +79991234567", reply_markup=cancel_kb())
         return
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"phone": v})
+    profile_buffer.stage(message.from_user.id, {"phone": v})
     await state.update_data(phone=v)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -647,7 +635,7 @@ async def edit_height_set(message: Message, state: FSMContext):
     except Exception:
         await send_temp(message, "Введите рост в см (например: 180)", reply_markup=cancel_kb())
         return
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"heightCm": h})
+    profile_buffer.stage(message.from_user.id, {"heightCm": h})
     await state.update_data(height_cm=h)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -660,7 +648,7 @@ async def edit_weight_set(message: Message, state: FSMContext):
     except Exception:
         await send_temp(message, "Введите вес в кг (например: 82.5)", reply_markup=cancel_kb())
         return
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"weightKg": w})
+    profile_buffer.stage(message.from_user.id, {"weightKg": w})
     await state.update_data(weight_kg=w)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
@@ -673,7 +661,7 @@ async def edit_age_set(message: Message, state: FSMContext):
     except Exception:
         await send_temp(message, "Введите возраст целым числом (например: 29)", reply_markup=cancel_kb())
         return
-    await db.user.update(where={"tg_id": message.from_user.id}, data={"age": a})
+    profile_buffer.stage(message.from_user.id, {"age": a})
     await state.update_data(age=a)
     await state.set_state(EditClientFSM.menu)
     await _preview_edit_form(message, state)
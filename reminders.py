@@ -0,0 +1,243 @@
+# reminders.py
+"""
+Ежедневные напоминания платным клиентам (tariffName задан): «запишите
+приёмы пищи», «время взвеситься».
+
+Вместо задачи asyncio на каждого пользователя — строки Reminder с dueAt
+(следующий момент отправки, UTC, индекс по dueAt). Раз в REMINDER_POLL
+секунд воркер забирает до REMINDER_BATCH наступивших напоминаний одним
+UPDATE ... FROM (SELECT ... FOR UPDATE SKIP LOCKED): строки получают
+leasedUntil = now + REMINDER_LEASE, поэтому несколько процессов (шарды,
+реплики) делят работу без дублей, а аренда упавшего процесса истекает и
+строки забирает другой.
+
+Отправка — через sender (BULK), затем одной транзакцией: dueAt = следующее
+наступление hour:minute в часовом поясе напоминания (zoneinfo, переходы
+на летнее время учтены), аренда снимается. Пропущенные за время простоя
+напоминания не досылаются пачкой: старше REMINDER_MAX_LAG — только
+переносятся. Заблокировавшим бота ставится User.botBlocked (как в broadcast).
+
+stats(): отправлено/пропущено и задержка от dueAt до доставки (средняя, p95, max).
+"""
+import asyncio
+import os
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from database import db
+from reg import users as user_cache
+from sender import BULK, send
+
+REMINDER_POLL = float(os.getenv("REMINDER_POLL", "5"))
+REMINDER_BATCH = int(os.getenv("REMINDER_BATCH", "200"))
+REMINDER_LEASE = int(os.getenv("REMINDER_LEASE", "120"))
+REMINDER_MAX_LAG = float(os.getenv("REMINDER_MAX_LAG", "10800"))     # 3 ч
+REMINDER_TZ = os.getenv("REMINDER_TZ", "Europe/Moscow")
+
+# kind → (час, минута, текст) по умолчанию
+REMINDER_KINDS = {
+    "weight": (8, 0, "⚖️ Доброе утро! Время взвеситься и записать вес."),
+    "meals": (20, 0, "🍽 Не забудьте записать приёмы пищи за сегодня."),
+}
+
+_CLAIM_SQL = """
+WITH due AS (
+    SELECT id FROM "Reminder"
+    WHERE "dueAt" <= (NOW() AT TIME ZONE 'UTC')
+      AND ("leasedUntil" IS NULL OR "leasedUntil" < (NOW() AT TIME ZONE 'UTC'))
+    ORDER BY "dueAt"
+    LIMIT $1::int
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE "Reminder" r
+SET "leasedUntil" = (NOW() AT TIME ZONE 'UTC') + $2::int * INTERVAL '1 second'
+FROM due, "User" u
+WHERE r.id = due.id AND u.id = r."userId"
+RETURNING r.id, r.kind, r.hour, r.minute, r.timezone, r."dueAt", u.tg_id, u."tariffName", u."botBlocked"
+"""
+
+
+def next_due(hour: int, minute: int, tz: str, after: datetime) -> datetime:
+    """Ближайшее hour:minute по местному времени tz строго позже after (UTC)."""
+    zone = ZoneInfo(tz)
+    day: date = after.astimezone(zone).date()
+    while True:
+        due = datetime(day.year, day.month, day.day, hour, minute, tzinfo=zone).astimezone(timezone.utc)
+        if due > after:
+            return due
+        day += timedelta(days=1)
+
+
+def _utc(value) -> datetime:
+    # query_raw отдаёт DateTime строкой ISO; колонки Prisma хранят UTC без пояса
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class ReminderScheduler:
+    def __init__(self, *, database=db, poll: float = REMINDER_POLL, batch: int = REMINDER_BATCH,
+                 lease: int = REMINDER_LEASE, max_lag: float = REMINDER_MAX_LAG):
+        self.db = database
+        self.poll = poll
+        self.batch = batch
+        self.lease = lease
+        self.max_lag = max_lag
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lags: deque = deque(maxlen=1000)      # последние задержки доставки, с
+        self.claimed = 0
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.skipped = 0        # тариф снят / бот заблокирован
+        self.stale = 0          # пропущены из-за простоя дольше max_lag
+        self.lag_max = 0.0
+
+    # ---------- расписание ----------
+
+    async def ensure(self, user_id: int, tz: str = REMINDER_TZ):
+        """Завести напоминания пользователю (уже существующие не трогаем)."""
+        now = datetime.now(timezone.utc)
+        for kind, (hour, minute, _text) in REMINDER_KINDS.items():
+            await self.db.reminder.upsert(
+                where={"userId_kind": {"userId": user_id, "kind": kind}},
+                data={
+                    "create": {
+                        "user": {"connect": {"id": user_id}}, "kind": kind, "hour": hour, "minute": minute,
+                        "timezone": tz, "dueAt": next_due(hour, minute, tz, now),
+                    },
+                    "update": {},
+                },
+            )
+
+    async def backfill(self, page: int = 500) -> int:
+        """Завести напоминания платным клиентам, у которых их ещё нет (keyset по id)."""
+        now = datetime.now(timezone.utc)
+        cursor = created = 0
+        while True:
+            rows = await self.db.user.find_many(
+                where={"tariffName": {"not": None}, "reminders": {"none": {}}, "id": {"gt": cursor}},
+                order={"id": "asc"},
+                take=page,
+            )
+            if not rows:
+                break
+            cursor = rows[-1].id
+            created += await self.db.reminder.create_many(
+                data=[
+                    {"userId": u.id, "kind": kind, "hour": hour, "minute": minute, "timezone": REMINDER_TZ,
+                     "dueAt": next_due(hour, minute, REMINDER_TZ, now)}
+                    for u in rows for kind, (hour, minute, _text) in REMINDER_KINDS.items()
+                ],
+                skip_duplicates=True,
+            )
+            if len(rows) < page:
+                break
+        if created:
+            print(f"DEBUG reminders: заведено {created} напоминаний")
+        return created
+
+    # ---------- доставка ----------
+
+    async def claim(self) -> list:
+        rows = await self.db.query_raw(_CLAIM_SQL, self.batch, self.lease)
+        self.claimed += len(rows)
+        return rows
+
+    async def _deliver(self, row: dict, now: datetime) -> str:
+        if not row["tariffName"] or row["botBlocked"]:
+            self.skipped += 1
+            return "skipped"
+        due = _utc(row["dueAt"])
+        if (now - due).total_seconds() > self.max_lag:
+            self.stale += 1
+            return "stale"
+        tg_id = int(row["tg_id"])
+        text = REMINDER_KINDS.get(row["kind"], (0, 0, "🔔 Напоминание"))[2]
+        try:
+            await send(tg_id, lambda: self._bot.send_message(tg_id, text), priority=BULK)
+        except TelegramForbiddenError:
+            self.blocked += 1
+            return "blocked"
+        except Exception as e:
+            self.failed += 1
+            print("DEBUG reminders: не отправлено", tg_id, e)
+            return "failed"
+        lag = (datetime.now(timezone.utc) - due).total_seconds()
+        self._lags.append(lag)
+        self.lag_max = max(self.lag_max, lag)
+        self.sent += 1
+        return "sent"
+
+    async def run_once(self) -> int:
+        """Забрать и отправить одну пачку; вернуть её размер."""
+        rows = await self.claim()
+        if not rows:
+            return 0
+        now = datetime.now(timezone.utc)
+        results = await asyncio.gather(*(self._deliver(r, now) for r in rows))
+        done = datetime.now(timezone.utc)
+        async with self.db.batch_() as batcher:
+            for row, result in zip(rows, results):
+                data = {
+                    "dueAt": next_due(row["hour"], row["minute"], row["timezone"], max(now, _utc(row["dueAt"]))),
+                    "leasedUntil": None,
+                }
+                if result == "sent":
+                    data["lastSentAt"] = done
+                batcher.reminder.update(where={"id": row["id"]}, data=data)
+            blocked = [int(r["tg_id"]) for r, res in zip(rows, results) if res == "blocked"]
+            if blocked:
+                batcher.user.update_many(where={"tg_id": {"in": blocked}}, data={"botBlocked": True})
+        for tg_id in blocked:
+            user_cache.invalidate(tg_id)   # запись мимо UserCache — закэшированный botBlocked устарел
+        return len(rows)
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.run_once() >= self.batch:
+                    continue        # очередь не разобрана — следующую пачку сразу
+            except Exception as e:
+                print("DEBUG reminders: проход не удался:", e)
+            await asyncio.sleep(self.poll)
+
+    async def start(self, bot: Bot, shard: tuple = (0, 1)):
+        self._bot = bot
+        if shard[0] == 0:
+            try:
+                await self.backfill()
+            except Exception as e:
+                print("DEBUG reminders: backfill не удался:", e)
+        # забирают все воркеры: SKIP LOCKED разводит их по разным строкам
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            "claimed": self.claimed,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "skipped": self.skipped,
+            "stale": self.stale,
+            "lag_avg": round(sum(lags) / len(lags), 2) if lags else 0.0,
+            "lag_p95": round(lags[int(len(lags) * 0.95)], 2) if lags else 0.0,
+            "lag_max": round(self.lag_max, 2),
+        }
+
+
+scheduler = ReminderScheduler()
@@ -0,0 +1,46 @@
+# screens.py
+"""
+Каталог статических экранов: текст + reply-клавиатура + parse_mode.
+
+Клавиатуры статических экранов собираются один раз при импорте и тут же
+сериализуются в JSON (static_markup). helpers._answer узнаёт такие
+клавиатуры и отправляет готовую строку, минуя повторную валидацию
+pydantic и сериализацию aiogram на каждом сообщении.
+Модели aiogram неизменяемые (frozen), поэтому экземпляры можно раздавать всем хендлерам.
+"""
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from aiogram.types import ReplyKeyboardMarkup
+
+# id(markup) → (markup, json); сам markup держим, чтобы id не переиспользовался
+_ENCODED: dict[int, tuple[ReplyKeyboardMarkup, str]] = {}
+
+
+def static_markup(markup: ReplyKeyboardMarkup) -> ReplyKeyboardMarkup:
+    """Зарегистрировать неизменяемую клавиатуру и заранее сериализовать её."""
+    if id(markup) not in _ENCODED:
+        payload = json.dumps(
+            markup.model_dump(mode="json", exclude_none=True),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        _ENCODED[id(markup)] = (markup, payload)
+    return markup
+
+
+def encoded_markup(markup) -> Optional[str]:
+    item = _ENCODED.get(id(markup))
+    return item[1] if item is not None and item[0] is markup else None
+
+
+@dataclass(frozen=True)
+class Screen:
+    text: str
+    reply_markup: Optional[ReplyKeyboardMarkup] = None
+    parse_mode: Optional[str] = None
+
+    def __post_init__(self):
+        if self.reply_markup is not None:
+            static_markup(self.reply_markup)
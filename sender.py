@@ -0,0 +1,287 @@
+# sender.py
+"""
+Планировщик исходящих сообщений перед Bot API.
+
+- глобальный token bucket (≈30 msg/s на бота) и bucket на каждый чат
+  (≈1 msg/s с небольшим запасом на «пачку» из 3-4 сообщений одного экрана);
+- полосы приоритета: INTERACTIVE (ответы на действия пользователя) всегда
+  обслуживаются раньше BULK (рассылки); внутри полосы чаты идут по кругу,
+  порядок сообщений одного чата сохраняется;
+- на 429 (TelegramRetryAfter) чат ставится на паузу retry_after, сообщение
+  возвращается в голову его очереди и уходит повторно;
+- метрики: глубина очередей, время ожидания, число 429;
+- close() при остановке сначала дожидается отправки очереди (до SEND_DRAIN_TIMEOUT
+  секунд), оставшиеся сообщения отменяет.
+
+helpers.send_temp / send_keep / send_ephemeral отправляют через scheduler.
+"""
+import asyncio
+import contextvars
+import heapq
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+
+import metrics
+
+SEND_SCHEDULER = os.getenv("SEND_SCHEDULER", "1") == "1"
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "4"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+SEND_DRAIN_TIMEOUT = float(os.getenv("SEND_DRAIN_TIMEOUT", "10"))
+
+INTERACTIVE = 0
+BULK = 1
+LANES = (INTERACTIVE, BULK)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько ждать до появления целого токена (0 — можно сейчас)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("chat_id", "call", "future", "enqueued", "attempts")
+
+    def __init__(self, chat_id: int, call: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class _Lane:
+    def __init__(self):
+        self.jobs: dict[int, deque[_Job]] = {}
+        self.ready: deque[int] = deque()        # чаты с сообщениями, по кругу
+        self.size = 0
+
+
+class SendScheduler:
+    def __init__(self, *, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: float = SEND_CHAT_BURST, max_retries: int = SEND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats: dict[int, TokenBucket] = {}
+        self._blocked: dict[int, float] = {}        # chat_id → monotonic, до которого пауза после 429
+        self._lanes = {lane: _Lane() for lane in LANES}
+        self._sleeping: list[tuple[float, int, int]] = []   # (когда, lane, chat_id)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._sending: set[asyncio.Task] = set()
+        self._last_prune = time.monotonic()
+        # метрики
+        self.sent = 0
+        self.failed = 0
+        self.retry_after = 0
+        self.wait_total = {lane: 0.0 for lane in LANES}
+        self.wait_max = {lane: 0.0 for lane in LANES}
+        self.wait_count = {lane: 0 for lane in LANES}
+
+    # ---------- API ----------
+
+    async def submit(self, chat_id: int, call: Callable[[], Awaitable[Any]], *,
+                     priority: int = INTERACTIVE) -> Any:
+        """Поставить отправку в очередь и дождаться её результата (Message и т.п.)."""
+        if self._task is None or self._task.done():
+            # чистый контекст: цикл не должен унаследовать contextvars апдейта, который его запустил
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        fut = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, _Job(chat_id, call, fut))
+        return await fut
+
+    def depth(self) -> dict[int, int]:
+        return {lane: self._lanes[lane].size for lane in LANES}
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after,
+            "wait_avg": {
+                lane: self.wait_total[lane] / self.wait_count[lane] if self.wait_count[lane] else 0.0
+                for lane in LANES
+            },
+            "wait_max": dict(self.wait_max),
+        }
+
+    async def close(self, timeout: float = SEND_DRAIN_TIMEOUT):
+        # дослать очередь (ответы пользователям, хвост рассылки), но не дольше timeout
+        deadline = time.monotonic() + timeout
+        while (any(self.depth().values()) or self._sending) and time.monotonic() < deadline:
+            if self._task is None or self._task.done():
+                break
+            await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        sending = list(self._sending)
+        for task in sending:
+            task.cancel()
+        await asyncio.gather(*sending, return_exceptions=True)
+        for lane in self._lanes.values():
+            for q in lane.jobs.values():
+                for job in q:
+                    job.future.cancel()
+            lane.jobs.clear()
+            lane.ready.clear()
+            lane.size = 0
+        self._sleeping.clear()
+
+    # ---------- внутреннее ----------
+
+    def _enqueue(self, lane_id: int, job: _Job, *, front: bool = False):
+        lane = self._lanes[lane_id]
+        q = lane.jobs.get(job.chat_id)
+        if q is None:
+            q = lane.jobs[job.chat_id] = deque()
+            lane.ready.append(job.chat_id)
+        if front:
+            q.appendleft(job)
+        else:
+            q.append(job)
+        lane.size += 1
+        self._wake.set()
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            b = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return b
+
+    def _chat_delay(self, chat_id: int, now: float) -> float:
+        blocked = self._blocked.get(chat_id)
+        if blocked is not None:
+            if blocked > now:
+                return blocked - now
+            del self._blocked[chat_id]
+        return self._bucket(chat_id).delay(now)
+
+    def _prune(self, now: float):
+        # забываем полные bucket'ы неактивных чатов, чтобы словарь не рос бесконечно
+        active = set()
+        for lane in self._lanes.values():
+            active.update(lane.jobs)
+        for chat_id in [c for c, b in self._chats.items() if c not in active and b.full(now)]:
+            del self._chats[chat_id]
+        self._last_prune = now
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, lane_id, chat_id = heapq.heappop(self._sleeping)
+                self._lanes[lane_id].ready.append(chat_id)
+            if now - self._last_prune > 60:
+                self._prune(now)
+
+            lane_id = next((l for l in LANES if self._lanes[l].ready), None)
+            if lane_id is None:
+                self._wake.clear()
+                timeout = self._sleeping[0][0] - now if self._sleeping else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self.global_bucket.delay(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            lane = self._lanes[lane_id]
+            chat_id = lane.ready.popleft()
+            delay = self._chat_delay(chat_id, now)
+            if delay:
+                heapq.heappush(self._sleeping, (now + delay, lane_id, chat_id))
+                continue
+
+            q = lane.jobs[chat_id]
+            job = q.popleft()
+            lane.size -= 1
+            if q:
+                lane.ready.append(chat_id)
+            else:
+                del lane.jobs[chat_id]
+
+            self.global_bucket.take(now)
+            self._bucket(chat_id).take(now)
+            wait = now - job.enqueued
+            self.wait_total[lane_id] += wait
+            self.wait_count[lane_id] += 1
+            self.wait_max[lane_id] = max(self.wait_max[lane_id], wait)
+            task = asyncio.create_task(self._send(lane_id, job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, lane_id: int, job: _Job):
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except TelegramRetryAfter as e:
+            self.retry_after += 1
+            if job.attempts > self.max_retries:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                return
+            self._blocked[job.chat_id] = time.monotonic() + e.retry_after
+            self._enqueue(lane_id, job, front=True)
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+
+scheduler = SendScheduler()
+
+
+async def send(chat_id: int, call: Callable[[], Awaitable[Any]], *, priority: int = INTERACTIVE) -> Any:
+    """Отправить через общий scheduler (или напрямую, если SEND_SCHEDULER=0)."""
+    if not SEND_SCHEDULER:
+        return await call()
+    started = time.perf_counter()
+    status = "error"
+    try:
+        result = await scheduler.submit(chat_id, call, priority=priority)
+        status = "ok"
+        return result
+    finally:
+        metrics.SEND.observe(("bulk" if priority == BULK else "interactive", status), time.perf_counter() - started)
@@ -0,0 +1,179 @@
+# sharding.py
+"""
+Многопроцессный режим: фронт-процесс принимает апдейты (polling или webhook)
+и раскладывает их по N воркер-процессам по from_user.id. Все апдейты одного
+пользователя попадают в один процесс и обрабатываются строго по очереди,
+поэтому ClientFSM / EditClientFSM не перемешиваются.
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+from contextlib import suppress
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from update_scheduler import UpdateScheduler, poll_into, shard_key
+
+BOT_SHARDS = int(os.getenv("BOT_SHARDS", "1"))
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "2000"))
+SHARD_CONCURRENCY = int(os.getenv("SHARD_CONCURRENCY", "64"))   # одновременных апдейтов в воркере
+SHARD_REPORT_EVERY = float(os.getenv("SHARD_REPORT_EVERY", "30"))
+
+_GET_TIMEOUT = 0.5   # q.get в воркере — с таймаутом, чтобы сигнал остановки не ждал следующего апдейта
+
+
+class ShardRouter:
+    def __init__(self, shards: int = BOT_SHARDS, *, maxsize: int = SHARD_QUEUE_SIZE):
+        self.shards = shards
+        self._ctx = mp.get_context("spawn")
+        self.queues = [self._ctx.Queue(maxsize) for _ in range(shards)]
+        self.sent = [0] * shards
+        self.processed = self._ctx.Array("q", shards)
+        self.rejected = 0
+        self._procs: list[mp.Process] = []
+        self._reporter: asyncio.Task | None = None
+
+    def shard_of(self, update: Update) -> int:
+        return shard_key(update) % self.shards
+
+    def _item(self, update: Update):
+        return update.model_dump(mode="json", exclude_none=True)
+
+    def put(self, update: Update) -> bool:
+        """Неблокирующая постановка (для webhook: при переполнении вернёт False → 503)."""
+        i = self.shard_of(update)
+        try:
+            self.queues[i].put_nowait(self._item(update))
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.sent[i] += 1
+        return True
+
+    async def put_wait(self, update: Update):
+        """Блокирующая постановка (для polling: держим offset, пока шард не освободится)."""
+        i = self.shard_of(update)
+        item = self._item(update)
+        await asyncio.get_running_loop().run_in_executor(None, self.queues[i].put, item)
+        self.sent[i] += 1
+
+    def depths(self) -> list[int]:
+        """Сколько апдейтов каждого шарда ещё не обработано (в очереди + в работе)."""
+        return [self.sent[i] - self.processed[i] for i in range(self.shards)]
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(SHARD_REPORT_EVERY)
+            print("DEBUG shards: depth =", self.depths(), "rejected =", self.rejected)
+
+    async def start(self):
+        for i in range(self.shards):
+            p = self._ctx.Process(
+                target=_worker_main,
+                args=(i, self.queues[i], self.processed),
+                name=f"bot-shard-{i}",
+                daemon=True,
+            )
+            p.start()
+            self._procs.append(p)
+        self._reporter = asyncio.create_task(self._report())
+
+    async def stop(self):
+        if self._reporter:
+            self._reporter.cancel()
+        loop = asyncio.get_running_loop()
+        for p, q in zip(self._procs, self.queues):
+            if not p.is_alive():
+                continue    # воркер уже остановился по своему сигналу — в полную очередь не положить
+            with suppress(queue.Full):
+                await loop.run_in_executor(None, q.put, None, True, 30)
+        for p in self._procs:
+            await loop.run_in_executor(None, p.join, 30)
+        self._procs.clear()
+
+
+# ---------- воркер-процесс ----------
+
+def _worker_main(index: int, q, processed):
+    asyncio.run(_worker_loop(index, q, processed))
+
+
+async def _worker_loop(index: int, q, processed):
+    # импорт внутри процесса: у каждого воркера свой Dispatcher, Bot и подключение Prisma
+    from bot import BOT_TOKEN, build_dispatcher
+    import database
+    import metrics
+
+    bot = Bot(BOT_TOKEN)
+    dp = build_dispatcher()
+    dp["shard"] = (index, BOT_SHARDS)
+    await database.connect()
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    loop = asyncio.get_running_loop()
+
+    def done():
+        with processed.get_lock():
+            processed[index] += 1
+
+    # очередь по пользователю, приоритет callback_query, лимит одновременных хендлеров
+    updates = UpdateScheduler(dp, bot, concurrency=SHARD_CONCURRENCY, on_done=done)
+    metrics.register("updates", updates.stats)
+
+    # SIGINT из терминала приходит всей группе процессов, SIGTERM — и воркеру напрямую
+    # (docker/systemd): без обработчика воркер умирает, не сохранив FSM, профили и удаления
+    stopping = asyncio.Event()
+    signals = (signal.SIGINT, signal.SIGTERM)
+    for sig in signals:
+        with suppress(NotImplementedError):     # Windows: остаётся KeyboardInterrupt от asyncio.run
+            loop.add_signal_handler(sig, stopping.set)
+
+    print(f"DEBUG shard {index}: запущен (pid {os.getpid()})")
+    try:
+        while not stopping.is_set():
+            try:
+                data = await loop.run_in_executor(None, q.get, True, _GET_TIMEOUT)
+            except queue.Empty:
+                continue
+            if data is None:
+                break
+            await updates.put_wait(Update.model_validate(data, context={"bot": bot}))
+        if stopping.is_set():
+            print(f"DEBUG shard {index}: получен сигнал остановки")
+            # уже разложенное фронтом Telegram не пришлёт повторно — дорабатываем
+            while True:
+                try:
+                    data = q.get_nowait()
+                except queue.Empty:
+                    break
+                if data is None:
+                    break
+                await updates.put_wait(Update.model_validate(data, context={"bot": bot}))
+        await updates.stop()
+    finally:
+        for sig in signals:
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await database.disconnect()
+        await bot.session.close()
+
+
+# ---------- фронт-процесс ----------
+
+async def run_sharded(dp, bot: Bot, mode: str, shards: int = BOT_SHARDS):
+    """dp во фронте нужен только для allowed_updates; startup/shutdown-хуки идут в воркерах."""
+    router = ShardRouter(shards)
+    if mode == "webhook":
+        from webhook import run_webhook
+        await run_webhook(dp, bot, updates=router, emit_lifecycle=False)
+        return
+    await router.start()
+    try:
+        await poll_into(bot, dp.resolve_used_update_types(), router)
+    finally:
+        await router.stop()
+        await bot.session.close()
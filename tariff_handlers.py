@@ -1,12 +1,14 @@
 # tariff_handlers.py
 from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
-from keyboards import tariffs_kb, client_main_kb, client_kb, empty_kb
+from keyboards import client_main_kb, empty_kb, CLIENT_HOME, TARIFFS_SCREEN, TARIFFS_CHANGE_SCREEN
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from helpers import send_temp, send_ephemeral
+from helpers import send_temp, send_ephemeral, send_screen
+from screens import Screen, static_markup
 from reg import profile_open
-from reg import db as reg_db  # импорт клиента БД (вверху файла)
+from reg import users  # кэш User по tg_id поверх reg.db
+from reminders import scheduler as reminders
 router = Router()
 
 INVISIBLE = "\u2063"  # невидимый, но НЕ пустой символ
@@ -23,74 +25,73 @@ class TempState:
     TARIFF = "temp_tariff"
 
 # ---------- локальные reply-клавиатуры этого модуля ----------
-def base_tariff_menu_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💳 Купить")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+# собираются один раз при импорте (screens.static_markup), функции отдают готовые экземпляры
+_BUY_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="💳 Купить")],
+        [KeyboardButton(text="⬅️ Назад")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+_VALUE_TARIFF_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Чат с куратором"), KeyboardButton(text="Тренировки")],
+        [KeyboardButton(text="💳 Купить")],
+        [KeyboardButton(text="⬅️ Назад")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
+
+_TARIFF_STATUS_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="✏️ Изменить")],
+        [KeyboardButton(text="🏠 На главную")],
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=False,
+    is_persistent=False,
+))
+
+_VALUE_TARIFF_FINAL_KB = static_markup(ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Чат с куратором"), KeyboardButton(text="Тренировки")],
+        [KeyboardButton(text="⬅️ Назад")],
+    ],
+    resize_keyboard=True,
+    is_persistent=False,
+    one_time_keyboard=False,
+))
 
 
+def base_tariff_menu_kb() -> ReplyKeyboardMarkup:
+    return _BUY_KB
+
 
 def value_tariff_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Чат с куратором"), KeyboardButton(text="Тренировки")],
-            [KeyboardButton(text="💳 Купить")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _VALUE_TARIFF_KB
 # tariff_handlers.py (рядом с другими KB)
 def tariff_status_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="✏️ Изменить")],
-            [KeyboardButton(text="🏠 На главную")],
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=False,
-        is_persistent=False,
-    )
+    return _TARIFF_STATUS_KB
 
 def buy_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💳 Купить")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _BUY_KB
 
 def section_action_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="💳 Купить")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _BUY_KB
 
 def value_tariff_final_kb() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Чат с куратором"), KeyboardButton(text="Тренировки")],
-            [KeyboardButton(text="⬅️ Назад")],
-        ],
-        resize_keyboard=True,
-        is_persistent=False,
-        one_time_keyboard=False,
-    )
+    return _VALUE_TARIFF_FINAL_KB
+
+
+# ---------- статические экраны ----------
+BASE_TARIFF_SCREEN = Screen("🧾 *Базовый тариф*\n\nТут будет ваше описание.", _BUY_KB, "Markdown")
+VALUE_TARIFF_SCREEN = Screen("🧾 *Выгодный тариф*\n\nЗдесь будет описание тарифа.", _BUY_KB, "Markdown")
+MAXIMUM_TARIFF_SCREEN = Screen("🧾 *Максимум*\n\nЗдесь будет описание тарифа.", _BUY_KB, "Markdown")
 
 
 
@@ -102,16 +103,15 @@ async def forced_exit_from_fsm(message: Message, state: FSMContext):
     elif message.text == "Тариф":
         await show_tariffs(message, state)
     else:
-        u = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
-        has_app = bool(u and u.tariffName)
-        await show_with_reply_kb(message, "🏠 Главное меню клиента", client_kb(has_app), md=False)
+        u = await users.get(message.from_user.id)
+        await send_screen(message, CLIENT_HOME[bool(u and u.tariffName)])
 
 
 # ---------- список тарифов ----------
 @router.message(StateFilter(None), F.text == "Тариф")
 async def show_tariffs(message: Message, state: FSMContext):
     await state.clear()
-    u = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
+    u = await users.get(message.from_user.id)
     if u and u.tariffName:
         await show_with_reply_kb(
             message,
@@ -119,19 +119,18 @@ async def show_tariffs(message: Message, state: FSMContext):
             tariff_status_kb()
         )
         return
-    await show_with_reply_kb(message, "Выберите подходящий тариф:", tariffs_kb())
+    await send_screen(message, TARIFFS_SCREEN)
 
 @router.message(StateFilter(None), F.text == "✏️ Изменить")
 async def tariff_change(message: Message, state: FSMContext):
     await state.clear()
-    await show_with_reply_kb(message, "Выберите новый тариф:", tariffs_kb())
+    await send_screen(message, TARIFFS_CHANGE_SCREEN)
 
 @router.message(StateFilter(None), F.text == "🏠 На главную")
 async def tariff_to_home(message: Message, state: FSMContext):
     await state.clear()
-    u = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_app = bool(u and u.tariffName)
-    await show_with_reply_kb(message, "🏠 Главное меню клиента", client_kb(has_app), md=False)
+    u = await users.get(message.from_user.id)
+    await send_screen(message, CLIENT_HOME[bool(u and u.tariffName)])
 
 
 
@@ -139,57 +138,45 @@ async def tariff_to_home(message: Message, state: FSMContext):
 @router.message(StateFilter(None), F.text == "💼 Базовый")
 async def show_base_tariff(message: Message, state: FSMContext):
     await state.set_data({TempState.TARIFF: "Базовый"})
-    await show_with_reply_kb(
-        message,
-        "🧾 *Базовый тариф*\n\nТут будет ваше описание.",
-        base_tariff_menu_kb()
-    )
+    await send_screen(message, BASE_TARIFF_SCREEN)
 
 # ---------- Выгодный ----------
 @router.message(StateFilter(None), F.text == "🤑 Выгодный")
 async def show_value_tariff(message: Message, state: FSMContext):
     await state.set_data({TempState.TARIFF: "Выгодный"})
-    await show_with_reply_kb(
-        message,
-        "🧾 *Выгодный тариф*\n\nЗдесь будет описание тарифа.",
-        buy_kb()
-    )
+    await send_screen(message, VALUE_TARIFF_SCREEN)
 
 # ---------- Максимум ----------
 @router.message(StateFilter(None), F.text == "💎 Максимум")
 async def show_maximum_tariff(message: Message, state: FSMContext):
     await state.set_data({TempState.TARIFF: "Максимум"})
-    await show_with_reply_kb(
-        message,
-        "🧾 *Максимум*\n\nЗдесь будет описание тарифа.",
-        buy_kb()
-    )
+    await send_screen(message, MAXIMUM_TARIFF_SCREEN)
 
 @router.message(StateFilter(None), F.text == "💳 Купить")
 async def handle_tariff_purchase(message: Message, state: FSMContext):
     data = await state.get_data()
     bought_tariff = data.get(TempState.TARIFF, "Базовый")
 
-    await reg_db.user.upsert(
-        where={"tg_id": message.from_user.id},
-        data={
-            "create": {
-                "tg_id": message.from_user.id,
-                "username": message.from_user.username,
-                "tariffName": bought_tariff,
-            },
-            "update": {
-                "username": message.from_user.username,
-                "tariffName": bought_tariff,
-            },
+    u = await users.upsert(
+        message.from_user.id,
+        create={
+            "username": message.from_user.username,
+            "tariffName": bought_tariff,
+        },
+        update={
+            "username": message.from_user.username,
+            "tariffName": bought_tariff,
         },
     )
 
     await send_temp(message, f"✅ Поздравляем! Вы оформили тариф *{bought_tariff}*", parse_mode="Markdown")
+    try:
+        await reminders.ensure(u.id)   # ежедневные напоминания — только платным клиентам
+    except Exception as e:
+        print("DEBUG reminders: не удалось завести напоминания", u.id, e)
 
-    u = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_app = bool(u and u.tariffName)
-    await show_with_reply_kb(message, "🏠 Главное меню клиента", client_kb(has_app), md=False)
+    # строка уже вернулась из upsert — повторно не читаем
+    await send_screen(message, CLIENT_HOME[bool(u.tariffName)])
     await state.clear()
 
 
@@ -199,7 +186,6 @@ async def handle_tariff_purchase(message: Message, state: FSMContext):
 @router.message(StateFilter(None), F.text == "⬅️ Назад")
 async def back_to_main_menu(message: Message, state: FSMContext):
     await state.clear()
-    u = await reg_db.user.find_unique(where={"tg_id": message.from_user.id})
-    has_app = bool(u and u.tariffName)
-    await show_with_reply_kb(message, "🏠 Главное меню клиента", client_kb(has_app), md=False)
+    u = await users.get(message.from_user.id)
+    await send_screen(message, CLIENT_HOME[bool(u and u.tariffName)])
 
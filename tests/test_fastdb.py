@@ -0,0 +1,115 @@
+# tests/test_fastdb.py
+"""
+fastdb без базы: белый список колонок, DSN из DATABASE_URL Prisma, SQL для
+update/upsert (собирается один раз на набор колонок) и откат в Prisma, пока
+пул не поднят или запрос не из «быстрых».
+
+    python -m pytest tests/test_fastdb.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fastdb
+
+
+class FakePool:
+    """pool.fetchrow / fetch: запоминает SQL и параметры, возвращает строку как есть."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def fetchrow(self, sql, *args):
+        self.calls.append((sql, args))
+        return {"tg_id": args[-1], "sql": sql}
+
+    async def fetch(self, sql, *args):
+        self.calls.append((sql, args))
+        return [{"tg_id": t} for t in args[0]]
+
+
+class FakeUsers:
+    def __init__(self):
+        self.calls = []
+
+    async def find_unique(self, where, **kwargs):
+        self.calls.append(("find_unique", where, kwargs))
+
+    async def update(self, where, data, **kwargs):
+        self.calls.append(("update", where, data))
+
+
+def delegate(pool=True):
+    d = fastdb.FastUserDelegate(FakeUsers(), lambda **row: SimpleNamespace(**row))
+    d.pool = FakePool() if pool else None
+    return d
+
+
+def test_columns_are_whitelisted():
+    assert fastdb._q("botBlocked") == '"botBlocked"'
+    assert fastdb._q("tariffName") == '"tariffName"'
+    with pytest.raises(ValueError):
+        fastdb._q('tg_id"; DROP TABLE "User"; --')
+
+
+def test_dsn_drops_prisma_params():
+    dsn, settings = fastdb._dsn("postgresql://u:p@db:5432/app?schema=bot&connection_limit=5")
+    assert dsn == "postgresql://u:p@db:5432/app"
+    assert settings == {"search_path": "bot"}
+    assert fastdb._dsn("postgresql://db/app") == ("postgresql://db/app", {})
+
+
+def test_update_sql_is_built_once_per_column_set():
+    d = delegate()
+    row = asyncio.run(d.update(where={"tg_id": 7}, data={"weightKg": 80, "botBlocked": False}))
+    sql, args = d.pool.calls[0]
+    assert sql == 'UPDATE "User" SET "weightKg" = $1, "botBlocked" = $2 WHERE "tg_id" = $3 RETURNING *'
+    assert args == (80, False, 7)
+    assert row.tg_id == 7
+    asyncio.run(d.update(where={"tg_id": 8}, data={"weightKg": 81, "botBlocked": True}))
+    assert list(d._sql) == [("update", ("weightKg", "botBlocked"))]
+
+
+def test_upsert_sql():
+    d = delegate()
+    asyncio.run(d.upsert(where={"tg_id": 7}, data={"create": {"tariffName": "Старт"},
+                                                   "update": {"tariffName": "Старт"}}))
+    sql, args = d.pool.calls[0]
+    assert sql == ('INSERT INTO "User" ("tariffName", "tg_id") VALUES ($1, $2) ON CONFLICT ("tg_id") '
+                   'DO UPDATE SET "tariffName" = $3 RETURNING *')
+    assert args == ("Старт", 7, "Старт")
+
+
+def test_upsert_with_empty_update_still_returns_row():
+    d = delegate()
+    asyncio.run(d.upsert(where={"tg_id": 7}, data={"create": {"age": 30}, "update": {}}))
+    assert 'DO UPDATE SET "tg_id" = EXCLUDED."tg_id" RETURNING *' in d.pool.calls[0][0]
+
+
+def test_unknown_column_is_rejected_before_query():
+    d = delegate()
+    with pytest.raises(ValueError):
+        asyncio.run(d.update(where={"tg_id": 7}, data={"password": "x"}))
+    assert d.pool.calls == []
+
+
+def test_find_many_uses_any():
+    d = delegate()
+    rows = asyncio.run(d.find_many(where={"tg_id": {"in": [1, 2]}}))
+    assert [r.tg_id for r in rows] == [1, 2]
+    assert d.pool.calls == [('SELECT * FROM "User" WHERE "tg_id" = ANY($1::bigint[])', ([1, 2],))]
+
+
+def test_falls_back_to_prisma():
+    d = delegate(pool=False)
+    asyncio.run(d.find_unique(where={"tg_id": 7}))
+    d.pool = FakePool()
+    asyncio.run(d.find_unique(where={"id": 1}))                          # не по tg_id
+    asyncio.run(d.update(where={"tg_id": 7}, data={"age": 30}, include={"tokens": True}))
+    assert [c[0] for c in d.fallback.calls] == ["find_unique", "find_unique", "update"]
+    assert d.pool.calls == []
@@ -0,0 +1,86 @@
+# tests/test_food_index.py
+"""
+food_index: нормализация (кириллица/латиница), префиксный и нечёткий поиск
+по файлу индекса, pending до пересборки и повторное обучение на уже
+проиндексированных продуктах.
+
+    python -m pytest tests/test_food_index.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from food_index import FoodCatalog, FoodIndex, _write, normalize
+
+FOODS = {
+    11: "Гречка ядрица",
+    12: "Гречневая каша",
+    20: "Куриная грудка",
+    30: "Рис басмати",
+    40: "Творог 5%",
+}
+
+
+def index(tmp_path) -> FoodIndex:
+    path = tmp_path / "foods.idx"
+    _write(path, FOODS)
+    return FoodIndex(path)
+
+
+def ids(ix: FoodIndex, found) -> list:
+    return [int(ix.ids[i]) for i in found]
+
+
+def test_normalize_joins_cyrillic_and_latin():
+    assert normalize("Гречка  ЯДРИЦА!") == "grechka yadrica"
+    assert normalize("Grechka") == normalize("гречка")
+    assert normalize("Ёжик") == normalize("ежик")
+
+
+def test_items_and_membership(tmp_path):
+    ix = index(tmp_path)
+    assert dict(ix.items()) == FOODS
+    assert 20 in ix and 21 not in ix and 10 ** 12 not in ix
+    assert 1 not in FoodIndex(tmp_path / "missing.idx")
+
+
+def test_prefix_matches_words_and_tails(tmp_path):
+    ix = index(tmp_path)
+    assert sorted(ids(ix, ix.prefix("grech", 10))) == [11, 12]
+    assert ids(ix, ix.prefix(normalize("грудка"), 10)) == [20]      # второе слово названия
+    assert ids(ix, ix.prefix("kurinaya grudka", 10)) == [20]         # длиннее 8 байт ключа
+    assert ids(ix, ix.prefix("kurinaya grudx", 10)) == []
+    assert len(ix.prefix("grech", 1)) == 1
+
+
+def test_fuzzy_tolerates_typos(tmp_path):
+    ix = index(tmp_path)
+    assert ix.prefix(normalize("басмате"), 10) == []
+    assert ids(ix, ix.fuzzy(normalize("рис басмате"), 10)) == [30]
+    assert ix.fuzzy("zzzz", 10) == []
+
+
+def test_suggest_prefers_prefix_then_fuzzy(tmp_path):
+    catalog = FoodCatalog(tmp_path / "foods.idx")
+    for food_id, name in FOODS.items():
+        catalog.learn(food_id, name)
+    assert [f for f, _ in catalog.suggest("греч")] == [11, 12]       # пока только pending
+    asyncio.run(catalog.rebuild())
+    assert catalog.pending == {}
+    assert [f for f, _ in catalog.suggest("grech")] == [11, 12]
+    assert catalog.suggest("курин грудка", limit=1) == [(20, "Куриная грудка")]
+
+
+def test_learn_skips_indexed_foods(tmp_path):
+    catalog = FoodCatalog(tmp_path / "foods.idx")
+    catalog.learn(11, "Гречка ядрица")
+    asyncio.run(catalog.rebuild())
+    catalog.learn_response({"foods": {"food": [
+        {"food_id": "11", "food_name": "Гречка ядрица"},
+        {"food_id": "50", "food_name": "Овсянка", "brand_name": "Увелка"},
+        {"food_id": "oops", "food_name": "Битый id"},
+    ]}})
+    assert catalog.pending == {50: "Овсянка (Увелка)"}
+    assert not FoodCatalog(tmp_path / "other.idx").needs_rebuild()
@@ -0,0 +1,126 @@
+# tests/test_metrics.py
+"""
+metrics.py: гистограммы и формат exposition, gauge из stats() компонентов,
+HandlerMetricsMiddleware (статусы ok/error) и бюджет накладных расходов 2%
+(та же методика, что в bench/metrics.py).
+
+    python -m pytest tests/test_metrics.py
+"""
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message, Update
+
+import metrics
+
+
+def _bench():
+    # bench/metrics.py называется так же, как модуль metrics — грузим под другим именем
+    spec = importlib.util.spec_from_file_location("bench_metrics", ROOT / "bench" / "metrics.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("t_seconds", "тест", ("op", "status"), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        h.observe(("get", "ok"), value)
+    lines = h.render()
+    assert lines[:2] == ["# HELP t_seconds тест", "# TYPE t_seconds histogram"]
+    assert 't_seconds_bucket{op="get",status="ok",le="0.1"} 2' in lines
+    assert 't_seconds_bucket{op="get",status="ok",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{op="get",status="ok",le="+Inf"} 4' in lines
+    assert 't_seconds_count{op="get",status="ok"} 4' in lines
+    assert any(line.startswith('t_seconds_sum{op="get",status="ok"} 3.65') for line in lines)
+
+
+def test_label_values_are_escaped():
+    h = metrics.Histogram("e_seconds", "тест", ("name",), buckets=(1.0,))
+    h.observe(('a"b\\c\nd',), 0.5)
+    assert 'e_seconds_count{name="a\\"b\\\\c\\nd"} 1' in h.render()
+
+
+def test_listener_sees_every_observation():
+    seen = []
+    h = metrics.Histogram("l_seconds", "тест", ("op",))
+    h.listener = lambda hist, labels, value: seen.append((hist.name, labels, value))
+    h.observe(("x",), 0.25)
+    assert seen == [("l_seconds", ("x",), 0.25)]
+
+
+def test_registered_stats_become_gauges():
+    metrics.register("t_component", lambda: {
+        "size": 3, "ratio": 0.5, "enabled": True, "label": "skip", "lanes": {"bulk": 2, "flag": False},
+    })
+    metrics.register("t_broken", lambda: 1 / 0)
+    try:
+        text = metrics.render()
+    finally:
+        metrics._collectors.pop("t_component", None)
+        metrics._collectors.pop("t_broken", None)
+    assert "rosfit_t_component_size 3\n" in text
+    assert "rosfit_t_component_ratio 0.5\n" in text
+    assert "rosfit_t_component_enabled 1\n" in text
+    assert 'rosfit_t_component_lanes{key="bulk"} 2\n' in text
+    assert "label" not in text and "flag" not in text
+    assert text.endswith("\n")
+
+
+def test_handler_middleware_records_status():
+    async def on_ok(message: Message):
+        return "ok"
+
+    async def on_fail(message: Message):
+        raise RuntimeError("boom")
+
+    dp = Dispatcher()
+    metrics.instrument_dispatcher(dp)
+    router = Router()
+    router.message.register(on_ok, F.text == "ok")
+    router.message.register(on_fail, F.text == "fail")
+    dp.include_router(router)
+    user = {"id": 1, "is_bot": False, "first_name": "T"}
+
+    def update(i, text):
+        return Update.model_validate({"update_id": i, "message": {
+            "message_id": i, "date": 0, "from": user, "chat": {"id": 1, "type": "private"}, "text": text}})
+
+    async def run():
+        bot = Bot("42:TEST")
+        try:
+            await dp.feed_update(bot, update(1, "ok"))
+            with pytest.raises(RuntimeError):
+                await dp.feed_update(bot, update(2, "fail"))
+        finally:
+            await bot.session.close()
+
+    asyncio.run(run())
+    series = metrics.HANDLER._series
+    assert series[(__name__, "on_ok", "ok")][-1] >= 0
+    assert sum(series[(__name__, "on_ok", "ok")][:-1]) == 1
+    assert sum(series[(__name__, "on_fail", "error")][:-1]) == 1
+
+
+def test_handler_overhead_within_budget():
+    bench = _bench()
+
+    async def base():
+        bot = Bot("42:BENCH")
+        try:
+            return await bench.per_update(bench.build(), bot, bench.make_updates(1000), rounds=5)
+        finally:
+            await bot.session.close()
+
+    per_update = asyncio.run(base())
+    direct, timed = bench.per_call(calls=50_000, repeat=5)
+    overhead = max(timed - direct, 0.0) / per_update
+    assert overhead < bench.BUDGET, f"overhead {overhead:.2%} > {bench.BUDGET:.0%}"
@@ -0,0 +1,98 @@
+# tests/test_sender.py
+"""
+sender: TokenBucket на заданных моментах времени и SendScheduler — темп на
+чат, приоритет интерактивных ответов над рассылкой, повтор после
+TelegramRetryAfter.
+
+    python -m pytest tests/test_sender.py
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from sender import BULK, INTERACTIVE, SendScheduler, TokenBucket
+
+
+def test_bucket_refills_up_to_capacity():
+    b = TokenBucket(rate=2, capacity=3)
+    t0 = b.updated
+    for _ in range(3):
+        assert b.delay(t0) == 0
+        b.take(t0)
+    assert b.delay(t0) == pytest.approx(0.5)
+    assert b.delay(t0 + 0.5) == 0
+    assert not b.full(t0 + 1)
+    assert b.full(t0 + 10) and b.tokens == 3
+
+
+def run(coro):
+    async def main():
+        scheduler = SendScheduler(global_rate=1000, chat_rate=20, chat_burst=1, max_retries=1)
+        try:
+            return await coro(scheduler)
+        finally:
+            await scheduler.close(timeout=1)
+    return asyncio.run(main())
+
+
+def test_chat_rate_is_enforced():
+    async def scenario(s):
+        stamps = []
+
+        async def call():
+            stamps.append(time.monotonic())
+
+        await asyncio.gather(*(s.submit(1, call) for _ in range(4)), s.submit(2, call))
+        return stamps, s.stats()
+
+    stamps, stats = run(scenario)
+    assert stats["sent"] == 5
+    assert stamps[-1] - stamps[0] >= 3 / 20 * 0.9      # 4 сообщения в чат 1: три интервала по 1/20 с
+    assert stamps[1] - stamps[0] < 0.04                 # чат 2 не ждёт чат 1
+
+
+def test_interactive_lane_goes_first():
+    async def scenario(s):
+        order = []
+
+        def call(tag):
+            async def send():
+                order.append(tag)
+            return send
+
+        jobs = [s.submit(chat, call(f"bulk{chat}"), priority=BULK) for chat in range(3)]
+        jobs.append(s.submit(9, call("reply"), priority=INTERACTIVE))
+        await asyncio.gather(*jobs)
+        return order
+
+    assert run(scenario)[0] == "reply"
+
+
+def test_retry_after_requeues_then_gives_up():
+    async def scenario(s):
+        attempts = {"ok": 0, "flood": 0}
+
+        def flaky(key, fails):
+            async def send():
+                attempts[key] += 1
+                if attempts[key] <= fails:
+                    raise TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "flood", retry_after=0)
+                return key
+            return send
+
+        assert await s.submit(1, flaky("ok", 1)) == "ok"
+        with pytest.raises(TelegramRetryAfter):
+            await s.submit(2, flaky("flood", 5))
+        return attempts, s.stats()
+
+    attempts, stats = run(scenario)
+    assert attempts == {"ok": 2, "flood": 2}
+    assert stats["retry_after"] == 3 and stats["sent"] == 1 and stats["failed"] == 1
@@ -0,0 +1,103 @@
+# tests/test_text_dispatch.py
+"""
+Компиляция таблицы text_dispatch: точные тексты, TextContains, состояния,
+хендлеры с Command/CommandStart (не должны останавливать компиляцию) и
+неразбираемые фильтры (останавливают её для своего состояния).
+
+    python -m pytest tests/test_text_dispatch.py
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram import Dispatcher, F, Router
+from aiogram.filters import Command, CommandStart, StateFilter
+from aiogram.fsm.state import State, StatesGroup
+
+from text_dispatch import TextContains, TextDispatchTable
+
+
+class Reg(StatesGroup):
+    name = State()
+    age = State()
+
+
+async def on_start(message): ...
+async def on_admin(message): ...
+async def on_client(message): ...
+async def on_register(message): ...
+async def on_menu(message): ...
+async def on_name(message): ...
+async def on_anything(message): ...
+async def on_slash_button(message): ...
+
+
+def build() -> Dispatcher:
+    dp = Dispatcher()
+    admin = Router()
+    admin.message.register(on_admin, Command("broadcast"))
+    main = Router()
+    main.message.register(on_start, CommandStart())
+    main.message.register(on_client, F.text == "КЛИЕНТ")
+    main.message.register(on_slash_button, F.text == "/start")
+    main.message.register(on_register, TextContains("регистрац"))
+    main.message.register(on_menu, StateFilter(None), F.text.in_({"Меню", "Профиль"}))
+    main.message.register(on_name, StateFilter(Reg.name), F.text)     # свободный ввод — неразбираемый
+    main.message.register(on_anything, Reg.age)                       # ловит всё в Reg.age
+    dp.include_router(admin)
+    dp.include_router(main)
+    return dp
+
+
+def table() -> dict:
+    return {(state, text): c.handler.callback for (state, text), c in TextDispatchTable(build()).table.items()}
+
+
+def test_commands_do_not_stop_compilation():
+    t = table()
+    assert t[(None, "КЛИЕНТ")] is on_client
+    assert t[(None, "Меню")] is on_menu
+    assert t[(None, "Профиль")] is on_menu
+    assert t[(Reg.age.state, "Профиль")] is on_anything
+
+
+def test_text_contains_is_precomputed():
+    only = Router()
+    only.message.register(on_register, TextContains("регистрац"))
+    only.message.register(on_client, F.text.in_({"✅ Регистрация", "КЛИЕНТ"}))
+    root = Dispatcher()
+    root.include_router(only)
+    compiled = TextDispatchTable(root).table
+    assert compiled[(None, "✅ Регистрация")].handler.callback is on_register
+    assert compiled[(None, "КЛИЕНТ")].handler.callback is on_client
+
+
+def test_command_prefixed_buttons_fall_back():
+    # «/start» мог бы забрать CommandStart — такой текст решает обычная цепочка
+    assert (None, "/start") not in table()
+
+
+def test_opaque_filter_stops_its_state():
+    t = table()
+    assert (Reg.name.state, "КЛИЕНТ") in t          # хендлеры без состояния — раньше неразбираемого
+    assert (Reg.name.state, "Меню") not in t        # on_menu только для None, дальше — F.text
+
+
+def test_bot_dispatcher_covers_reg_and_start_buttons():
+    pytest.importorskip("prisma.models", reason="нужен сгенерированный Prisma client (prisma generate)")
+    os.environ.setdefault("BOT_TOKEN", "42:TEST")
+    import bot
+    import text_dispatch
+
+    dp = bot.build_dispatcher()
+    mw = next(m for m in dp.message.outer_middleware if isinstance(m, text_dispatch.TextDispatchMiddleware))
+    names = {text: c.name for (state, text), c in mw.table.table.items() if state is None}
+    assert names["КЛИЕНТ"] == "bot.on_client"
+    assert names["ℹ️ О нас"] == "bot.on_about"
+    assert names["✅ Зарегистрироваться"].startswith("reg.")
+    assert names["👤 Профиль"].startswith("reg.")
+    assert names["💳 Купить"].startswith("tariff_handlers.")
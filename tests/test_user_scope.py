@@ -0,0 +1,130 @@
+# tests/test_user_scope.py
+"""
+UserScopeMiddleware в строгом режиме (USER_SCOPE_STRICT): цепочка хендлеров,
+как forced_exit_from_fsm → show_tariffs, читает User автора апдейта из БД
+не больше одного раза; лишнее чтение роняет feed_update.
+
+    python -m pytest tests/test_user_scope.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("prisma.models", reason="нужен сгенерированный Prisma client (prisma generate)")
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message, Update
+
+from user_cache import UserCache, UserScopeMiddleware
+
+TG_ID = 4242
+
+
+class FakeUsers:
+    """db.user: find_unique / update по словарю, с подсчётом чтений."""
+
+    def __init__(self):
+        self.rows = {TG_ID: SimpleNamespace(tg_id=TG_ID, tariffName=None, weightKg=80)}
+        self.reads = 0
+
+    async def find_unique(self, where: dict):
+        self.reads += 1
+        return self.rows.get(where["tg_id"])
+
+    async def update(self, where: dict, data: dict):
+        row = self.rows[where["tg_id"]]
+        row = self.rows[where["tg_id"]] = SimpleNamespace(**{**vars(row), **data})
+        return row
+
+
+def build(users: UserCache, router: Router) -> Dispatcher:
+    dp = Dispatcher()
+    dp.update.outer_middleware(UserScopeMiddleware(users, strict=True))
+    dp.include_router(router)
+    return dp
+
+
+def message(text: str, update_id: int = 1) -> Update:
+    user = {"id": TG_ID, "is_bot": False, "first_name": "Test"}
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "from": user,
+                    "chat": {"id": TG_ID, "type": "private"}, "text": text},
+    })
+
+
+def feed(dp: Dispatcher, update: Update):
+    async def run():
+        bot = Bot("42:TEST")
+        try:
+            return await dp.feed_update(bot, update)
+        finally:
+            await bot.session.close()
+    return asyncio.run(run())
+
+
+def make_users():
+    db = SimpleNamespace(user=FakeUsers())
+    return db.user, UserCache(db)
+
+
+def test_handler_chain_reads_user_once():
+    db_users, users = make_users()
+    router = Router()
+    seen = []
+
+    async def show_tariffs(message: Message):
+        u = await users.get(message.from_user.id)
+        seen.append(("show_tariffs", u.tariffName))
+
+    @router.message(F.text == "Тариф")
+    async def forced_exit(message: Message, user_ctx):
+        u = await user_ctx.get()
+        seen.append(("forced_exit", u.weightKg))
+        await show_tariffs(message)
+
+    dp = build(users, router)
+    feed(dp, message("Тариф"))
+    assert seen == [("forced_exit", 80), ("show_tariffs", None)]
+    assert db_users.reads == 1
+    assert users.redundant_reads == 0
+
+    feed(dp, message("Тариф", update_id=2))    # следующий апдейт — из кэша
+    assert db_users.reads == 1
+
+
+def test_write_is_visible_down_the_chain():
+    db_users, users = make_users()
+    router = Router()
+    seen = []
+
+    @router.message(F.text == "Купить")
+    async def buy(message: Message):
+        await users.update(message.from_user.id, {"tariffName": "Старт"})
+        u = await users.get(message.from_user.id)
+        seen.append(u.tariffName)
+
+    feed(build(users, router), message("Купить"))
+    assert seen == ["Старт"]
+    assert db_users.reads == 0
+
+
+def test_strict_mode_rejects_second_read():
+    db_users, users = make_users()
+    router = Router()
+
+    @router.message(F.text == "Профиль")
+    async def profile(message: Message):
+        await users.get(message.from_user.id)
+        users.invalidate(message.from_user.id)     # как если бы хендлер сбросил кэш посреди цепочки
+        await users.get(message.from_user.id)
+
+    with pytest.raises(AssertionError, match="прочитан из БД 2 раз"):
+        feed(build(users, router), message("Профиль"))
+    assert db_users.reads == 2
+    assert users.redundant_reads == 1
@@ -0,0 +1,253 @@
+# text_dispatch.py
+"""
+Таблица «(FSM-состояние, текст кнопки) → хендлер» перед цепочкой фильтров aiogram.
+
+При старте обходим все роутеры Dispatcher в том же порядке, в каком aiogram
+ищет хендлер, и для каждого известного состояния раскладываем точные тексты
+кнопок (F.text == ..., F.text.in_(...)) по хендлерам, которые победили бы в
+обычной цепочке. Текстовые фильтры без точного текста (TextContains)
+вычисляются на этапе компиляции для всех известных текстов кнопок.
+Command / CommandStart срабатывают только на тексты, начинающиеся с префикса
+команды ("/"): остальные кнопки они пропустить не могут, компиляция идёт
+дальше, а кнопки с префиксом для этого состояния отдаются обычной цепочке.
+Как только для состояния встречается хендлер с фильтром, который нельзя
+вычислить заранее, дальнейшая компиляция для этого состояния прекращается —
+такие сообщения (и любой свободный ввод) идут по обычной цепочке.
+
+TextDispatchMiddleware (outer-middleware на dp.message) делает один поиск в dict;
+stats() показывает попадания по хендлерам и число вычислений каждого фильтра
+в обычной цепочке.
+"""
+import operator
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.filters import Command, Filter, StateFilter
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message
+
+ANY = object()          # хендлер подходит для любого состояния
+_UNKNOWN = object()     # фильтр не разобрать → компиляция для состояния останавливается
+_PROBE = "\u0000text-dispatch-probe\u0000"
+
+
+class TextContains(Filter):
+    """Подстрока в тексте сообщения (по умолчанию без учёта регистра)."""
+
+    def __init__(self, needle: str, *, ignore_case: bool = True):
+        self.ignore_case = ignore_case
+        self.needle = needle.casefold() if ignore_case else needle
+
+    def match(self, text: str) -> bool:
+        return self.needle in (text.casefold() if self.ignore_case else text)
+
+    async def __call__(self, message: Message) -> bool:
+        return isinstance(message.text, str) and self.match(message.text)
+
+
+# ---------- разбор фильтров ----------
+
+def _state_names(value) -> set:
+    if value is None:
+        return {None}
+    if value == "*":
+        return {ANY}
+    if isinstance(value, State):
+        return {value.state}
+    if isinstance(value, str):
+        return {value}
+    if isinstance(value, type) and issubclass(value, StatesGroup):
+        return set(value.__all_states_names__)
+    return {_UNKNOWN}
+
+
+def _exact_texts(magic) -> Optional[set]:
+    """{тексты} для F.text == "..." / F.text.in_(...), иначе None."""
+    ops = getattr(magic, "_operations", ())
+    if len(ops) != 2 or type(ops[0]).__name__ != "GetAttributeOperation" or ops[0].name != "text":
+        return None
+    op = ops[1]
+    texts = None
+    if type(op).__name__ == "ComparatorOperation" and op.comparator is operator.eq:
+        texts = {op.right}
+    elif type(op).__name__ == "FunctionOperation" and getattr(op.function, "__name__", "") == "in_op":
+        texts = set(op.args[0]) if op.args else None
+    if not texts or not all(isinstance(t, str) for t in texts):
+        return None
+    # страховка от неверного разбора: проверяем фильтр на самих текстах и на «мусоре»
+    if not all(magic.resolve(SimpleNamespace(text=t)) for t in texts):
+        return None
+    if magic.resolve(SimpleNamespace(text=_PROBE)):
+        return None
+    return texts
+
+
+class _Compiled:
+    """Разобранный хендлер: состояния, текстовый предикат, признак «неразбираемый»."""
+    __slots__ = ("router", "observer", "handler", "states", "texts", "text_filter", "command_prefix", "opaque",
+                 "name")
+
+    def __init__(self, router: Router, observer, handler):
+        self.router = router
+        self.observer = observer
+        self.handler = handler
+        self.states = {ANY}
+        self.texts: Optional[set] = None      # точные тексты
+        self.text_filter: Optional[TextContains] = None
+        self.command_prefix: Optional[str] = None   # Command: только тексты, начинающиеся с префикса
+        self.opaque = False
+        cb = handler.callback
+        self.name = f"{getattr(cb, '__module__', '?')}.{getattr(cb, '__qualname__', repr(cb))}"
+
+        state_sets = []
+        for fo in handler.filters or ():
+            target = getattr(fo.callback, "__self__", fo.callback)
+            magic = getattr(fo, "magic", None)
+            if magic is not None:
+                texts = _exact_texts(magic)
+                if texts is None or self.texts is not None or self.text_filter is not None:
+                    self.opaque = True
+                else:
+                    self.texts = texts
+            elif isinstance(target, StateFilter):
+                names = set()
+                for s in target.states:
+                    names |= _state_names(s)
+                state_sets.append(names)
+            elif isinstance(target, State) or (isinstance(target, type) and issubclass(target, StatesGroup)):
+                state_sets.append(_state_names(target))
+            elif isinstance(target, TextContains) and self.texts is None and self.text_filter is None:
+                self.text_filter = target
+            elif isinstance(target, Command):
+                self.command_prefix = (self.command_prefix or "") + target.prefix
+            else:
+                self.opaque = True
+        for names in state_sets:
+            if _UNKNOWN in names:
+                self.opaque = True
+            elif ANY not in names:
+                self.states = names if ANY in self.states else self.states & names
+
+    def applies(self, state) -> bool:
+        return ANY in self.states or state in self.states
+
+    def matches(self, text: str) -> bool:
+        if self.texts is not None:
+            return text in self.texts
+        if self.text_filter is not None:
+            return self.text_filter.match(text)
+        return True   # фильтра по тексту нет — подходит любой текст
+
+
+def _counted(callback, counter: Counter, key: str):
+    def counted(*args, **kwargs):
+        counter[key] += 1
+        return callback(*args, **kwargs)
+    return counted
+
+
+def _walk(router: Router):
+    """Роутеры в порядке обхода aiogram: сначала свои хендлеры, потом вложенные."""
+    yield router
+    for sub in router.sub_routers:
+        yield from _walk(sub)
+
+
+class TextDispatchTable:
+    def __init__(self, dp: Dispatcher):
+        self.table: dict[tuple, _Compiled] = {}
+        self.hits: Counter = Counter()
+        self.filter_evals: Counter = Counter()
+        self.fallbacks = 0
+        self._compile(dp)
+
+    def _compile(self, dp: Dispatcher):
+        compiled: list[_Compiled] = []
+        for router in _walk(dp):
+            observer = router.message
+            # фильтры/outer-middleware на уровне роутера заранее не вычислить
+            router_opaque = bool(getattr(getattr(observer, "_handler", None), "filters", None)) or (
+                router is not dp and len(observer.outer_middleware)
+            )
+            for h in observer.handlers:
+                c = _Compiled(router, observer, h)
+                c.opaque = c.opaque or router_opaque
+                compiled.append(c)
+                self._count_filters(c)
+
+        buttons: set[str] = set()
+        states: set = {None}
+        for c in compiled:
+            if c.texts:
+                buttons |= c.texts
+            states |= {s for s in c.states if s is not ANY and s is not _UNKNOWN}
+
+        for state in states:
+            undecided: set[str] = set()    # тексты, которые мог забрать хендлер с командой
+            for c in compiled:
+                if not c.applies(state):
+                    continue
+                if c.command_prefix is not None:
+                    # остальные фильтры не важны: без префикса команды хендлер не сработает
+                    undecided |= {t for t in buttons if t[:1] in c.command_prefix}
+                    continue
+                if c.opaque:
+                    break
+                for text in buttons:
+                    if text not in undecided and (state, text) not in self.table and c.matches(text):
+                        self.table[(state, text)] = c
+                if c.texts is None and c.text_filter is None:
+                    break   # «ловит всё» в этом состоянии — дальше хендлеры недостижимы
+
+    def _count_filters(self, c: _Compiled):
+        # считаем вычисления фильтров в обычной цепочке; params/awaitable у FilterObject
+        # уже посчитаны по исходному callback, обёртка лишь прозрачно его вызывает
+        for i, fo in enumerate(c.handler.filters or ()):
+            fo.callback = _counted(fo.callback, self.filter_evals, f"{c.name}[{i}]")
+
+    def lookup(self, state: Optional[str], text: str) -> Optional[_Compiled]:
+        return self.table.get((state, text))
+
+    def stats(self) -> dict:
+        return {
+            "compiled": len(self.table),
+            "fallbacks": self.fallbacks,
+            "hits": dict(self.hits),
+            "filter_evals": dict(self.filter_evals),
+        }
+
+
+class TextDispatchMiddleware(BaseMiddleware):
+    def __init__(self, table: TextDispatchTable):
+        self.table = table
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        text = event.text
+        if text is not None:
+            c = self.table.lookup(data.get("raw_state"), text)
+            if c is not None:
+                self.table.hits[c.name] += 1
+                kwargs = {**data, "handler": c.handler, "event_router": c.router}
+                inner = getattr(c.observer, "_resolve_middlewares", lambda: c.observer.middleware)()
+                call = c.observer.outer_middleware.wrap_middlewares(inner, c.handler.call)
+                try:
+                    return await call(event, kwargs)
+                except SkipHandler:
+                    pass
+        self.table.fallbacks += 1
+        return await handler(event, data)
+
+
+def install(dp: Dispatcher) -> TextDispatchTable:
+    """Скомпилировать таблицу по уже подключённым роутерам и повесить middleware."""
+    table = TextDispatchTable(dp)
+    dp.message.outer_middleware(TextDispatchMiddleware(table))
+    return table
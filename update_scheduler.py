@@ -0,0 +1,260 @@
+# update_scheduler.py
+"""
+Планировщик апдейтов перед Dispatcher (polling, webhook и воркеры sharding).
+
+- апдейты одного пользователя (shard_key) обрабатываются строго по очереди:
+  два быстрых нажатия не проходят ClientFSM параллельно, следующий апдейт
+  ждёт завершения хендлеров предыдущего; разные пользователи — параллельно;
+- одновременно работает не больше UPDATE_CONCURRENCY хендлеров;
+- из готовых пользователей первыми берутся те, у кого следующий апдейт —
+  callback_query (нажатие inline-кнопки, пользователь смотрит на «часики»);
+- в очереди не больше UPDATE_QUEUE_SIZE апдейтов: put() при переполнении
+  отказывает (webhook отвечает 503, Telegram повторит позже), put_wait()
+  ждёт места (polling не двигает offset) — нагрузка откладывается, а не теряется;
+- пользователь, накопивший UPDATE_USER_QUEUE необработанных апдейтов, новые
+  теряет (shed) — флуд одного не занимает очередь остальных; отброшенный
+  апдейт пишется в лог, на отброшенное нажатие кнопки отвечаем
+  answer_callback_query, чтобы у пользователя не висели «часики»;
+- stats(): глубина, в работе, ожидание в очереди по полосам (avg/p95/max), отказы.
+
+poll_into — цикл getUpdates вместо dp.start_polling, с тем же, что делает aiogram:
+паузы между неудачными запросами растут по aiogram.utils.backoff (1→5 с),
+SIGINT/SIGTERM останавливают опрос, и вызывающий доделывает принятое (stop()).
+"""
+import asyncio
+import os
+import signal
+import time
+from collections import deque
+from contextlib import suppress
+from typing import Callable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", "2000"))
+UPDATE_USER_QUEUE = int(os.getenv("UPDATE_USER_QUEUE", "20"))
+POLL_TIMEOUT = 30
+POLL_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)   # как в aiogram
+SHED_TEXT = "⏳ Слишком много нажатий — подождите пару секунд."
+
+CALLBACK = 0
+OTHER = 1
+LANES = (CALLBACK, OTHER)
+
+
+def shard_key(update: Update) -> int:
+    """tg_id автора апдейта; если его нет — чат, иначе update_id."""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat:
+        return chat.id
+    return update.update_id
+
+
+def _lane(update: Update) -> int:
+    return CALLBACK if update.callback_query is not None else OTHER
+
+
+class UpdateScheduler:
+    def __init__(self, dp: Dispatcher, bot: Bot, *, concurrency: int = UPDATE_CONCURRENCY,
+                 maxsize: int = UPDATE_QUEUE_SIZE, per_user: int = UPDATE_USER_QUEUE,
+                 on_done: Optional[Callable[[], None]] = None):
+        self.dp = dp
+        self.bot = bot
+        self.concurrency = concurrency
+        self.maxsize = maxsize
+        self.per_user = per_user
+        self.on_done = on_done          # вызывается на каждый апдейт, покинувший планировщик
+        self._users: dict[int, deque] = {}          # key → deque[(enqueued, update)]
+        self._ready = {lane: deque() for lane in LANES}   # пользователи, чей следующий апдейт можно брать
+        self._running: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._space = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.queued = 0
+        self.inflight = 0
+        # метрики
+        self.accepted = 0
+        self.processed = 0
+        self.rejected = 0
+        self.shed = 0
+        self.wait_total = {lane: 0.0 for lane in LANES}
+        self.wait_max = {lane: 0.0 for lane in LANES}
+        self.wait_count = {lane: 0 for lane in LANES}
+        self._waits = {lane: deque(maxlen=1000) for lane in LANES}
+
+    # ---------- API ----------
+
+    def put(self, update: Update) -> bool:
+        """Неблокирующая постановка: False — очередь полна (для webhook → 503)."""
+        if self.queued >= self.maxsize:
+            self.rejected += 1
+            return False
+        self._enqueue(update)
+        return True
+
+    async def put_wait(self, update: Update):
+        """Постановка с ожиданием места в очереди (для polling)."""
+        while self.queued >= self.maxsize:
+            self._space.clear()
+            await self._space.wait()
+        self._enqueue(update)
+
+    async def start(self):
+        pass    # задачи создаются по мере поступления апдейтов
+
+    async def stop(self):
+        # дорабатываем уже принятое (Telegram не пришлёт его повторно)
+        await self._idle.wait()
+
+    def stats(self) -> dict:
+        def p95(lane):
+            waits = sorted(self._waits[lane])
+            return round(waits[int(len(waits) * 0.95)], 4) if waits else 0.0
+
+        return {
+            "queued": self.queued,
+            "inflight": self.inflight,
+            "users_waiting": len(self._users) - len(self._running),
+            "accepted": self.accepted,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "wait_avg": {
+                lane: round(self.wait_total[lane] / self.wait_count[lane], 4) if self.wait_count[lane] else 0.0
+                for lane in LANES
+            },
+            "wait_p95": {lane: p95(lane) for lane in LANES},
+            "wait_max": {lane: round(self.wait_max[lane], 4) for lane in LANES},
+        }
+
+    # ---------- внутреннее ----------
+
+    def _enqueue(self, update: Update):
+        key = shard_key(update)
+        pending = self._users.get(key)
+        if pending is None:
+            pending = self._users[key] = deque()
+        elif len(pending) >= self.per_user:
+            self.shed += 1
+            print("DEBUG updates: у пользователя", key, "очередь полна, апдейт", update.update_id, "отброшен")
+            if update.callback_query is not None:
+                task = asyncio.create_task(self._answer_shed(update.callback_query.id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            if self.on_done is not None:
+                self.on_done()
+            return
+        pending.append((time.monotonic(), update))
+        self.queued += 1
+        self.accepted += 1
+        self._idle.clear()
+        if len(pending) == 1 and key not in self._running:
+            self._ready[_lane(update)].append(key)
+        self._pump()
+
+    async def _answer_shed(self, callback_id: str):
+        try:
+            await self.bot.answer_callback_query(callback_id, text=SHED_TEXT)
+        except Exception as e:
+            print("DEBUG updates: answer_callback_query не удался:", e)
+
+    def _pump(self):
+        while self.inflight < self.concurrency:
+            ready = self._ready[CALLBACK] or self._ready[OTHER]
+            if not ready:
+                break
+            key = ready.popleft()
+            enqueued, update = self._users[key].popleft()
+            self.queued -= 1
+            lane = _lane(update)
+            wait = time.monotonic() - enqueued
+            self.wait_total[lane] += wait
+            self.wait_count[lane] += 1
+            self._waits[lane].append(wait)
+            if wait > self.wait_max[lane]:
+                self.wait_max[lane] = wait
+            self._running.add(key)
+            self.inflight += 1
+            task = asyncio.create_task(self._feed(key, update))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self.queued < self.maxsize:
+            self._space.set()
+
+    async def _feed(self, key: int, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            print("DEBUG updates: ошибка обработки апдейта", update.update_id, e)
+        finally:
+            self.inflight -= 1
+            self.processed += 1
+            self._running.discard(key)
+            pending = self._users[key]
+            if pending:
+                self._ready[_lane(pending[0][1])].append(key)
+            else:
+                del self._users[key]
+            if self.on_done is not None:
+                self.on_done()
+            self._pump()
+            if not self.inflight and not self.queued:
+                self._idle.set()
+
+
+async def poll_into(bot: Bot, allowed_updates: list[str], sink, *, handle_signals: bool = True):
+    """
+    getUpdates → sink.put_wait: offset сдвигается только после постановки апдейта.
+    Возвращается по SIGINT/SIGTERM; апдейт, не успевший встать в очередь, Telegram пришлёт снова.
+    """
+    await bot.delete_webhook(drop_pending_updates=False)
+    loop = asyncio.get_running_loop()
+    stopping = asyncio.Event()
+    signals = (signal.SIGINT, signal.SIGTERM) if handle_signals else ()
+    for sig in signals:
+        with suppress(NotImplementedError):     # Windows: остаётся KeyboardInterrupt от asyncio.run
+            loop.add_signal_handler(sig, stopping.set)
+    polling = asyncio.create_task(_poll(bot, allowed_updates, sink))
+    waiting = asyncio.create_task(stopping.wait())
+    try:
+        await asyncio.wait((polling, waiting), return_when=asyncio.FIRST_COMPLETED)
+        if stopping.is_set():
+            print("DEBUG polling: получен сигнал остановки")
+    finally:
+        for task in (polling, waiting):
+            task.cancel()
+        await asyncio.gather(polling, waiting, return_exceptions=True)
+        for sig in signals:
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+    if polling.done() and not polling.cancelled() and polling.exception() is not None:
+        raise polling.exception()
+
+
+async def _poll(bot: Bot, allowed_updates: list[str], sink):
+    backoff = Backoff(POLL_BACKOFF)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLL_TIMEOUT,
+                allowed_updates=allowed_updates,
+                request_timeout=POLL_TIMEOUT + 10,
+            )
+        except Exception as e:
+            print(f"DEBUG polling: getUpdates упал, повтор через {backoff.next_delay:.1f}с:", e)
+            await backoff.asleep()
+            continue
+        backoff.reset()
+        for u in updates:
+            await sink.put_wait(u)
+            offset = u.update_id + 1
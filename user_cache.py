@@ -0,0 +1,220 @@
+# user_cache.py
+"""
+Read-through кэш строк User по tg_id (LRU + TTL) перед reg.db.
+
+Меню и профиль читают пользователя почти на каждое нажатие, поэтому
+users.get() отдаёт строку из памяти, а upsert/update в reg.py и
+tariff_handlers.py идут через этот же объект — результат записи сразу
+кладётся в кэш (write-through), при ошибке ключ сбрасывается.
+Отсутствующий пользователь тоже кэшируется (None) — до первой регистрации.
+Если задан overlay (ProfileWriteBuffer), ещё не записанные в БД правки
+накладываются на каждую строку, попадающую в кэш, — чтение после записи
+видит новые значения до flush.
+
+UserScopeMiddleware дополнительно заводит на время апдейта «скоуп»: строка
+автора апдейта читается из БД максимум один раз, а результат любой записи
+переносится дальше по цепочке хендлеров (forced_exit_from_fsm → show_tariffs и т.п.).
+"""
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from prisma import Prisma
+from prisma.models import User
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+# 1 → падать (AssertionError), если апдейт прочитал User из БД больше одного раза
+USER_SCOPE_STRICT = os.getenv("USER_SCOPE_STRICT", "0") == "1"
+
+_MISSING = object()
+
+
+def _with(user: User, data: dict) -> User:
+    """Копия строки с обновлёнными полями (pydantic v2 / v1)."""
+    copy = getattr(user, "model_copy", None)
+    return copy(update=data) if copy is not None else user.copy(update=data)
+
+
+class UserScope:
+    """User автора текущего апдейта + счётчик обращений к БД за ним."""
+    __slots__ = ("tg_id", "user", "loaded", "db_reads", "_cache")
+
+    def __init__(self, tg_id: int, cache: "UserCache"):
+        self.tg_id = tg_id
+        self.user: Optional[User] = None
+        self.loaded = False
+        self.db_reads = 0
+        self._cache = cache
+
+    async def get(self) -> Optional[User]:
+        return await self._cache.get(self.tg_id)
+
+
+_scope: ContextVar[Optional[UserScope]] = ContextVar("user_scope", default=None)
+
+
+def _scope_for(tg_id: int) -> Optional[UserScope]:
+    scope = _scope.get()
+    return scope if scope is not None and scope.tg_id == tg_id else None
+
+
+class UserCache:
+    def __init__(self, db: Prisma, *, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL,
+                 loader=None):
+        self.db = db
+        self.loader = loader   # UserLoader: промахи склеиваются в find_many
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[int, tuple[float, Optional[User]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self.redundant_reads = 0   # апдейты, прочитавшие своего User из БД больше одного раза
+        self.overlay: Optional[Callable[[int], Optional[dict]]] = None   # tg_id → несохранённые правки
+
+    # ---------- низкоуровневые операции ----------
+
+    def peek(self, tg_id: int):
+        """User / None из кэша или _MISSING, если ключа нет или он протух."""
+        item = self._items.get(tg_id)
+        if item is None:
+            return _MISSING
+        expires, user = item
+        if expires < time.monotonic():
+            del self._items[tg_id]
+            return _MISSING
+        self._items.move_to_end(tg_id)
+        return user
+
+    def _merged(self, tg_id: int, user: Optional[User]) -> Optional[User]:
+        if user is not None and self.overlay is not None:
+            extra = self.overlay(tg_id)
+            if extra:
+                user = _with(user, extra)
+        return user
+
+    def put(self, tg_id: int, user: Optional[User]) -> Optional[User]:
+        user = self._merged(tg_id, user)
+        scope = _scope_for(tg_id)
+        if scope is not None:
+            scope.user, scope.loaded = user, True
+        self._items[tg_id] = (time.monotonic() + self.ttl, user)
+        self._items.move_to_end(tg_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return user
+
+    def apply(self, tg_id: int, data: dict):
+        """Отразить в кэше изменение, которое ещё не записано в БД."""
+        self._writes += 1     # чтение, начатое до правки, не должно затереть кэш
+        scope = _scope_for(tg_id)
+        user = scope.user if scope is not None and scope.loaded else self.peek(tg_id)
+        if user is not _MISSING and user is not None:
+            self.put(tg_id, _with(user, data))
+
+    def invalidate(self, tg_id: int):
+        scope = _scope_for(tg_id)
+        if scope is not None:
+            scope.user, scope.loaded = None, False
+        self._writes += 1
+        self._items.pop(tg_id, None)
+
+    def clear(self):
+        self._items.clear()
+
+    # ---------- доступ к БД через кэш ----------
+
+    async def get(self, tg_id: int) -> Optional[User]:
+        scope = _scope_for(tg_id)
+        if scope is not None and scope.loaded:
+            self.hits += 1
+            return scope.user
+        user = self.peek(tg_id)
+        if user is not _MISSING:
+            self.hits += 1
+            if scope is not None:
+                scope.user, scope.loaded = user, True
+            return user
+        self.misses += 1
+        if scope is not None:
+            scope.db_reads += 1
+        gen = self._writes
+        if self.loader is not None:
+            user = await self.loader.load(tg_id)
+        else:
+            user = await self.db.user.find_unique(where={"tg_id": tg_id})
+        # пока читали, кто-то записал — не затираем кэш возможно устаревшей строкой
+        if self._writes == gen:
+            return self.put(tg_id, user)
+        return self._merged(tg_id, user)
+
+    async def upsert(self, tg_id: int, create: dict, update: dict) -> User:
+        try:
+            user = await self.db.user.upsert(
+                where={"tg_id": tg_id},
+                data={"create": {"tg_id": tg_id, **create}, "update": update},
+            )
+        except Exception:
+            self.invalidate(tg_id)
+            raise
+        self._writes += 1
+        return self.put(tg_id, user)
+
+    async def update(self, tg_id: int, data: dict) -> Optional[User]:
+        try:
+            user = await self.db.user.update(where={"tg_id": tg_id}, data=data)
+        except Exception:
+            self.invalidate(tg_id)
+            raise
+        self._writes += 1
+        return self.put(tg_id, user)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "redundant_reads": self.redundant_reads,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class UserScopeMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на update: кладёт в kwargs хендлеров user_ctx (UserScope)
+    и держит его в contextvar, чтобы users.get() внутри цепочки не ходил в БД повторно.
+    """
+
+    def __init__(self, users: UserCache, *, strict: bool = USER_SCOPE_STRICT):
+        self.users = users
+        self.strict = strict
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+        scope = UserScope(from_user.id, self.users)
+        data["user_ctx"] = scope
+        token = _scope.set(scope)
+        try:
+            return await handler(event, data)
+        finally:
+            _scope.reset(token)
+            if scope.db_reads > 1:
+                self.users.redundant_reads += 1
+                if self.strict:
+                    raise AssertionError(f"User {scope.tg_id} прочитан из БД {scope.db_reads} раз за апдейт")
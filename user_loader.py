@@ -0,0 +1,91 @@
+# user_loader.py
+"""
+DataLoader для User по tg_id: одновременные запросы, пришедшие в течение
+короткого окна (USER_LOADER_WINDOW) или до USER_LOADER_MAX_BATCH штук,
+склеиваются в один find_many(where={"tg_id": {"in": [...]}}).
+Одинаковые ключи в полёте делят одну Future.
+
+Используется из UserCache (reg.users) на промахе кэша, поэтому bot.py, reg.py
+и tariff_handlers.py получают батчинг без изменений в хендлерах.
+"""
+import asyncio
+import os
+from typing import Optional
+
+from prisma import Prisma
+from prisma.models import User
+
+USER_LOADER_WINDOW = float(os.getenv("USER_LOADER_WINDOW", "0.002"))   # сек
+USER_LOADER_MAX_BATCH = int(os.getenv("USER_LOADER_MAX_BATCH", "100"))
+
+
+class UserLoader:
+    def __init__(self, db: Prisma, *, window: float = USER_LOADER_WINDOW,
+                 max_batch: int = USER_LOADER_MAX_BATCH):
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[int, asyncio.Future] = {}     # ждут ближайшего батча
+        self._inflight: dict[int, asyncio.Future] = {}    # батч уже ушёл в БД
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set[asyncio.Task] = set()
+        self.loads = 0
+        self.deduped = 0
+        self.batches = 0
+
+    async def load(self, tg_id: int) -> Optional[User]:
+        self.loads += 1
+        fut = self._pending.get(tg_id) or self._inflight.get(tg_id)
+        if fut is not None:
+            self.deduped += 1
+            return await asyncio.shield(fut)
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending[tg_id] = fut
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await asyncio.shield(fut)
+
+    async def load_many(self, tg_ids: list[int]) -> list[Optional[User]]:
+        return list(await asyncio.gather(*(self.load(t) for t in tg_ids)))
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        self.batches += 1
+        task = asyncio.ensure_future(self._run(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run(self, batch: dict[int, asyncio.Future]):
+        try:
+            rows = await self.db.user.find_many(where={"tg_id": {"in": list(batch)}})
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            by_id = {row.tg_id: row for row in rows}
+            for tg_id, fut in batch.items():
+                if not fut.done():
+                    fut.set_result(by_id.get(tg_id))
+        finally:
+            for tg_id, fut in batch.items():
+                if self._inflight.get(tg_id) is fut:
+                    del self._inflight[tg_id]
+
+    def stats(self) -> dict:
+        return {
+            "loads": self.loads,
+            "deduped": self.deduped,
+            "batches": self.batches,
+            "avg_batch": (self.loads - self.deduped) / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,106 @@
+# webhook.py
+import asyncio
+import hmac
+import os
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+import metrics
+from update_scheduler import UpdateScheduler, poll_into
+
+# Режим приёма апдейтов: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")                    # публичный https-адрес, напр. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8081"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, *, path: str = WEBHOOK_PATH,
+                      secret: str = WEBHOOK_SECRET, updates=None, emit_lifecycle: bool = True,
+                      **scheduler_kwargs) -> web.Application:
+    """
+    updates — приёмник апдейтов с методами put/start/stop (по умолчанию UpdateScheduler).
+    Шардированный режим подставляет сюда свой роутер по процессам и выключает
+    emit_lifecycle: startup/shutdown-хуки Dispatcher выполняются в воркерах.
+    """
+    if updates is None:
+        updates = UpdateScheduler(dp, bot, **scheduler_kwargs)
+        metrics.register("updates", updates.stats)
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": bot})
+        except Exception:
+            return web.Response(status=400)
+        if not updates.put(update):
+            # очередь забита → не 2xx, Telegram повторит доставку позже
+            return web.Response(status=503)
+        return web.Response()
+
+    async def on_startup(_app: web.Application):
+        if emit_lifecycle:
+            await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await updates.start()
+
+    async def on_cleanup(_app: web.Application):
+        await updates.stop()
+        if emit_lifecycle:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    app = web.Application()
+    app["updates"] = updates
+    app.router.add_post(path, handle)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def register_webhook(bot: Bot, dp: Dispatcher, *, drop_pending: bool = False):
+    """Регистрирует вебхук в Telegram (WEBHOOK_URL + WEBHOOK_PATH)."""
+    if not WEBHOOK_URL:
+        raise SystemExit("Для BOT_MODE=webhook нужен WEBHOOK_URL.")
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=drop_pending,
+        max_connections=100,
+    )
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, *, updates=None, emit_lifecycle: bool = True):
+    await register_webhook(bot, dp)
+    app = build_webhook_app(dp, bot, updates=updates, emit_lifecycle=emit_lifecycle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    print(f"DEBUG webhook: слушаю {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+async def run_polling(dp: Dispatcher, bot: Bot):
+    # свой цикл getUpdates вместо dp.start_polling: апдейты идут через UpdateScheduler
+    # (очередь по пользователю, лимит хендлеров); delete_webhook — внутри poll_into
+    updates = UpdateScheduler(dp, bot)
+    metrics.register("updates", updates.stats)
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    try:
+        await poll_into(bot, dp.resolve_used_update_types(), updates)
+    finally:
+        await updates.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()